@@ -0,0 +1,88 @@
+"""
+Measures the cost of opening database connections on the login and addpoint paths.
+
+Every mode runs in its own process because the database settings are read from
+the environment (see DATABASES in truck_api/settings.py):
+
+    DB_HOST=localhost DB_PORT=5432 DB_NAME=truck DB_USER=postgres DB_PASSWORD=... \
+        python benchmarks/db_connections.py --requests 200
+
+Requests go through the Django test client so connections are opened and closed
+by the request_started/request_finished signals exactly like in production.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+MODES = {
+    'no persistence': {'DB_CONN_MAX_AGE': '0', 'DB_POOL': '0'},
+    'persistent connections': {'DB_CONN_MAX_AGE': '600', 'DB_POOL': '0'},
+    'psycopg pool': {'DB_CONN_MAX_AGE': '0', 'DB_POOL': '1'},
+}
+
+def run_worker(requests_count):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truck_api.settings')
+    import django
+    django.setup()
+
+    from datetime import datetime, timezone
+    from django.core.signals import request_finished, request_started
+    from django.test import Client
+    from trip.models import DriverState
+
+    client = Client(HTTP_HOST='bench.vercel.app')
+    results = {}
+
+    def measure(name, call):
+        call()
+        started = time.perf_counter()
+        for _ in range(requests_count):
+            call()
+        results[name] = (time.perf_counter() - started) * 1000 / requests_count
+
+    # Unknown email: one query, no password hashing.
+    measure('auth/login', lambda: client.post('/auth/login', {'email': 'bench@example.com', 'password': 'x'}))
+
+    # Database part of addpoint (the routing calls are not measured here).
+    def addpoint_db():
+        request_started.send(sender=None)
+        DriverState.get_planning_state(0, datetime.now(timezone.utc))
+        request_finished.send(sender=None)
+
+    measure('api/trip/addpoint (db)', addpoint_db)
+    print(json.dumps(results))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--worker', action='store_true')
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.requests)
+        return
+
+    for mode, env in MODES.items():
+        process = subprocess.run(
+            [sys.executable, __file__, '--worker', '--requests', str(args.requests)],
+            env={**os.environ, **env},
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode != 0:
+            print(f"{mode}: failed\n{process.stderr.strip().splitlines()[-1] if process.stderr else ''}")
+            continue
+        results = json.loads(process.stdout.strip().splitlines()[-1])
+        print(mode)
+        for endpoint, ms in results.items():
+            print(f"  {endpoint:<28} {ms:8.2f} ms/request")
+
+if __name__ == '__main__':
+    main()
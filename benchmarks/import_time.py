@@ -0,0 +1,77 @@
+"""
+Cold-start import cost of the serverless entry point, measured with -X importtime.
+
+    python benchmarks/import_time.py --budget-ms 400
+
+Imports truck_api.wsgi and loads the URLconf in a fresh API-only interpreter, like
+a cold start on Vercel, prints the slowest top-level imports and exits with 1 when
+the total goes over the budget or when a module that must stay off the startup
+path (see LAZY_MODULES) gets imported.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Heavy modules that are only imported by the views or commands that need them.
+LAZY_MODULES = ['numpy', 'requests', 'pytz', 'trip.views', 'trip.compliance', 'users.views', 'django.contrib.admin']
+
+STARTUP = "import truck_api.wsgi; from django.urls import get_resolver; get_resolver().url_patterns"
+
+_line = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+def measure():
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP],
+        cwd=BASE_DIR,
+        env={**os.environ, 'DJANGO_API_ONLY': '1', 'DJANGO_SETTINGS_MODULE': 'truck_api.settings'},
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        raise SystemExit(process.stderr)
+
+    modules = []
+    for line in process.stderr.splitlines():
+        match = _line.match(line)
+        if match:
+            modules.append((match.group(4), int(match.group(2)), len(match.group(3)) // 2))
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget-ms', type=float, default=400, help="Maximum total import time")
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--runs', type=int, default=3, help="The best of RUNS measures is kept")
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(args.runs):
+        modules = measure()
+        total = sum(cumulative for _, cumulative, level in modules if level == 0) / 1000
+        if best is None or total < best[0]:
+            best = (total, modules)
+    total, modules = best
+
+    print(f"Total import time: {total:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    slowest = sorted([m for m in modules if m[2] <= 1], key=lambda m: m[1], reverse=True)
+    for name, cumulative, level in slowest[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {'  ' * level}{name}")
+
+    failed = False
+    imported = {name for name, _, _ in modules}
+    for name in LAZY_MODULES:
+        if name in imported:
+            print(f"FAIL: {name} is imported at startup")
+            failed = True
+    if total > args.budget_ms:
+        print("FAIL: import time over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
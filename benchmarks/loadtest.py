@@ -0,0 +1,288 @@
+"""
+Load test of the whole API served by a real WSGI or ASGI server, with OSRM and
+Overpass replaced by the local stubs of benchmarks/upstream_stubs.py.
+
+    python benchmarks/loadtest.py --server wsgi --server-workers 4 --drivers 50 --duration 60
+    python benchmarks/loadtest.py --server asgi --server-workers 4 --drivers 50 --duration 60 --upstream-latency-ms 80
+
+Every virtual driver registers, logs in, then until the end of the run plans a
+trip between two random cities (addpoint), saves it (trip save) and refreshes
+its access token every --refresh-every trips, waiting --think-ms between trips.
+The report gives, per endpoint, the throughput, the latency percentiles, the
+share of errors (transport errors and 4xx/5xx answers other than 429) and the
+share of throttled (429) answers.
+
+The server (gunicorn for WSGI, uvicorn for ASGI, or --server-cmd) is started on
+a new SQLite database by default; --database env uses the DB_* variables of
+truck_api/settings.py instead, e.g. a local Postgres, which is migrated first.
+SQLite serializes the writes, use Postgres to measure more than a few workers.
+--target runs the drivers against an already running deployment instead.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from importlib.util import find_spec
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Sent to the servers started here, ALLOWED_HOSTS only accepts .vercel.app.
+HOST = 'loadtest.vercel.app'
+
+CITIES = [
+    (41.88, -87.63),   # Chicago
+    (39.74, -104.99),  # Denver
+    (34.05, -118.24),  # Los Angeles
+    (32.78, -96.80),   # Dallas
+    (33.75, -84.39),   # Atlanta
+    (40.71, -74.01),   # New York
+    (47.61, -122.33),  # Seattle
+    (29.76, -95.37),   # Houston
+    (39.10, -94.58),   # Kansas City
+    (35.15, -90.05),   # Memphis
+]
+
+ENDPOINTS = ['register', 'login', 'refresh', 'addpoint', 'save']
+
+SERVERS = {
+    'wsgi': ('gunicorn', ['truck_api.wsgi:application', '--bind', '127.0.0.1:{port}', '--workers', '{workers}', '--threads', '{threads}']),
+    'asgi': ('uvicorn', ['truck_api.asgi:application', '--host', '127.0.0.1', '--port', '{port}', '--workers', '{workers}', '--no-access-log']),
+}
+
+class Driver(threading.Thread):
+    """
+    One driver running the scenario against the API, recording (endpoint, status, seconds) of every request.
+    Status is None for a transport error.
+    """
+    def __init__(self, index, args, deadline, run_id):
+        super().__init__(daemon=True)
+        self.args = args
+        self.deadline = deadline
+        self.email = f"loadtest-{run_id}-{index}@example.com"
+        self.password = uuid.uuid4().hex
+        self.access_token = None
+        self.refresh_token = None
+        self.samples = []
+
+    def call(self, endpoint, method, path, **kwargs):
+        import requests
+
+        headers = kwargs.pop('headers', {})
+        if self.args.host:
+            headers['Host'] = self.args.host
+        if self.access_token and endpoint not in ('register', 'login', 'refresh'):
+            headers['Authorization'] = f"Bearer {self.access_token}"
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.args.target + path, headers=headers, timeout=self.args.timeout, **kwargs)
+        except requests.RequestException:
+            self.samples.append((endpoint, None, time.perf_counter() - started))
+            return None
+        self.samples.append((endpoint, response.status_code, time.perf_counter() - started))
+        return response
+
+    def login(self):
+        response = self.call('login', 'POST', '/auth/login', json={'email': self.email, 'password': self.password})
+        if response is None or response.status_code != 200:
+            return False
+        self.access_token = response.json()['accessToken']
+        self.refresh_token = response.cookies.get('refreshToken')
+        return True
+
+    def refresh(self):
+        response = self.call('refresh', 'POST', '/auth/refresh-token', cookies={'refreshToken': self.refresh_token or ''})
+        if response is not None and response.status_code == 200:
+            self.access_token = response.json()['accessToken']
+
+    def plan_and_save(self):
+        current, pickup, dropoff = random.sample(CITIES, 3)
+        response = self.call('addpoint', 'GET', '/api/trip/addpoint', params={
+            'current_lat': current[0], 'current_lng': current[1],
+            'pickup_lat': pickup[0], 'pickup_lng': pickup[1],
+            'dropoff_lat': dropoff[0], 'dropoff_lng': dropoff[1],
+        })
+        if response is None or response.status_code != 200:
+            return
+        plan = response.json()
+        self.call('save', 'POST', '/api/trip/save', headers={'Idempotency-Key': uuid.uuid4().hex}, json={
+            'datetimeUTC': datetime.now(timezone.utc).isoformat(),
+            'waypoints': plan['waypoints'],
+            'total_distance': plan.get('total_distance', 0),
+        })
+
+    def run(self):
+        import requests
+
+        self.session = requests.Session()
+        self.call('register', 'POST', '/auth/register', json={'name': 'Load test', 'email': self.email, 'password': self.password})
+        if not self.login():
+            return
+        trips = 0
+        while time.monotonic() < self.deadline:
+            self.plan_and_save()
+            trips += 1
+            if trips % self.args.refresh_every == 0:
+                self.refresh()
+            if self.args.think_ms:
+                time.sleep(random.expovariate(1000 / self.args.think_ms))
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def server_command(args, port):
+    if args.server_cmd:
+        return args.server_cmd.format(port=port, workers=args.server_workers, threads=args.server_threads).split()
+    module, options = SERVERS[args.server]
+    if find_spec(module) is None:
+        sys.exit(f"{module} is not installed (pip install {module}), or give the server with --server-cmd")
+    return [sys.executable, '-m', module] + [
+        option.format(port=port, workers=args.server_workers, threads=args.server_threads) for option in options
+    ]
+
+def wait_until_up(url, process, timeout=60):
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"The server exited with code {process.returncode}")
+        try:
+            requests.get(url + '/auth/login', headers={'Host': HOST}, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    sys.exit(f"The server didn't answer within {timeout}s")
+
+def percentile(timings, p):
+    if len(timings) == 1:
+        return timings[0]
+    return statistics.quantiles(timings, n=100, method='inclusive')[p - 1]
+
+def report(samples, elapsed):
+    """
+    :param samples: list of (endpoint, status, seconds)
+    :return: dict endpoint -> statistics, with an "all" entry
+    """
+    results = {}
+    for endpoint in ENDPOINTS + ['all']:
+        selected = [sample for sample in samples if endpoint in ('all', sample[0])]
+        if not selected:
+            continue
+        timings = [seconds * 1000 for _, _, seconds in selected]
+        errors = sum(1 for _, status, _ in selected if status is None or (status >= 400 and status != 429))
+        throttled = sum(1 for _, status, _ in selected if status == 429)
+        results[endpoint] = {
+            'requests': len(selected),
+            'rps': len(selected) / elapsed,
+            'p50_ms': percentile(timings, 50),
+            'p90_ms': percentile(timings, 90),
+            'p99_ms': percentile(timings, 99),
+            'max_ms': max(timings),
+            'error_rate': errors / len(selected),
+            'throttled_rate': throttled / len(selected),
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--server', choices=list(SERVERS), default='wsgi')
+    parser.add_argument('--server-cmd', help="Server command line instead of gunicorn/uvicorn, with {port}, {workers} and {threads} placeholders")
+    parser.add_argument('--server-workers', type=int, default=2)
+    parser.add_argument('--server-threads', type=int, default=4, help="Threads per gunicorn worker")
+    parser.add_argument('--target', help="URL of a running deployment, no server nor stubs are started")
+    parser.add_argument('--host', help=f"Host header (default: {HOST} for the servers started here)")
+    parser.add_argument('--database', choices=['sqlite', 'env'], default='sqlite')
+    parser.add_argument('--drivers', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30, help="Seconds")
+    parser.add_argument('--think-ms', type=float, default=500, help="Mean pause of a driver between two trips")
+    parser.add_argument('--refresh-every', type=int, default=5, help="Trips between two token refreshes")
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--upstream-latency-ms', type=float, default=50)
+    parser.add_argument('--upstream-jitter-ms', type=float, default=20)
+    parser.add_argument('--upstream-failure-rate', type=float, default=0.0)
+    parser.add_argument('--keep-rate-limits', action='store_true', help="Keep the plan and upstream rate limits of the settings")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BASE_DIR))
+    process = None
+    stubs = None
+    workdir = None
+    if args.target:
+        args.target = args.target.rstrip('/')
+    else:
+        from benchmarks.upstream_stubs import serve
+
+        stubs = serve(0, args.upstream_latency_ms, args.upstream_jitter_ms, args.upstream_failure_rate)
+        stubs_url = f"http://127.0.0.1:{stubs.server_port}"
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'truck_api.settings',
+            'DJANGO_API_ONLY': '1',
+            'OSRM_URL': stubs_url,
+            'OVERPASS_URL': stubs_url + '/api/interpreter',
+        }
+        if args.database == 'sqlite':
+            workdir = tempfile.mkdtemp(prefix='truck-loadtest-')
+            env.update({'DB_ENGINE': 'django.db.backends.sqlite3', 'DB_NAME': os.path.join(workdir, 'db.sqlite3')})
+        if not args.keep_rate_limits:
+            # Measures the capacity of the deployment, not its admission control.
+            for name in ('PLAN', 'OSRM', 'OVERPASS'):
+                env.update({f'{name}_RATE': '1000000', f'{name}_BURST': '1000000'})
+
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '--noinput'], cwd=BASE_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+        port = free_port()
+        args.target = f"http://127.0.0.1:{port}"
+        args.host = args.host or HOST
+        process = subprocess.Popen(server_command(args, port), cwd=BASE_DIR, env=env)
+
+    try:
+        if process is not None:
+            wait_until_up(args.target, process)
+        run_id = uuid.uuid4().hex[:8]
+        started = time.monotonic()
+        drivers = [Driver(i, args, started + args.duration, run_id) for i in range(args.drivers)]
+        for driver in drivers:
+            driver.start()
+        for driver in drivers:
+            driver.join()
+        elapsed = time.monotonic() - started
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if stubs is not None:
+            stubs.shutdown()
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = report([sample for driver in drivers for sample in driver.samples], elapsed)
+    label = args.server_cmd or args.server if process is not None else args.target
+    print(f"{label}: {args.drivers} drivers for {elapsed:.1f}s")
+    print(f"{'endpoint':<10} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7} {'429':>7}")
+    for endpoint, stats in results.items():
+        print(
+            f"{endpoint:<10} {stats['requests']:>8} {stats['rps']:>8.1f} {stats['p50_ms']:>8.1f} {stats['p90_ms']:>8.1f}"
+            f" {stats['p99_ms']:>8.1f} {stats['max_ms']:>8.1f} {stats['error_rate']:>7.1%} {stats['throttled_rate']:>7.1%}"
+        )
+    if stubs is not None:
+        print(f"upstream stub answers by status: {stubs.counts}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'server': label, 'drivers': args.drivers, 'duration': elapsed, 'endpoints': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Planner time per truck profile, with the OSRM and Overpass calls answered in-process
+by benchmarks/upstream_stubs.py (only the planner and its database work are measured).
+
+    python benchmarks/planning.py --profile federal --profile short-haul --profile small-tank --repeat 20
+
+A profile is one of PRESETS or the name of a stored TruckProfile. The database
+of truck_api/settings.py must be migrated (POI tiles and geometries are written).
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Changes to the federal defaults of TruckProfile.
+PRESETS = {
+    'federal': {},
+    'short-haul': {'max_driving_before_break': None},
+    'small-tank': {'fuel_range': 500},
+}
+
+class _Response:
+    def __init__(self, body):
+        self.status_code = 200
+        self.content = body
+
+    def json(self):
+        import json
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} Error", response=self)
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def parse_point(value):
+    lat, lng = value.split(',')
+    return float(lat), float(lng)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', action='append', help="Preset or stored profile name, repeatable (default: every preset)")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--current', type=parse_point, default=(41.85, -87.65))
+    parser.add_argument('--pickup', type=parse_point, default=(39.74, -104.99))
+    parser.add_argument('--dropoff', type=parse_point, default=(34.05, -118.24))
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truck_api.settings')
+    import django
+    django.setup()
+
+    import requests
+    from django.conf import settings
+    from benchmarks.upstream_stubs import answer
+    from trip.models import TruckProfile
+    from trip.profiles import get_profile_by_name
+    from trip.views import plan_trip
+
+    requests.get = lambda url, *a, **kw: _Response(answer(url))
+    # The stubs don't need protecting.
+    settings.UPSTREAM_RATES = {name: (1e9, 1e9) for name in settings.UPSTREAM_RATES}
+
+    for name in args.profile or list(PRESETS):
+        profile = TruckProfile(name=name, **PRESETS[name]) if name in PRESETS else get_profile_by_name(name)
+        timings = []
+        for i in range(args.repeat + 1):
+            # A new start point every run, so the routes aren't served by the single-flight caches.
+            current = (args.current[0] + i * 0.001, args.current[1])
+            started = time.perf_counter()
+            data, status = plan_trip(
+                0, current, args.pickup, args.dropoff,
+                profile.max_driving, profile.max_driving_before_break, 0, profile=profile,
+            )
+            if i:
+                timings.append((time.perf_counter() - started) * 1000)
+        if status != 200:
+            print(f"{name:<14} failed: {data}")
+            continue
+        labels = [wp["label"].split(" - ")[0] for wp in data["waypoints"][1:]]
+        p90 = statistics.quantiles(timings, n=10)[-1] if len(timings) > 1 else timings[0]
+        print(
+            f"{name:<14} {statistics.median(timings):8.2f} ms/plan (p90 {p90:.2f})"
+            f"  {len(labels)} stops: {', '.join(labels)}"
+        )
+
+if __name__ == '__main__':
+    main()
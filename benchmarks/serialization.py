@@ -0,0 +1,84 @@
+"""
+Compares DRF's default JSON renderer with the orjson one, and the size of the
+plan payloads without compression, with gzip and with brotli.
+
+    python benchmarks/serialization.py --points 20000
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+def make_plan(points):
+    """
+    Representative addpoint payload: a dozen stops and the full geojson geometry of the route.
+    """
+    waypoints = []
+    labels = ["current", "pickup", "Rest Area - I-80 Exit 290", "refueling - Pilot", "Area - Love's", "dropoff"]
+    for i in range(12):
+        waypoints.append({
+            "lat": 40.0 + i * 0.37,
+            "lng": -100.0 - i * 0.91,
+            "label": labels[i % len(labels)],
+            "duration": [[0, 3600, 1800, 900, 36000, 3600][i % 6]],
+            "type": "on-duty",
+            "duration_from_last_point": 9000 + i * 17,
+        })
+    coordinates = [[-100.0 - i * 0.0005, 40.0 + i * 0.0002] for i in range(points)]
+    return {
+        "waypoints": waypoints,
+        "total_distance": 1234.5678,
+        "distance_to_dropoff": 321.09,
+        "geometry": {"type": "LineString", "coordinates": coordinates},
+    }
+
+def measure(render, data, repeat):
+    render(data)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        body = render(data)
+    return (time.perf_counter() - started) * 1000 / repeat, body
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--points', type=int, default=20000, help="Number of coordinates in the route geometry")
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'truck_api.settings')
+    import django
+    django.setup()
+
+    from rest_framework.renderers import JSONRenderer
+    from truck_api.renderers import ORJSONRenderer
+
+    plan = make_plan(args.points)
+    results = [
+        ("DRF JSONRenderer", *measure(JSONRenderer().render, plan, args.repeat)),
+        ("ORJSONRenderer", *measure(ORJSONRenderer().render, plan, args.repeat)),
+    ]
+    for name, ms, body in results:
+        print(f"{name:<18} {ms:8.2f} ms  {len(body):>9} bytes")
+
+    body = results[-1][2]
+    started = time.perf_counter()
+    gzipped = gzip.compress(body, compresslevel=6)
+    gzip_ms = (time.perf_counter() - started) * 1000
+    print(f"{'gzip (level 6)':<18} {gzip_ms:8.2f} ms  {len(gzipped):>9} bytes")
+    try:
+        import brotli
+    except ImportError:
+        print("brotli not installed")
+        return
+    started = time.perf_counter()
+    compressed = brotli.compress(body, quality=5)
+    brotli_ms = (time.perf_counter() - started) * 1000
+    print(f"{'brotli (q=5)':<18} {brotli_ms:8.2f} ms  {len(compressed):>9} bytes")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Synthetic OSRM and Overpass answers used by the benchmarks instead of the public services.
+
+Routes are straight lines between the points, DETOUR times longer than the
+great-circle distance and driven at SPEED. Every Overpass bounding box holds
+POIS_PER_BBOX fuel stations / parkings spread over the box.
+
+The answers are served in-process (answer) or over HTTP, with an emulated
+latency and failure rate, for the servers under load test (see OSRM_URL and
+OVERPASS_URL in truck_api/settings.py):
+
+    python benchmarks/upstream_stubs.py --port 5100 --latency-ms 80 --jitter-ms 40 --failure-rate 0.01
+
+OSRM is then at http://127.0.0.1:5100 and Overpass at http://127.0.0.1:5100/api/interpreter.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SPEED = 80 / 3.6
+DETOUR = 1.2
+GEOMETRY_POINTS = 100
+POIS_PER_BBOX = 8
+
+_bbox = re.compile(r'\(\s*(-?[\d.]+)\s*,\s*(-?[\d.]+)\s*,\s*(-?[\d.]+)\s*,\s*(-?[\d.]+)\s*\)')
+
+def _distance(a, b):
+    lat1, lng1 = math.radians(a[0]), math.radians(a[1])
+    lat2, lng2 = math.radians(b[0]), math.radians(b[1])
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(h)) * DETOUR
+
+def _points(path):
+    """
+    (lat, lng) of the "lng,lat;lng,lat" last segment of an OSRM path.
+    """
+    points = []
+    for pair in path.rstrip('/').split('/')[-1].split(';'):
+        lng, lat = pair.split(',')
+        points.append((float(lat), float(lng)))
+    return points
+
+def osrm(path, query=""):
+    """
+    :param path: /route/v1/driving/... or /table/v1/driving/...
+    :return: OSRM JSON body (dict)
+    """
+    points = _points(path)
+    if '/table/' in path:
+        distances = [[_distance(a, b) for b in points] for a in points]
+        return {
+            "code": "Ok",
+            "distances": distances,
+            "durations": [[d / SPEED for d in row] for row in distances],
+        }
+
+    legs = []
+    coordinates = []
+    for a, b in zip(points, points[1:]):
+        distance = _distance(a, b)
+        legs.append({"distance": distance, "duration": distance / SPEED})
+        for i in range(GEOMETRY_POINTS + 1):
+            if coordinates and i == 0:
+                continue
+            t = i / GEOMETRY_POINTS
+            coordinates.append([a[1] + (b[1] - a[1]) * t, a[0] + (b[0] - a[0]) * t])
+    route = {
+        "distance": sum(leg["distance"] for leg in legs),
+        "duration": sum(leg["duration"] for leg in legs),
+        "legs": legs,
+    }
+    if parse_qs(query).get("overview") == ["full"]:
+        route["geometry"] = {"type": "LineString", "coordinates": coordinates}
+    return {"code": "Ok", "routes": [route]}
+
+def overpass(query):
+    """
+    :param query: Overpass QL query (bounding boxes as (south,west,north,east))
+    :return: Overpass JSON body (dict)
+    """
+    match = _bbox.search(query)
+    if match is None:
+        return {"elements": []}
+    south, west, north, east = (float(value) for value in match.groups())
+    side = max(1, math.isqrt(POIS_PER_BBOX))
+    elements = []
+    for i in range(POIS_PER_BBOX):
+        row, column = divmod(i, side)
+        elements.append({
+            "type": "node",
+            "id": abs(hash((round(south, 4), round(west, 4), i))),
+            "lat": south + (north - south) * (row + 0.5) / side,
+            "lon": west + (east - west) * (column + 0.5) / side,
+            "tags": {"amenity": "fuel" if i % 2 else "parking", "name": f"Stub {i}"},
+        })
+    return {"elements": elements}
+
+def answer(url):
+    """
+    Body of the stubbed answer to a GET on an OSRM or Overpass URL.
+    """
+    parts = urlsplit(url)
+    if parts.path.endswith('/interpreter'):
+        return json.dumps(overpass(parse_qs(parts.query).get("data", [""])[0])).encode()
+    return json.dumps(osrm(parts.path, parts.query)).encode()
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers GETs with answer() after the server's latency, or a 503 for a failure_rate share of them.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(max(0, random.gauss(server.latency, server.jitter)))
+        if random.random() < server.failure_rate:
+            status, body = 503, b'{"code": "Unavailable", "message": "Stub failure"}'
+        else:
+            try:
+                status, body = 200, answer(self.path)
+            except (ValueError, IndexError):
+                status, body = 400, b'{"code": "InvalidUrl"}'
+        with server.counts_lock:
+            server.counts[status] = server.counts.get(status, 0) + 1
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port=0, latency_ms=0, jitter_ms=0, failure_rate=0.0):
+    """
+    Starts the stub server in a daemon thread.
+    :return: the server, its URL is f"http://127.0.0.1:{server.server_port}" and server.counts holds the answers by status
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000
+    server.jitter = jitter_ms / 1000
+    server.failure_rate = failure_rate
+    server.counts = {}
+    server.counts_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--latency-ms', type=float, default=0, help="Mean added latency of an answer")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="Standard deviation of the added latency")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Share of the requests answered with a 503")
+    args = parser.parse_args()
+
+    server = serve(args.port, args.latency_ms, args.jitter_ms, args.failure_rate)
+    print(f"OSRM_URL=http://127.0.0.1:{server.server_port} OVERPASS_URL=http://127.0.0.1:{server.server_port}/api/interpreter")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
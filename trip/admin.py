@@ -1,3 +1,144 @@
-from django.contrib import admin
+import json
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from trip.models import TripBreak, TripConfig, TripDriving, TripRefueling, TruckAssignment, TruckProfile
+from trip.profiles import CACHE_TTL
 
-# Register your models here.
+# Below this estimated number of rows the changelists still run an exact COUNT(*).
+EXACT_COUNT_BELOW = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts large changelists with the PostgreSQL planner estimate (EXPLAIN) instead of COUNT(*),
+    which reads the whole table or every row matched by the filters.
+    """
+    @cached_property
+    def count(self):
+        estimate = self._estimate()
+        if estimate is None or estimate < EXACT_COUNT_BELOW:
+            return super().count
+        return estimate
+
+    def _estimate(self):
+        queryset = self.object_list
+        if connections[queryset.db].vendor != 'postgresql':
+            return None
+        try:
+            plan = json.loads(queryset.explain(format='json'))
+            return int(plan[0]["Plan"]["Plan Rows"])
+        except Exception as e:
+            print(f"Error estimating the changelist count: {e}")
+            return None
+
+
+class TripTableAdmin(admin.ModelAdmin):
+    """
+    Read-only views of the trip tables, listed without counting the whole table.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    # A driver is found by exact email (unique index); a list filter on the user would load every user.
+    search_help_text = "Driver email (exact)"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TripConfig)
+class TripConfigAdmin(TripTableAdmin):
+    list_display = ('id', 'user', 'datetimeUTC', 'totaldistance', 'total_time_driving')
+    list_select_related = ('user',)
+    list_filter = ('datetimeUTC',)
+    search_fields = ('=user__email',)
+    ordering = ('-datetimeUTC',)
+    fields = ('user', 'datetimeUTC', 'totaldistance', 'total_time_driving', 'waypoints')
+    readonly_fields = ('waypoints',)
+
+    def get_queryset(self, request):
+        # ways is only read by the change page, never by the changelist.
+        return super().get_queryset(request).defer('ways')
+
+    @admin.display(description='Waypoints')
+    def waypoints(self, obj):
+        return format_html(
+            '<details><summary>{} waypoints</summary><pre>{}</pre></details>',
+            len(obj.ways),
+            json.dumps(obj.ways, indent=2, ensure_ascii=False),
+        )
+
+
+class TripRowAdmin(TripTableAdmin):
+    """
+    Rows belonging to a TripConfig, shown with their driver.
+    """
+    list_select_related = ('tripconfig__user',)
+    raw_id_fields = ('tripconfig',)
+    search_fields = ('=tripconfig__user__email',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('tripconfig__ways')
+
+    @admin.display(description='Driver', ordering='tripconfig__user')
+    def driver(self, obj):
+        return obj.tripconfig.user
+
+    @admin.display(description='Trip', ordering='tripconfig')
+    def trip(self, obj):
+        return obj.tripconfig_id
+
+
+@admin.register(TripDriving)
+class TripDrivingAdmin(TripRowAdmin):
+    list_display = ('id', 'driver', 'trip', 'begin', 'time_total')
+    list_filter = ('begin',)
+    ordering = ('-begin',)
+
+
+@admin.register(TripBreak)
+class TripBreakAdmin(TripRowAdmin):
+    list_display = ('id', 'driver', 'trip', 'reason', 'begin', 'end')
+    list_filter = ('begin', 'reason')
+    ordering = ('-begin',)
+
+
+@admin.register(TripRefueling)
+class TripRefuelingAdmin(TripRowAdmin):
+    list_display = ('id', 'driver', 'trip', 'distancetodropoff')
+    ordering = ('-id',)
+
+
+class ProfileCacheNoticeMixin:
+    """
+    Profiles are cached per worker (see trip.profiles): tells the admin when the other workers use a change.
+    """
+    def _notify_cache(self, request):
+        self.message_user(request, f"The other workers use this change within {CACHE_TTL // 60} minutes.", messages.INFO)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self._notify_cache(request)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self._notify_cache(request)
+
+
+@admin.register(TruckProfile)
+class TruckProfileAdmin(ProfileCacheNoticeMixin, admin.ModelAdmin):
+    list_display = ('name', 'is_default', 'fuel_range', 'max_driving', 'max_driving_before_break', 'sleeper_duration')
+
+
+@admin.register(TruckAssignment)
+class TruckAssignmentAdmin(ProfileCacheNoticeMixin, admin.ModelAdmin):
+    list_display = ('user', 'profile')
+    list_select_related = ('user', 'profile')
+    list_filter = ('profile',)
+    raw_id_fields = ('user',)
@@ -0,0 +1,104 @@
+"""
+Admission control in front of the planner and of the public OSRM and Overpass services.
+
+Every driver has a token bucket per expensive endpoint (PlanRateThrottle): a
+client looping on addpoint gets a 429 with Retry-After instead of plans. Every
+upstream has one bucket, shared by all the workers through the RateBucket
+table, and each outbound call takes a token first.
+
+Outbound calls are classed by priority. Interactive calls (a driver waiting for
+a plan) may empty the upstream buckets; batch calls (management commands) and
+background calls (POI refresh, live re-plans) only get the tokens above a
+reserve, so they never use up what the drivers need. Interactive and background
+calls are refused right away with UpstreamThrottled, batch calls wait.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DatabaseError
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+from trip.models import RateBucket
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+BACKGROUND = 'background'
+
+# Share of each upstream bucket that a priority class leaves to the ones above it.
+RESERVES = {INTERACTIVE: 0, BATCH: 0.5, BACKGROUND: 0.75}
+
+_priority = ContextVar('admission_priority', default=INTERACTIVE)
+
+
+class UpstreamThrottled(Throttled):
+    """
+    Raised when the shared budget of an upstream is spent. Left uncaught in a DRF view,
+    it is answered with a 429 and a Retry-After header.
+    """
+    def __init__(self, upstream, wait):
+        super().__init__(wait, f"Too many {upstream} requests, retry later.")
+        self.upstream = upstream
+
+
+@contextmanager
+def priority(level):
+    """
+    Runs the upstream calls made inside the block (in this thread or task) with the given priority.
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def admit_upstream(upstream):
+    """
+    Takes a token from the upstream's shared bucket (settings.UPSTREAM_RATES) before a call.
+    :raises UpstreamThrottled: when the call can't be made now, except for batch calls which wait
+    """
+    rate, capacity = settings.UPSTREAM_RATES[upstream]
+    level = _priority.get()
+    while True:
+        try:
+            wait = RateBucket.take(f"upstream:{upstream}", rate, capacity, reserve=RESERVES[level] * capacity)
+        except DatabaseError as e:
+            # The limiter must not take the planner down with it.
+            print(f"Error checking the {upstream} rate limit: {e}")
+            return
+        if not wait:
+            return
+        if level != BATCH:
+            raise UpstreamThrottled(upstream, wait)
+        time.sleep(wait)
+
+
+def take_user_token(scope, user_id):
+    """
+    Takes a token from the driver's bucket of an endpoint (settings.USER_RATES[scope]).
+    :return: 0 when admitted, otherwise the seconds to wait
+    """
+    rate, capacity = settings.USER_RATES[scope]
+    try:
+        return RateBucket.take(f"user:{scope}:{user_id}", rate, capacity)
+    except DatabaseError as e:
+        print(f"Error checking the {scope} rate limit of user {user_id}: {e}")
+        return 0
+
+
+class PlanRateThrottle(BaseThrottle):
+    """
+    Per-driver token bucket of the planning endpoints.
+    """
+    scope = 'plan'
+
+    def allow_request(self, request, view):
+        self.wait_time = None
+        if not request.user or not request.user.is_authenticated:
+            return True
+        self.wait_time = take_user_token(self.scope, request.user.id)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
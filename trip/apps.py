@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class TripConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'trip'
+
+    def ready(self):
+        from trip.models import TruckAssignment, TruckProfile
+        from trip.profiles import invalidate_profiles
+
+        for model in (TruckProfile, TruckAssignment):
+            post_save.connect(invalidate_profiles, sender=model, dispatch_uid=f'invalidate_profiles_{model.__name__}')
+            post_delete.connect(invalidate_profiles, sender=model, dispatch_uid=f'invalidate_profiles_{model.__name__}')
@@ -0,0 +1,207 @@
+"""
+Hours-of-service compliance engine.
+
+A driver's log is loaded once into columnar NumPy arrays (one row per duty
+interval, sorted by user then start time) and every rule is evaluated with
+segmented cumulative sums over the whole fleet at once.
+"""
+from datetime import datetime, timezone
+import numpy as np
+from trip.models import TripDriving, TripBreak
+from truck_api.db_router import use_replica
+
+MAX_DRIVING = 11 * 3600
+MAX_WINDOW = 14 * 3600
+MAX_DRIVING_BEFORE_BREAK = 8 * 3600
+MIN_BREAK = 30 * 60
+MIN_SHIFT_RESET = 10 * 3600
+MAX_CYCLE = 70 * 3600
+CYCLE_DAYS = 8
+MIN_CYCLE_RESTART = 34 * 3600
+
+# Spacing between drivers on the composite (user, time) axis, larger than any epoch in seconds.
+_USER_STRIDE = 10 ** 11
+
+def _seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(int(seconds), tz=timezone.utc)
+
+@use_replica()
+def load_log(user_ids=None, start=None, end=None):
+    """
+    Loads the driving and on-duty intervals of the drivers into arrays.
+    :param user_ids: list of user ids, None for the whole fleet
+    :param start: only intervals beginning after this datetime
+    :param end: only intervals beginning before this datetime
+    :return: dict of arrays user, start, end (epoch seconds) and driving (bool)
+    """
+    filters = {}
+    if user_ids is not None:
+        filters['tripconfig__user_id__in'] = user_ids
+    if start is not None:
+        filters['begin__gte'] = start
+    if end is not None:
+        filters['begin__lt'] = end
+
+    drivings = list(TripDriving.objects.filter(**filters).values_list('tripconfig__user_id', 'begin', 'time_total'))
+    breaks = list(
+        TripBreak.objects.filter(**filters)
+        .exclude(reason=TripBreak.ReasonChoices.REST)
+        .values_list('tripconfig__user_id', 'begin', 'end')
+    )
+
+    size = len(drivings) + len(breaks)
+    user = np.empty(size, dtype=np.int64)
+    begin = np.empty(size, dtype=np.int64)
+    finish = np.empty(size, dtype=np.int64)
+    driving = np.zeros(size, dtype=bool)
+
+    for i, (user_id, begin_at, time_total) in enumerate(drivings):
+        user[i] = user_id
+        begin[i] = int(begin_at.timestamp())
+        finish[i] = begin[i] + _seconds(time_total)
+    driving[:len(drivings)] = True
+
+    offset = len(drivings)
+    for i, (user_id, begin_at, end_at) in enumerate(breaks):
+        user[offset + i] = user_id
+        begin[offset + i] = int(begin_at.timestamp())
+        finish[offset + i] = int(end_at.timestamp())
+
+    order = np.lexsort((begin, user))
+    return {
+        'user': user[order],
+        'start': begin[order],
+        'end': finish[order],
+        'driving': driving[order],
+    }
+
+def _new_segments(user, gaps, threshold):
+    """
+    Marks the rows starting a new segment: first row of a driver or after a gap of at least threshold.
+    """
+    mask = np.ones(len(user), dtype=bool)
+    if len(user) > 1:
+        mask[1:] = (user[1:] != user[:-1]) | (gaps >= threshold)
+    return mask
+
+def _gaps(user, start, end):
+    """
+    Off-duty time before each row (from the latest end seen so far for the same driver).
+    """
+    if len(start) < 2:
+        return np.empty(0, dtype=np.int64)
+    latest_end = np.maximum.accumulate(end + user * _USER_STRIDE) - user * _USER_STRIDE
+    return start[1:] - latest_end[:-1]
+
+def _segmented_cumsum(values, new_segment):
+    cumsum = np.cumsum(values)
+    segment = np.cumsum(new_segment) - 1
+    offsets = (cumsum - values)[new_segment]
+    return cumsum - offsets[segment], segment
+
+def _violations(rule, mask, user, at, excess):
+    return [
+        {'user_id': int(u), 'rule': rule, 'at': _timestamp(t).isoformat(), 'excess': int(x)}
+        for u, t, x in zip(user[mask], at[mask], excess[mask])
+    ]
+
+def audit(log, as_of=None):
+    """
+    Evaluates the 11-hour, 14-hour, 30-minute break and 70-hour/8-day rules (with 34-hour restart).
+    :param log: arrays returned by load_log
+    :param as_of: datetime used for the remaining allowances, defaults to now
+    :return: dict user_id -> {"violations": [...], "remaining": {...}}
+    """
+    as_of = int((as_of or datetime.now(timezone.utc)).timestamp())
+    user = log['user']
+    start = log['start']
+    end = log['end']
+    driving = log['driving']
+    duration = end - start
+
+    gaps = _gaps(user, start, end)
+
+    # Shifts: 11-hour driving and 14-hour window.
+    new_shift = _new_segments(user, gaps, MIN_SHIFT_RESET)
+    shift_driving, shift = _segmented_cumsum(np.where(driving, duration, 0), new_shift)
+    shift_start = start[new_shift][shift]
+
+    over_11 = driving & (shift_driving > MAX_DRIVING)
+    over_14 = driving & (end > shift_start + MAX_WINDOW)
+
+    # 30-minute break: any non-driving period of 30 minutes interrupts driving.
+    d_user = user[driving]
+    d_start = start[driving]
+    d_end = end[driving]
+    new_block = _new_segments(d_user, _gaps(d_user, d_start, d_end), MIN_BREAK)
+    block_driving, block = _segmented_cumsum(d_end - d_start, new_block)
+    over_8 = block_driving > MAX_DRIVING_BEFORE_BREAK
+
+    # 70-hour / 8-day cycle, reset by a 34-hour restart.
+    new_cycle = _new_segments(user, gaps, MIN_CYCLE_RESTART)
+    cycle = np.cumsum(new_cycle) - 1
+    cycle_first = np.flatnonzero(new_cycle)[cycle]
+    on_duty = np.cumsum(duration)
+    axis = start + user * _USER_STRIDE
+    window_first = np.searchsorted(axis, end + user * _USER_STRIDE - CYCLE_DAYS * 86400, side='left')
+    first = np.maximum(window_first, cycle_first)
+    cycle_on_duty = on_duty - (on_duty - duration)[first]
+    over_70 = cycle_on_duty > MAX_CYCLE
+
+    report = {}
+    for u in np.unique(user):
+        report[int(u)] = {'violations': [], 'remaining': None, 'last_duty_end': None}
+
+    violations = (
+        _violations('11h_driving', over_11, user, end, np.minimum(duration, shift_driving - MAX_DRIVING))
+        + _violations('14h_window', over_14, user, end, np.minimum(duration, end - shift_start - MAX_WINDOW))
+        + _violations('30min_break', over_8, d_user, d_end, np.minimum(d_end - d_start, block_driving - MAX_DRIVING_BEFORE_BREAK))
+        + _violations('70h_cycle', over_70, user, end, np.minimum(duration, cycle_on_duty - MAX_CYCLE))
+    )
+    for violation in violations:
+        report[violation['user_id']]['violations'].append(violation)
+
+    # Remaining allowances, taken from the last row of every driver.
+    if len(user):
+        last = np.flatnonzero(np.append(user[1:] != user[:-1], True))
+        d_last = np.flatnonzero(np.append(d_user[1:] != d_user[:-1], True)) if len(d_user) else np.empty(0, dtype=np.int64)
+        d_last_by_user = dict(zip(d_user[d_last].tolist(), d_last.tolist()))
+        latest_end = np.maximum.accumulate(end + user * _USER_STRIDE) - user * _USER_STRIDE
+
+        for i in last.tolist():
+            u = int(user[i])
+            rest = as_of - int(latest_end[i])
+            fresh_shift = rest >= MIN_SHIFT_RESET
+            fresh_cycle = rest >= MIN_CYCLE_RESTART
+
+            driving_left = MAX_DRIVING if fresh_shift else MAX_DRIVING - int(shift_driving[i])
+            window_left = MAX_WINDOW if fresh_shift else int(shift_start[i]) + MAX_WINDOW - as_of
+
+            j = d_last_by_user.get(u)
+            if j is None or fresh_shift or as_of - int(d_end[j]) >= MIN_BREAK:
+                break_left = MAX_DRIVING_BEFORE_BREAK
+            else:
+                break_left = MAX_DRIVING_BEFORE_BREAK - int(block_driving[j])
+
+            if fresh_cycle:
+                cycle_left = MAX_CYCLE
+            else:
+                lower = max(int(np.searchsorted(axis, as_of + u * _USER_STRIDE - CYCLE_DAYS * 86400)), int(cycle_first[i]))
+                used = int(on_duty[i] - (on_duty[lower] - duration[lower])) if lower <= i else 0
+                cycle_left = MAX_CYCLE - used
+
+            report[u]['last_duty_end'] = _timestamp(latest_end[i]).isoformat()
+            report[u]['remaining'] = {
+                'driving': max(driving_left, 0),
+                'window': max(window_left, 0),
+                'before_break': max(break_left, 0),
+                'cycle': max(cycle_left, 0),
+            }
+
+    return report
+
+def audit_users(user_ids=None, start=None, end=None, as_of=None):
+    return audit(load_log(user_ids, start, end), as_of)
@@ -0,0 +1,262 @@
+"""
+What-if evaluation of driver/load assignments for dispatch.
+
+The routes and the drivers' HOS state are loaded once in the parent process.
+Every (driver, load) pair is then evaluated with a duration-only version of
+the planner's stop placement (pickup, dropoff, rest, sleeper and refueling
+stops, without POI lookups) with the driver's truck profile. The pairs are split by driver over a process
+pool whose workers receive the read-only arrays once, at start. The result is
+a completion-time matrix and the assignment minimizing the total completion
+time (Hungarian algorithm).
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from trip.models import TripConfig, TripRefueling
+from trip.profiles import FEDERAL, get_profiles
+from trip.views import get_route_table
+
+METERS_PER_MILE = 1609.34
+
+# Points per side of each OSRM table request.
+TABLE_CHUNK_SIZE = 50
+# Below this number of pairs, the evaluation runs in the calling process.
+MIN_PARALLEL_PAIRS = 200
+
+def load_driver_states(user_ids, plannedStartDate, profiles):
+    """
+    Returns user_id -> (remaining driving time, driving time before rest, distance since last refueling),
+    or None when the driver's logs don't allow a departure at plannedStartDate.
+    """
+    states = {}
+    for user_id in user_ids:
+        try:
+            remaining_time_driving, rest_duration = TripConfig.get_current_cycle_by_user_id(user_id, plannedStartDate, profiles[user_id])
+            distance = TripRefueling.get_total_distance_after_last_refueling(user_id)
+            states[user_id] = (remaining_time_driving, rest_duration, distance)
+        except Exception as e:
+            print(f"Error loading the HOS state of user {user_id}: {e}")
+            states[user_id] = None
+    return states
+
+def get_table_block(origins, destinations):
+    """
+    Returns the (len(origins), len(destinations)) durations (s) and distances (m) arrays, NaN when there is no route.
+    """
+    durations = np.full((len(origins), len(destinations)), np.nan)
+    distances = np.full((len(origins), len(destinations)), np.nan)
+    for i in range(0, len(origins), TABLE_CHUNK_SIZE):
+        for j in range(0, len(destinations), TABLE_CHUNK_SIZE):
+            sources = origins[i:i + TABLE_CHUNK_SIZE]
+            targets = destinations[j:j + TABLE_CHUNK_SIZE]
+            table = get_route_table(list(sources) + list(targets))
+            if table is None:
+                continue
+            block_durations, block_distances = table
+            for a in range(len(sources)):
+                for b in range(len(targets)):
+                    duration = block_durations[a][len(sources) + b]
+                    distance = block_distances[a][len(sources) + b]
+                    if duration is not None and distance is not None:
+                        durations[i + a, j + b] = duration
+                        distances[i + a, j + b] = distance
+    return durations, distances
+
+def estimate_completion(legs, remaining_time_driving, rest_duration, distance_after_refueling, profile=FEDERAL):
+    """
+    Time needed to drive the legs with the stops plan_trip and get_points_refuelings would add.
+    :param legs: list of (driving duration s, distance m, duration of the stop at the end of the leg s)
+    :param profile: TruckProfile giving the stop durations and the limits
+    :return: seconds from departure to the end of the last stop
+    """
+    total = 0
+    distance = 0
+    for duration, leg_distance, stop_duration in legs:
+        distance += leg_distance / METERS_PER_MILE
+        while True:
+            limit = remaining_time_driving if rest_duration is None else min(remaining_time_driving, rest_duration)
+            if duration <= limit:
+                break
+            driven = max(limit, 0)
+            total += driven
+            duration -= driven
+            if remaining_time_driving <= limit:
+                total += profile.sleeper_duration
+                remaining_time_driving = profile.max_driving
+                rest_duration = profile.max_driving_before_break
+            else:
+                total += profile.break_duration
+                remaining_time_driving -= driven
+                rest_duration = None
+        total += duration + stop_duration
+        remaining_time_driving -= duration
+        if rest_duration is not None:
+            rest_duration -= duration
+
+    refuels = math.floor((distance_after_refueling + distance) / profile.fuel_range)
+    return total + refuels * profile.refuel_duration
+
+_shared = None
+
+def _init_worker(shared):
+    global _shared
+    _shared = shared
+
+def _evaluate_drivers(driver_indices):
+    """
+    Completion times of the loads for some drivers, from the arrays given to _init_worker.
+    """
+    shared = _shared
+    rows = []
+    for i in driver_indices:
+        state = shared["states"][i]
+        profile = shared["profiles"][i]
+        row = np.full(len(shared["load_durations"]), np.inf)
+        if state is not None:
+            for j in range(len(row)):
+                to_pickup = shared["to_pickup_durations"][i, j]
+                load = shared["load_durations"][j]
+                if np.isnan(to_pickup) or np.isnan(load):
+                    continue
+                completion = estimate_completion(
+                    [
+                        (to_pickup, shared["to_pickup_distances"][i, j], profile.pickup_duration),
+                        (load, shared["load_distances"][j], profile.dropoff_duration),
+                    ],
+                    *state,
+                    profile,
+                )
+                if completion <= shared["deadlines"][j]:
+                    row[j] = completion
+        rows.append((i, row))
+    return rows
+
+def assign(cost):
+    """
+    Minimum-cost assignment of rows to columns (Hungarian algorithm, rectangular matrices accepted).
+    :param cost: 2-D array, np.inf for forbidden pairs
+    :return: list of (row, column), forbidden pairs left out
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    transposed = cost.shape[0] > cost.shape[1]
+    matrix = cost.T if transposed else cost
+    n, m = matrix.shape
+    if n == 0:
+        return []
+
+    finite = np.isfinite(matrix)
+    # Any forbidden pair costs more than every allowed assignment together.
+    forbidden = (np.abs(matrix[finite]).sum() + 1) * 2 if finite.any() else 1.0
+    a = np.where(finite, matrix, forbidden)
+
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = a[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    pairs = [(int(p[j]) - 1, j - 1) for j in range(1, m + 1) if p[j] != 0]
+    pairs = [(row, column) for row, column in pairs if finite[row, column]]
+    if transposed:
+        pairs = [(column, row) for row, column in pairs]
+    return sorted(pairs)
+
+def evaluate_assignments(drivers, loads, start=None, workers=None):
+    """
+    :param drivers: list of {"user_id", "lat", "lng"}
+    :param loads: list of {"id", "pickup": [lat, lng], "dropoff": [lat, lng], "deadline": optional ISO 8601}
+    :param start: departure datetime, defaults to now
+    :param workers: number of processes, defaults to the number of cores
+    :return: {"drivers", "loads", "cost" (completion seconds, None when infeasible), "assignment"}
+    """
+    start = start or datetime.now(timezone.utc)
+    user_ids = [driver["user_id"] for driver in drivers]
+    profiles = get_profiles(user_ids)
+    states = load_driver_states(user_ids, start, profiles)
+
+    positions = [(float(driver["lat"]), float(driver["lng"])) for driver in drivers]
+    pickups = [(float(load["pickup"][0]), float(load["pickup"][1])) for load in loads]
+    dropoffs = [(float(load["dropoff"][0]), float(load["dropoff"][1])) for load in loads]
+
+    to_pickup_durations, to_pickup_distances = get_table_block(positions, pickups)
+    # Only the diagonal of the pickups x dropoffs blocks is needed.
+    load_durations = np.full(len(loads), np.nan)
+    load_distances = np.full(len(loads), np.nan)
+    for k in range(0, len(loads), TABLE_CHUNK_SIZE):
+        durations, distances = get_table_block(pickups[k:k + TABLE_CHUNK_SIZE], dropoffs[k:k + TABLE_CHUNK_SIZE])
+        load_durations[k:k + TABLE_CHUNK_SIZE] = np.diagonal(durations)
+        load_distances[k:k + TABLE_CHUNK_SIZE] = np.diagonal(distances)
+
+    deadlines = np.full(len(loads), np.inf)
+    for j, load in enumerate(loads):
+        if load.get("deadline"):
+            deadline = datetime.fromisoformat(load["deadline"])
+            if deadline.tzinfo is None:
+                deadline = deadline.replace(tzinfo=timezone.utc)
+            deadlines[j] = (deadline - start).total_seconds()
+
+    shared = {
+        "states": [states[driver["user_id"]] for driver in drivers],
+        "profiles": [profiles[driver["user_id"]] for driver in drivers],
+        "to_pickup_durations": to_pickup_durations,
+        "to_pickup_distances": to_pickup_distances,
+        "load_durations": load_durations,
+        "load_distances": load_distances,
+        "deadlines": deadlines,
+    }
+
+    workers = workers or os.cpu_count() or 1
+    indices = list(range(len(drivers)))
+    cost = np.full((len(drivers), len(loads)), np.inf)
+    if workers == 1 or len(drivers) * len(loads) < MIN_PARALLEL_PAIRS:
+        _init_worker(shared)
+        results = [_evaluate_drivers(indices)]
+    else:
+        chunk_size = max(1, math.ceil(len(indices) / (workers * 4)))
+        chunks = [indices[k:k + chunk_size] for k in range(0, len(indices), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared,)) as executor:
+            results = list(executor.map(_evaluate_drivers, chunks))
+    for rows in results:
+        for i, row in rows:
+            cost[i] = row
+
+    return {
+        "drivers": [driver["user_id"] for driver in drivers],
+        "loads": [load["id"] for load in loads],
+        "cost": [[int(round(c)) if np.isfinite(c) else None for c in row] for row in cost],
+        "assignment": [
+            {
+                "user_id": drivers[i]["user_id"],
+                "load": loads[j]["id"],
+                "completion": (start + timedelta(seconds=float(cost[i, j]))).isoformat(),
+            }
+            for i, j in assign(cost)
+        ],
+    }
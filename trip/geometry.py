@@ -0,0 +1,210 @@
+import hashlib
+import math
+
+POLYLINE_PRECISION = 6
+
+# Douglas-Peucker tolerance (in degrees) for each zoom level served to the front.
+# The highest zoom keeps every point returned by OSRM.
+ZOOM_TOLERANCES = {
+    5: 0.01,
+    8: 0.001,
+    11: 0.0001,
+    14: 0.0,
+}
+
+def get_plan_key(waypoints):
+    """
+    Returns a stable key for a list of (lat, lng) waypoints.
+    """
+    raw = ";".join([f"{float(lat):.5f},{float(lng):.5f}" for lat, lng in waypoints])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else (value << 1)
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+def encode_polyline(coordinates, precision=POLYLINE_PRECISION):
+    """
+    Encodes a list of (lat, lng) with the Google polyline algorithm.
+    :param coordinates: list of (lat, lng)
+    :param precision: 5 for polyline, 6 for polyline6 (OSRM)
+    """
+    factor = 10 ** precision
+    result = []
+    prev_lat = 0
+    prev_lng = 0
+    for lat, lng in coordinates:
+        lat_i = int(round(lat * factor))
+        lng_i = int(round(lng * factor))
+        result.append(_encode_value(lat_i - prev_lat))
+        result.append(_encode_value(lng_i - prev_lng))
+        prev_lat = lat_i
+        prev_lng = lng_i
+    return "".join(result)
+
+def decode_polyline(encoded, precision=POLYLINE_PRECISION):
+    """
+    Decodes a polyline string into a list of (lat, lng).
+    """
+    factor = 10 ** precision
+    coordinates = []
+    index = 0
+    lat = 0
+    lng = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = 0
+            value = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                value |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(value >> 1) if value & 1 else (value >> 1))
+        lat += deltas[0]
+        lng += deltas[1]
+        coordinates.append((lat / factor, lng / factor))
+    return coordinates
+
+def _perpendicular_distance(point, start, end):
+    if start == end:
+        return ((point[0] - start[0]) ** 2 + (point[1] - start[1]) ** 2) ** 0.5
+    dx = end[0] - start[0]
+    dy = end[1] - start[1]
+    return abs(dy * point[0] - dx * point[1] + end[0] * start[1] - end[1] * start[0]) / ((dx * dx + dy * dy) ** 0.5)
+
+def simplify(coordinates, tolerance):
+    """
+    Douglas-Peucker simplification, iterative so long routes don't hit the recursion limit.
+    :param coordinates: list of (lat, lng)
+    :param tolerance: maximum deviation in degrees, 0 keeps every point
+    """
+    if tolerance <= 0 or len(coordinates) < 3:
+        return list(coordinates)
+
+    keep = [False] * len(coordinates)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(coordinates) - 1)]
+    while stack:
+        first, last = stack.pop()
+        max_distance = 0
+        index = None
+        for i in range(first + 1, last):
+            distance = _perpendicular_distance(coordinates[i], coordinates[first], coordinates[last])
+            if distance > max_distance:
+                max_distance = distance
+                index = i
+        if index is not None and max_distance > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [coord for coord, kept in zip(coordinates, keep) if kept]
+
+def build_levels(coordinates):
+    """
+    Returns the encoded polyline of the route for every zoom of ZOOM_TOLERANCES.
+    :param coordinates: list of (lat, lng)
+    """
+    return {
+        str(zoom): encode_polyline(simplify(coordinates, tolerance))
+        for zoom, tolerance in ZOOM_TOLERANCES.items()
+    }
+
+def pick_level(levels, zoom):
+    """
+    Returns the encoded polyline with the highest zoom not above the requested one.
+    """
+    zooms = sorted(int(z) for z in levels)
+    if not zooms:
+        return None
+    if zoom is None:
+        return levels[str(zooms[-1])]
+    candidates = [z for z in zooms if z <= zoom]
+    return levels[str(candidates[-1] if candidates else zooms[0])]
+
+def haversine(point1, point2):
+    """
+    Great-circle distance in meters between two (lat, lng).
+    """
+    lat1, lng1 = math.radians(point1[0]), math.radians(point1[1])
+    lat2, lng2 = math.radians(point2[0]), math.radians(point2[1])
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(h))
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def geohash_encode(lat, lng, precision):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        target, current = (lng_range, lng) if even else (lat_range, lat)
+        middle = (target[0] + target[1]) / 2
+        value <<= 1
+        if current >= middle:
+            value |= 1
+            target[0] = middle
+        else:
+            target[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+def geohash_bbox(geohash):
+    """
+    Returns (south, west, north, east) of a geohash tile.
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            target = lng_range if even else lat_range
+            middle = (target[0] + target[1]) / 2
+            if (value >> shift) & 1:
+                target[0] = middle
+            else:
+                target[1] = middle
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+def geohash_tiles_around(lat, lng, radius, precision):
+    """
+    Returns the geohash tiles covering the square of side 2 * radius meters centered on (lat, lng).
+    """
+    lat_bits = (5 * precision) // 2
+    lng_bits = 5 * precision - lat_bits
+    tile_lat = 180 / (2 ** lat_bits)
+    tile_lng = 360 / (2 ** lng_bits)
+    delta_lat = radius / 111320
+    delta_lng = radius / (111320 * max(math.cos(math.radians(lat)), 0.01))
+
+    tiles = []
+    steps_lat = int(math.ceil(2 * delta_lat / tile_lat)) + 1
+    steps_lng = int(math.ceil(2 * delta_lng / tile_lng)) + 1
+    for i in range(steps_lat + 1):
+        point_lat = min(lat - delta_lat + i * tile_lat, lat + delta_lat)
+        for j in range(steps_lng + 1):
+            point_lng = min(lng - delta_lng + j * tile_lng, lng + delta_lng)
+            tile = geohash_encode(point_lat, point_lng, precision)
+            if tile not in tiles:
+                tiles.append(tile)
+    return tiles
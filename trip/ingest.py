@@ -0,0 +1,310 @@
+"""
+Ingestion of the GPS/ELD events sent by the in-cab devices.
+
+Events are validated, buffered in memory per worker and flushed in batches,
+with COPY on PostgreSQL and multi-row inserts elsewhere, when the buffer is
+full or every FLUSH_INTERVAL seconds. A batch the database refuses is split
+until the offending events are isolated; those go to DeadDriverEvent and the
+others are written. Batches failing because the database is unreachable are
+put back in the buffer. derive_intervals() later turns the events into
+TripDriving/TripBreak rows, driver by driver from each driver's EventCursor.
+"""
+import atexit
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from numbers import Number
+from django.db import DatabaseError, InterfaceError, OperationalError, connection, transaction
+from django.db.models import Exists, OuterRef, Q, Subquery
+from trip.geometry import haversine
+from trip.models import DeadDriverEvent, DriverEvent, EventCursor, TripBreak, TripConfig, TripDriving, timedelta_to_time
+
+FLUSH_SIZE = 5000
+FLUSH_INTERVAL = 1.0
+MAX_BUFFER = 200000
+# Events arriving later than this are not taken into account by derive_intervals.
+DERIVE_LAG = timedelta(minutes=5)
+
+# Events recorded outside of [MIN_EVENT_TIME, now + MAX_CLOCK_SKEW] are refused.
+MIN_EVENT_TIME = datetime(2000, 1, 1, tzinfo=timezone.utc)
+MAX_CLOCK_SKEW = timedelta(days=1)
+
+_STATUSES = {choice.value for choice in DriverEvent.StatusChoices}
+_COLUMNS = ('user_id', 'recorded_at', 'lat', 'lng', 'speed', 'status')
+# Field -> (min, max) of the optional numeric fields.
+_BOUNDS = {'lat': (-90, 90), 'lng': (-180, 180), 'speed': (0, 1000)}
+
+
+class EventBuffer:
+    def __init__(self, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL, max_size=MAX_BUFFER):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self._rows = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+
+    def add(self, rows):
+        """
+        Adds validated rows (tuples in _COLUMNS order). Once added, the rows are the buffer's:
+        a failing flush is not the caller's error, the rows will be written by a later one.
+        :return: False when the buffer is full and the rows were refused
+        """
+        with self._lock:
+            if len(self._rows) + len(rows) > self.max_size:
+                return False
+            self._rows.extend(rows)
+            full = len(self._rows) >= self.flush_size
+        self._start_flusher()
+        if full:
+            self.flush()
+        return True
+
+    def flush(self):
+        """
+        :return: number of rows written or dead-lettered
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            try:
+                left = write_or_dead_letter(rows)
+            except Exception as e:
+                print(f"Error writing {len(rows)} driver events: {e}")
+                left = rows
+            if left:
+                print(f"{len(left)} driver events kept for the next flush")
+                with self._lock:
+                    self._rows[:0] = left[:self.max_size - len(self._rows)]
+            return len(rows) - len(left)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+    def _start_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                self._flusher.start()
+
+
+def write_events(rows):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            with cursor.copy(f"COPY driverevent ({', '.join(_COLUMNS)}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+        return
+
+    DriverEvent.objects.bulk_create(
+        [DriverEvent(**dict(zip(_COLUMNS, row))) for row in rows],
+        batch_size=1000,
+    )
+
+
+def write_or_dead_letter(rows):
+    """
+    Writes the rows, halving a batch the database refuses until the refused rows are
+    isolated and stored in DeadDriverEvent.
+    :return: rows not written because the database couldn't be reached
+    """
+    try:
+        with transaction.atomic():
+            write_events(rows)
+    except (OperationalError, InterfaceError) as e:
+        print(f"Database unreachable while writing {len(rows)} driver events: {e}")
+        return rows
+    except DatabaseError as e:
+        if len(rows) > 1:
+            middle = len(rows) // 2
+            return write_or_dead_letter(rows[:middle]) + write_or_dead_letter(rows[middle:])
+        user_id, recorded_at, lat, lng, speed, status = rows[0]
+        print(f"Driver event of user {user_id} refused, dead-lettered: {e}")
+        try:
+            DeadDriverEvent.objects.create(
+                user_id=user_id,
+                event={"t": str(recorded_at), "lat": lat, "lng": lng, "speed": speed, "status": status},
+                error=str(e),
+            )
+        except Exception as error:
+            print(f"Error dead-lettering a driver event: {error}")
+            return rows
+    return []
+
+
+def _parse_number(event, field):
+    value = event.get(field)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, Number) or not math.isfinite(value):
+        raise ValueError(f"{field} must be a number")
+    low, high = _BOUNDS[field]
+    if not low <= value <= high:
+        raise ValueError(f"{field} must be between {low} and {high}")
+    return float(value)
+
+
+def _parse_time(value, latest):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if not math.isfinite(value) or not MIN_EVENT_TIME.timestamp() <= value <= latest.timestamp():
+            raise ValueError("Event time out of range")
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    if not isinstance(value, str):
+        raise ValueError("Missing event time")
+    recorded_at = datetime.fromisoformat(value)
+    if recorded_at.tzinfo is None:
+        recorded_at = recorded_at.replace(tzinfo=timezone.utc)
+    if not MIN_EVENT_TIME <= recorded_at <= latest:
+        raise ValueError("Event time out of range")
+    return recorded_at
+
+
+def parse_events(user_id, events):
+    """
+    Validates the events sent by a device.
+    :param events: list of {"t": epoch seconds or ISO 8601, "lat", "lng", "speed", "status"}
+    :return: list of rows in _COLUMNS order
+    :raises ValueError: for the first invalid event
+    """
+    latest = datetime.now(timezone.utc) + MAX_CLOCK_SKEW
+    rows = []
+    for event in events:
+        if not isinstance(event, dict):
+            raise ValueError("Events must be objects")
+        status = event.get("status")
+        if status not in _STATUSES:
+            raise ValueError(f"Invalid status {status!r}")
+        rows.append((
+            user_id, _parse_time(event.get("t"), latest),
+            _parse_number(event, "lat"), _parse_number(event, "lng"), _parse_number(event, "speed"), status,
+        ))
+    return rows
+
+
+buffer = EventBuffer()
+atexit.register(lambda: buffer.flush())
+
+
+def _save_run(trip_configs, rows, user_id, status, begin, end, distance):
+    """
+    Adds one run of events with the same status, as a TripDriving or a TripBreak, to rows.
+    One TripConfig per driver and day groups the derived rows, found again by the later passes
+    (no waypoints, at midnight UTC).
+    """
+    if end <= begin:
+        return
+    day = begin.date()
+    midnight = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    trip_config = trip_configs.get((user_id, day))
+    if trip_config is None:
+        trip_config = TripConfig.objects.filter(user_id=user_id, datetimeUTC=midnight, ways=[]).order_by('id').first()
+    if trip_config is None:
+        trip_config = TripConfig.objects.create(
+            user_id=user_id,
+            ways=[],
+            totaldistance=0,
+            total_time_driving=timedelta_to_time(timedelta()),
+            datetimeUTC=midnight,
+        )
+    trip_configs[(user_id, day)] = trip_config
+
+    if status == DriverEvent.StatusChoices.DRIVING:
+        rows["drivings"].append(TripDriving(tripconfig=trip_config, begin=begin, time_total=timedelta_to_time(end - begin)))
+        trip_config.totaldistance += distance / 1609.34
+        driving = timedelta(hours=trip_config.total_time_driving.hour, minutes=trip_config.total_time_driving.minute, seconds=trip_config.total_time_driving.second)
+        trip_config.total_time_driving = timedelta_to_time(driving + (end - begin))
+    else:
+        reason = TripBreak.ReasonChoices.ON_DUTY if status == DriverEvent.StatusChoices.ON_DUTY else TripBreak.ReasonChoices.REST
+        rows["breaks"].append(TripBreak(tripconfig=trip_config, begin=begin, end=end, reason=reason))
+
+
+def _derive_driver(user_id, events, trip_configs, rows):
+    """
+    Saves the runs of one driver's events (ordered by time) that a later event closed.
+    The last run may still go on, it is left for a later pass.
+    :return: (events processed, time of the last event of the last closed run or None)
+    """
+    processed = 0
+    run = None
+    derived_until = None
+    previous_at = None
+    for recorded_at, lat, lng, status in events:
+        processed += 1
+        if run is not None and status != run["status"]:
+            # The run lasts until the next event.
+            _save_run(trip_configs, rows, user_id, run["status"], run["begin"], recorded_at, run["distance"])
+            derived_until = previous_at
+            run = None
+        previous_at = recorded_at
+
+        if run is None:
+            run = {"status": status, "begin": recorded_at, "distance": 0, "position": (lat, lng)}
+            continue
+        if lat is not None and lng is not None and run["position"][0] is not None:
+            run["distance"] += haversine(run["position"], (lat, lng))
+        if lat is not None and lng is not None:
+            run["position"] = (lat, lng)
+    return processed, derived_until
+
+
+def derive_intervals(until=None, since=None):
+    """
+    Turns the events recorded since each driver's EventCursor into TripDriving/TripBreak rows.
+    Every driver's events are read from their own cursor with the (user, recorded_at) index, so
+    an inactive driver doesn't make the others re-read their history. A run is saved once an
+    event with another status closes it; the cursor stays before the open run, which the next
+    pass reads again, so a run isn't split between two passes.
+    :param since: datetime used for the drivers without a cursor yet (first run)
+    :return: number of events processed
+    """
+    from users.models import User
+
+    until = until or datetime.now(timezone.utc) - DERIVE_LAG
+    # Only the drivers with events after their cursor are read, one index probe each.
+    pending = DriverEvent.objects.filter(user_id=OuterRef('id'), recorded_at__lt=until)
+    users = User.objects.annotate(
+        derived_until=Subquery(EventCursor.objects.filter(user_id=OuterRef('id')).values('derived_until')[:1]),
+    )
+    first_run = pending.filter(recorded_at__gt=since) if since is not None else pending
+    users = users.filter(
+        Q(Exists(pending.filter(recorded_at__gt=OuterRef('derived_until'))))
+        | Q(derived_until__isnull=True) & Q(Exists(first_run))
+    )
+
+    processed = 0
+    trip_configs = {}
+    rows = {"drivings": [], "breaks": []}
+    moved = []
+
+    with transaction.atomic():
+        for user_id, cursor in users.order_by('id').values_list('id', 'derived_until').iterator():
+            start = cursor or since
+            events = DriverEvent.objects.filter(user_id=user_id, recorded_at__lt=until)
+            if start is not None:
+                events = events.filter(recorded_at__gt=start)
+            events = events.order_by('recorded_at').values_list('recorded_at', 'lat', 'lng', 'status')
+            count, derived_until = _derive_driver(user_id, events.iterator(chunk_size=10000), trip_configs, rows)
+            processed += count
+            if derived_until is not None:
+                moved.append(EventCursor(user_id=user_id, derived_until=derived_until))
+
+        TripDriving.objects.bulk_create(rows["drivings"], batch_size=1000)
+        TripBreak.objects.bulk_create(rows["breaks"], batch_size=1000)
+        TripConfig.objects.bulk_update(trip_configs.values(), ['totaldistance', 'total_time_driving'], batch_size=1000)
+        EventCursor.objects.bulk_create(
+            moved, batch_size=1000,
+            update_conflicts=True, unique_fields=['user'], update_fields=['derived_until'],
+        )
+
+    return processed
@@ -0,0 +1,96 @@
+"""
+Precomputed routes between known hubs (see Hub, HubLane and the compute_lane_matrix command).
+
+Requested points are snapped to the nearest hub within SNAP_TOLERANCE meters;
+when every leg of a route is a known lane the route is answered without any
+call to OSRM.
+"""
+import time
+from trip.geometry import decode_polyline, haversine
+from trip.models import Hub, HubLane
+
+SNAP_TOLERANCE = 500
+CACHE_TTL = 300
+
+_cache = {"loaded_at": None, "hubs": [], "lanes": {}}
+
+def invalidate_lanes():
+    _cache["loaded_at"] = None
+
+def _load():
+    loaded_at = _cache["loaded_at"]
+    if loaded_at is not None and time.monotonic() - loaded_at < CACHE_TTL:
+        return
+    _cache["hubs"] = list(Hub.objects.values_list('id', 'lat', 'lng'))
+    _cache["lanes"] = {
+        (origin_id, destination_id): (distance, duration)
+        for origin_id, destination_id, distance, duration
+        in HubLane.objects.values_list('origin_id', 'destination_id', 'distance', 'duration')
+    }
+    _cache["loaded_at"] = time.monotonic()
+
+def snap_to_hub(point, tolerance=SNAP_TOLERANCE):
+    """
+    Returns the id of the nearest hub within tolerance meters of point, or None.
+    """
+    _load()
+    best_id = None
+    best_distance = tolerance
+    for hub_id, lat, lng in _cache["hubs"]:
+        distance = haversine((point[0], point[1]), (lat, lng))
+        if distance <= best_distance:
+            best_id = hub_id
+            best_distance = distance
+    return best_id
+
+def get_lane_route(waypoints, full=False):
+    """
+    Returns an OSRM-like route (distance in meters, duration in seconds, legs) built from precomputed lanes,
+    or None when one of the legs isn't a known lane.
+    :param full: also return the geojson geometry, like get_route_data_full
+    """
+    if len(waypoints) < 2:
+        return None
+    try:
+        hub_ids = [snap_to_hub(point) for point in waypoints]
+    except Exception as e:
+        print(f"Error loading hubs: {e}")
+        return None
+    if None in hub_ids:
+        return None
+
+    legs = []
+    for origin_id, destination_id in zip(hub_ids, hub_ids[1:]):
+        if origin_id == destination_id:
+            legs.append({"distance": 0, "duration": 0})
+            continue
+        lane = _cache["lanes"].get((origin_id, destination_id))
+        if lane is None:
+            return None
+        legs.append({"distance": lane[0], "duration": lane[1]})
+
+    route = {
+        "distance": sum(leg["distance"] for leg in legs),
+        "duration": sum(leg["duration"] for leg in legs),
+        "legs": legs,
+    }
+    if not full:
+        return route
+
+    pairs = [(o, d) for o, d in zip(hub_ids, hub_ids[1:]) if o != d]
+    geometries = {
+        (o, d): geometry
+        for o, d, geometry in HubLane.objects.filter(
+            origin_id__in=[o for o, _ in pairs], destination_id__in=[d for _, d in pairs]
+        ).values_list('origin_id', 'destination_id', 'geometry')
+    }
+    coordinates = []
+    for pair in pairs:
+        if not geometries.get(pair):
+            return None
+        coordinates.extend([[lng, lat] for lat, lng in decode_polyline(geometries[pair])])
+    if not coordinates:
+        coordinates = [[waypoints[0][1], waypoints[0][0]], [waypoints[-1][1], waypoints[-1][0]]]
+
+    route["geometry"] = {"type": "LineString", "coordinates": coordinates}
+    return route
@@ -0,0 +1,183 @@
+"""
+Live plan updates pushed to the drivers' apps as Server-Sent Events (ASGI only).
+
+A connection first receives the stops as the planner places them, then the
+full plan. Afterwards it stays idle: one task per worker polls the planning
+state of every connected driver (and the hub lanes version) in a single query
+every POLL_INTERVAL seconds, and only the connections whose state changed are
+re-planned. A new plan is pushed only when it differs from the last one sent.
+"""
+import asyncio
+import orjson
+from asgiref.sync import sync_to_async
+from datetime import datetime, timezone
+from django.db import close_old_connections
+from django.db.models import Max
+from trip.admission import BACKGROUND, UpstreamThrottled, priority
+from trip.models import DriverState, HubLane
+from trip.profiles import get_profiles
+
+POLL_INTERVAL = 15
+HEARTBEAT_INTERVAL = 20
+
+
+def _load_versions(user_ids):
+    """
+    Returns the version of the inputs of each driver's plan: planning state and hub lanes.
+    """
+    try:
+        states = DriverState.get_planning_states(user_ids, datetime.now(timezone.utc), get_profiles(user_ids))
+        lanes = HubLane.objects.aggregate(Max('computed_at'))['computed_at__max']
+        return {
+            user_id: (remaining, before_break, round(distance, 1), lanes)
+            for user_id, (remaining, before_break, distance) in states.items()
+        }
+    finally:
+        close_old_connections()
+
+
+class PlanWatcher:
+    def __init__(self, poll_interval=POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._subscribers = {}
+        self._versions = {}
+        self._task = None
+
+    def subscribe(self, user_id):
+        """
+        :return: asyncio.Queue receiving the driver's new planning state when its version changes
+        """
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+        return queue
+
+    def seen(self, user_id, version):
+        """
+        Records the version a connection planned with, so a change before the next poll is still pushed.
+        """
+        if user_id in self._subscribers:
+            self._versions.setdefault(user_id, version)
+
+    def unsubscribe(self, user_id, queue):
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+            self._versions.pop(user_id, None)
+
+    async def _poll(self):
+        while self._subscribers:
+            await asyncio.sleep(self.poll_interval)
+            user_ids = list(self._subscribers)
+            if not user_ids:
+                break
+            try:
+                versions = await sync_to_async(_load_versions)(user_ids)
+            except Exception as e:
+                print(f"Error loading the planning states: {e}")
+                continue
+
+            for user_id, version in versions.items():
+                if user_id not in self._subscribers:
+                    continue
+                previous = self._versions.get(user_id)
+                self._versions[user_id] = version
+                if previous is None or previous == version:
+                    continue
+                for queue in self._subscribers.get(user_id, ()):
+                    # Only the latest state matters, a waiting one is replaced.
+                    if queue.full():
+                        queue.get_nowait()
+                    queue.put_nowait(version[:3])
+
+
+watcher = PlanWatcher()
+
+
+def format_event(event, data):
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+async def stream_plan(user_id, current, pickup, dropoff, plan):
+    """
+    Async iterator of the SSE messages of one connection.
+    :param plan: plan(user_id, current, pickup, dropoff, planning_state=None, on_stop=None), run in a thread
+    """
+    loop = asyncio.get_running_loop()
+    messages = asyncio.Queue()
+    updates = watcher.subscribe(user_id)
+
+    def on_stop(stop):
+        loop.call_soon_threadsafe(messages.put_nowait, ("stop", dict(stop)))
+
+    def run_plan(planning_state=None, on_stop=None):
+        try:
+            return plan(user_id, current, pickup, dropoff, planning_state=planning_state, on_stop=on_stop)
+        finally:
+            close_old_connections()
+
+    def run_replan(planning_state):
+        # Nobody is waiting on a re-plan, it gives way to the interactive ones.
+        with priority(BACKGROUND):
+            return run_plan(planning_state)
+
+    def retry_replan(planning_state):
+        if not updates.full():
+            updates.put_nowait(planning_state)
+
+    async def first_plan():
+        try:
+            version = (await sync_to_async(_load_versions)([user_id]))[user_id]
+            watcher.seen(user_id, version)
+            result = await sync_to_async(run_plan, thread_sensitive=False)(version[:3], on_stop)
+            messages.put_nowait(("plan", result))
+        except Exception as e:
+            messages.put_nowait(("error", e))
+
+    task = loop.create_task(first_plan())
+    try:
+        while True:
+            kind, payload = await messages.get()
+            if kind == "stop":
+                yield format_event("stop", payload)
+                continue
+            if kind == "error":
+                yield format_event("error", {"detail": f"Error: {str(payload)}"})
+                return
+            data, status_code = payload
+            if status_code != 200:
+                yield format_event("error", data)
+                return
+            last_sent = orjson.dumps(data)
+            yield format_event("plan", data)
+            break
+
+        while True:
+            try:
+                planning_state = await asyncio.wait_for(updates.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+
+            try:
+                data, status_code = await sync_to_async(run_replan, thread_sensitive=False)(planning_state)
+            except UpstreamThrottled as e:
+                loop.call_later(e.wait, retry_replan, planning_state)
+                continue
+            except Exception as e:
+                yield format_event("error", {"detail": f"Error: {str(e)}"})
+                continue
+            if status_code != 200:
+                yield format_event("error", data)
+                continue
+            encoded = orjson.dumps(data)
+            if encoded != last_sent:
+                last_sent = encoded
+                yield format_event("plan", data)
+    finally:
+        task.cancel()
+        watcher.unsubscribe(user_id, updates)
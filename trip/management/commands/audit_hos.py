@@ -0,0 +1,30 @@
+import json
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand
+from trip.compliance import audit_users
+
+
+class Command(BaseCommand):
+    help = "Audits the hours-of-service logs of the fleet (or of some drivers) and prints the violations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help="User id, can be repeated")
+        parser.add_argument('--days', type=int, default=30, help="Number of days of logs to audit")
+        parser.add_argument('--json', action='store_true', help="Print the full report as JSON")
+
+    def handle(self, *args, **options):
+        now = datetime.now(timezone.utc)
+        # The 8-day cycle needs the days before the audited period.
+        start = now - timedelta(days=options['days'] + 8)
+        report = audit_users(options['users'], start=start, as_of=now)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        total = 0
+        for user_id, result in report.items():
+            for violation in result['violations']:
+                total += 1
+                self.stdout.write(f"user {user_id}: {violation['rule']} at {violation['at']} (+{violation['excess']}s)")
+        self.stdout.write(self.style.SUCCESS(f"{len(report)} drivers audited, {total} violations"))
@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+from django.core.management.base import BaseCommand
+from trip.geometry import encode_polyline
+from trip.lanes import invalidate_lanes
+from trip.models import Hub, HubLane
+from trip.views import _fetch_route_data_full, get_route_table
+from trip.admission import BATCH, priority
+
+
+class Command(BaseCommand):
+    help = "Computes the distance/duration matrix (and optionally the geometry) between every pair of hubs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--geometry', action='store_true', help="Also store the geometry of every lane (one route call per lane)")
+        parser.add_argument('--chunk-size', type=int, default=50, help="Hubs per side of each table request")
+
+    # Waits for the OSRM tokens the drivers' requests leave instead of failing.
+    @priority(BATCH)
+    def handle(self, *args, **options):
+        hubs = list(Hub.objects.order_by('id'))
+        chunk_size = options['chunk_size']
+        now = datetime.now(timezone.utc)
+        lanes = []
+
+        chunks = [hubs[i:i + chunk_size] for i in range(0, len(hubs), chunk_size)]
+        for origins in chunks:
+            for destinations in chunks:
+                points = [(h.lat, h.lng) for h in origins]
+                if destinations is not origins:
+                    points += [(h.lat, h.lng) for h in destinations]
+                if len(points) < 2:
+                    continue
+                table = get_route_table(points)
+                if table is None:
+                    self.stderr.write(f"Table request failed for {len(points)} hubs")
+                    continue
+                durations, distances = table
+                offset = 0 if destinations is origins else len(origins)
+                for i, origin in enumerate(origins):
+                    for j, destination in enumerate(destinations):
+                        if origin.id == destination.id:
+                            continue
+                        duration = durations[i][offset + j]
+                        distance = distances[i][offset + j]
+                        if duration is None or distance is None:
+                            continue
+                        lanes.append(HubLane(origin=origin, destination=destination, distance=distance, duration=duration, computed_at=now))
+
+        if options['geometry']:
+            for lane in lanes:
+                route = _fetch_route_data_full([(lane.origin.lat, lane.origin.lng), (lane.destination.lat, lane.destination.lng)])
+                if route is not None:
+                    lane.geometry = encode_polyline([(lat, lng) for lng, lat in route["geometry"]["coordinates"]])
+
+        update_fields = ['distance', 'duration', 'computed_at'] + (['geometry'] if options['geometry'] else [])
+        HubLane.objects.bulk_create(lanes, update_conflicts=True, unique_fields=['origin', 'destination'], update_fields=update_fields, batch_size=1000)
+        invalidate_lanes()
+        self.stdout.write(self.style.SUCCESS(f"{len(lanes)} lanes computed between {len(hubs)} hubs"))
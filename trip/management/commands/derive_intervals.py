@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_datetime
+from trip.ingest import derive_intervals
+
+
+class Command(BaseCommand):
+    help = "Turns the recorded driver events into TripDriving and TripBreak rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="ISO datetime to start from when no driver has been derived yet")
+
+    def handle(self, *args, **options):
+        since = parse_datetime(options['since']) if options['since'] else None
+        self.stdout.write(self.style.SUCCESS(f"{derive_intervals(since=since)} events processed"))
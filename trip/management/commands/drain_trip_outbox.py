@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand
+from trip.outbox import BATCH_SIZE, drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Saves the trips waiting in the outbox (TripSubmission) as TripConfig, TripDriving, TripBreak and TripRefueling rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--loop', type=float, metavar='SECONDS', help="Keep draining, waiting SECONDS between two passes")
+
+    def handle(self, *args, **options):
+        while True:
+            count = drain_outbox(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"{count} trips saved"))
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,28 @@
+import json
+import sys
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_datetime
+from trip.dispatch import evaluate_assignments
+from trip.admission import BATCH, priority
+
+
+class Command(BaseCommand):
+    help = "Evaluates every driver/load pairing and suggests an assignment (JSON in, JSON out)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='JSON file {"drivers": [{"user_id", "lat", "lng"}], "loads": [{"id", "pickup", "dropoff", "deadline"}]}, - for stdin')
+        parser.add_argument('--start', help="ISO datetime of the departure, defaults to now")
+        parser.add_argument('--workers', type=int, help="Number of processes, defaults to the number of cores")
+
+    # Waits for the OSRM tokens the drivers' requests leave instead of failing.
+    @priority(BATCH)
+    def handle(self, *args, **options):
+        if options['input'] == '-':
+            data = json.load(sys.stdin)
+        else:
+            with open(options['input']) as f:
+                data = json.load(f)
+
+        start = parse_datetime(options['start']) if options['start'] else None
+        result = evaluate_assignments(data.get("drivers", []), data.get("loads", []), start, options['workers'])
+        self.stdout.write(json.dumps(result, indent=2))
@@ -0,0 +1,20 @@
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand
+from trip.speed_profiles import learn_speed_profile
+
+
+class Command(BaseCommand):
+    help = "Learns the time-of-day correction factors of the OSRM durations from the plans and the recorded driving."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help="Learn from the plans saved in the last DAYS days")
+
+    def handle(self, *args, **options):
+        until = datetime.now(timezone.utc)
+        profile = learn_speed_profile(until - timedelta(days=options['days']), until)
+        if profile is None:
+            self.stdout.write("No leg could be matched with recorded driving, profile unchanged")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Speed profile learned from {profile.samples} legs ({len(profile.corridors)} corridors)"
+        ))
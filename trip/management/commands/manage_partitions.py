@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from trip.partitions import ARCHIVE_DIR, PARTITIONED_TABLES, archive_partitions, ensure_monthly_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the monthly partitions of the partitioned tables ahead of time, moves the rows of the default "
+        "partitions into their months and archives the old ones (PostgreSQL only). Run it at least monthly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=2)
+        parser.add_argument('--archive', action='store_true', help="Export, detach and drop the partitions older than --keep-months")
+        parser.add_argument('--keep-months', type=int, default=3)
+        parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+
+    def handle(self, *args, **options):
+        for table in PARTITIONED_TABLES:
+            for name in ensure_monthly_partitions(table, options['months_ahead']):
+                self.stdout.write(f"Created partition {name}")
+            if options['archive']:
+                for path in archive_partitions(table, options['keep_months'], options['archive_dir']):
+                    self.stdout.write(f"Archived {path}")
+        self.stdout.write(self.style.SUCCESS("Partitions are up to date"))
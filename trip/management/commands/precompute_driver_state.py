@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from trip.precompute import compute_driver_states, get_active_user_ids
+
+
+class Command(BaseCommand):
+    help = "Precomputes the hours-of-service state and distance since refueling of every active driver."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help="Drivers with a trip in the last DAYS days are active")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        user_ids = get_active_user_ids(options['days'])
+        total = 0
+        for i in range(0, len(user_ids), options['batch_size']):
+            total += compute_driver_states(user_ids[i:i + options['batch_size']])
+        self.stdout.write(self.style.SUCCESS(f"{total} driver states computed"))
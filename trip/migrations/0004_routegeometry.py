@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0003_remove_tripbreak_location_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteGeometry',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('key', models.CharField(max_length=40, unique=True)),
+                ('levels', models.JSONField()),
+                ('distance', models.FloatField()),
+                ('duration', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'routegeometry',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-19 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0004_routegeometry'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriverState',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('remaining_driving', models.IntegerField()),
+                ('before_break', models.IntegerField()),
+                ('remaining_cycle', models.IntegerField()),
+                ('distance_since_refuel', models.FloatField()),
+                ('last_duty_end', models.DateTimeField(null=True)),
+                ('computed_at', models.DateTimeField()),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='users.user')),
+            ],
+            options={
+                'db_table': 'driverstate',
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-19 20:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0005_driverstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hub',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('lat', models.FloatField()),
+                ('lng', models.FloatField()),
+            ],
+            options={
+                'db_table': 'hub',
+            },
+        ),
+        migrations.CreateModel(
+            name='HubLane',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('distance', models.FloatField()),
+                ('duration', models.FloatField()),
+                ('geometry', models.TextField(null=True)),
+                ('computed_at', models.DateTimeField()),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lanes_to', to='trip.hub')),
+                ('origin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lanes_from', to='trip.hub')),
+            ],
+            options={
+                'db_table': 'hublane',
+                'constraints': [models.UniqueConstraint(fields=('origin', 'destination'), name='hublane_origin_destination_unique')],
+            },
+        ),
+    ]
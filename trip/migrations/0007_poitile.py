@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-19 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0006_hub_hublane'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PoiTile',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('geohash', models.CharField(max_length=12)),
+                ('category', models.CharField(choices=[('rest_area', 'Rest area'), ('gas_station', 'Gas station')], max_length=20)),
+                ('elements', models.JSONField()),
+                ('fetched_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'poitile',
+                'constraints': [models.UniqueConstraint(fields=('geohash', 'category'), name='poitile_geohash_category_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.1.7 on 2026-10-19 22:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_driverevent_table(apps, schema_editor):
+    """
+    On PostgreSQL the events table is partitioned by month on recorded_at, so the primary key
+    includes recorded_at. Rows outside of the created partitions go to the default partition.
+    """
+    DriverEvent = apps.get_model('trip', 'DriverEvent')
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.create_model(DriverEvent)
+        return
+
+    schema_editor.execute("""
+        CREATE TABLE driverevent (
+            id bigint GENERATED BY DEFAULT AS IDENTITY,
+            user_id integer NOT NULL,
+            recorded_at timestamp with time zone NOT NULL,
+            lat double precision NULL,
+            lng double precision NULL,
+            speed double precision NULL,
+            status varchar(10) NOT NULL,
+            PRIMARY KEY (id, recorded_at)
+        ) PARTITION BY RANGE (recorded_at)
+    """)
+    schema_editor.execute("CREATE TABLE driverevent_default PARTITION OF driverevent DEFAULT")
+    schema_editor.execute("CREATE INDEX driverevent_user_recorded ON driverevent (user_id, recorded_at)")
+
+
+def drop_driverevent_table(apps, schema_editor):
+    schema_editor.execute("DROP TABLE driverevent")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0007_poitile'),
+        ('users', '0002_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tripbreak',
+            name='reason',
+            field=models.CharField(choices=[('rest', 'Rest'), ('refuel', 'Refuel'), ('pickup', 'Pickup'), ('dropoff', 'Dropoff'), ('on_duty', 'On duty')], max_length=10),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='DriverEvent',
+                    fields=[
+                        ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                        ('recorded_at', models.DateTimeField()),
+                        ('lat', models.FloatField(null=True)),
+                        ('lng', models.FloatField(null=True)),
+                        ('speed', models.FloatField(null=True)),
+                        ('status', models.CharField(choices=[('driving', 'Driving'), ('on_duty', 'On duty'), ('off_duty', 'Off duty'), ('sleeper', 'Sleeper berth')], max_length=10)),
+                        ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='users.user')),
+                    ],
+                    options={
+                        'db_table': 'driverevent',
+                        'indexes': [models.Index(fields=['user', 'recorded_at'], name='driverevent_user_recorded')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_driverevent_table, drop_driverevent_table),
+        migrations.CreateModel(
+            name='EventCursor',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('derived_until', models.DateTimeField()),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='users.user')),
+            ],
+            options={
+                'db_table': 'eventcursor',
+            },
+        ),
+    ]
@@ -0,0 +1,89 @@
+from datetime import date
+from django.db import migrations
+
+# Columns of the interval tables, after the id. The partition key (begin) must be part of the primary key.
+INTERVAL_TABLES = {
+    'tripdriving': [
+        ('tripconfig_id', 'integer NOT NULL REFERENCES tripconfig (id) DEFERRABLE INITIALLY DEFERRED'),
+        ('time_total', 'time NOT NULL'),
+        ('begin', 'timestamp with time zone NOT NULL'),
+    ],
+    'tripbreak': [
+        ('tripconfig_id', 'integer NOT NULL REFERENCES tripconfig (id) DEFERRABLE INITIALLY DEFERRED'),
+        ('begin', 'timestamp with time zone NOT NULL'),
+        ('"end"', 'timestamp with time zone NOT NULL'),
+        ('reason', 'varchar(10) NOT NULL'),
+    ],
+}
+MONTHS_AHEAD = 2
+
+
+def _month_start(day, offset=0):
+    month = day.month - 1 + offset
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _copy_table(schema_editor, table, partitioned):
+    """
+    Recreates table (partitioned by month on begin or not), copies its rows and swaps the two tables.
+    """
+    columns = INTERVAL_TABLES[table]
+    names = ', '.join(['id'] + [name for name, _ in columns])
+    definition = ', '.join(f'{name} {sql}' for name, sql in columns)
+    new_table = f'{table}_partitioned' if partitioned else f'{table}_unpartitioned'
+
+    if partitioned:
+        schema_editor.execute(f"""
+            CREATE TABLE {new_table} (
+                id integer GENERATED BY DEFAULT AS IDENTITY, {definition}, PRIMARY KEY (id, begin)
+            ) PARTITION BY RANGE (begin)
+        """)
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f"SELECT min(begin) FROM {table}")
+            first = cursor.fetchone()[0]
+        today = date.today()
+        month = _month_start(first.date() if first else today)
+        while month <= _month_start(today, MONTHS_AHEAD):
+            schema_editor.execute(
+                f"CREATE TABLE {table}_{month:%Y%m} PARTITION OF {new_table} FOR VALUES FROM (%s) TO (%s)",
+                [month.isoformat(), _month_start(month, 1).isoformat()],
+            )
+            month = _month_start(month, 1)
+        schema_editor.execute(f"CREATE TABLE {table}_default PARTITION OF {new_table} DEFAULT")
+    else:
+        schema_editor.execute(f"CREATE TABLE {new_table} (id integer GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY, {definition})")
+
+    schema_editor.execute(f"INSERT INTO {new_table} ({names}) SELECT {names} FROM {table}")
+    schema_editor.execute(f"DROP TABLE {table}")
+    schema_editor.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+    schema_editor.execute(f"CREATE INDEX {table}_tripconfig_begin ON {table} (tripconfig_id, begin)")
+    schema_editor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 0) + 1, false) FROM {table}")
+
+
+def partition_interval_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in INTERVAL_TABLES:
+        _copy_table(schema_editor, table, partitioned=True)
+
+
+def unpartition_interval_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in INTERVAL_TABLES:
+        _copy_table(schema_editor, table, partitioned=False)
+
+
+class Migration(migrations.Migration):
+    """
+    Partitions tripdriving and tripbreak by month on begin (PostgreSQL only).
+    tripconfig stays a plain table: the interval and refueling tables reference it.
+    """
+
+    dependencies = [
+        ('trip', '0008_driverevent_eventcursor'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_interval_tables, unpartition_interval_tables),
+    ]
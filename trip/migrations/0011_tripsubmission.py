@@ -0,0 +1,33 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0010_requestprofile'),
+        ('users', '0002_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripSubmission',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('idempotency_key', models.CharField(max_length=64)),
+                ('payload', models.JSONField()),
+                ('datetimeUTC', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.TextField(null=True)),
+                ('tripconfig', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='trip.tripconfig')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.user')),
+            ],
+            options={
+                'db_table': 'tripsubmission',
+                'constraints': [models.UniqueConstraint(fields=('user', 'idempotency_key'), name='tripsubmission_user_key')],
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='tripsubmission_pending')],
+            },
+        ),
+    ]
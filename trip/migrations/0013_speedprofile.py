@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0012_ratebucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpeedProfile',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('corridors', models.JSONField()),
+                ('factors', models.BinaryField()),
+                ('samples', models.IntegerField()),
+                ('computed_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'speedprofile',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0013_speedprofile'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tripconfig',
+            index=models.Index(fields=['user', 'datetimeUTC'], name='tripconfig_user_datetime'),
+        ),
+        migrations.AddIndex(
+            model_name='tripconfig',
+            index=models.Index(fields=['datetimeUTC'], name='tripconfig_datetime'),
+        ),
+        migrations.AddIndex(
+            model_name='tripdriving',
+            index=models.Index(fields=['begin'], name='tripdriving_begin'),
+        ),
+        migrations.AddIndex(
+            model_name='tripbreak',
+            index=models.Index(fields=['begin'], name='tripbreak_begin'),
+        ),
+    ]
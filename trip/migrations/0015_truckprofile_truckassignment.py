@@ -0,0 +1,44 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0014_trip_admin_indexes'),
+        ('users', '0002_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TruckProfile',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('is_default', models.BooleanField(default=False)),
+                ('fuel_range', models.FloatField(default=1000)),
+                ('refuel_duration', models.IntegerField(default=900)),
+                ('pickup_duration', models.IntegerField(default=3600)),
+                ('dropoff_duration', models.IntegerField(default=3600)),
+                ('break_duration', models.IntegerField(default=1800)),
+                ('sleeper_duration', models.IntegerField(default=36000)),
+                ('max_driving', models.IntegerField(default=39600)),
+                ('max_driving_before_break', models.IntegerField(blank=True, default=28800, null=True)),
+            ],
+            options={
+                'db_table': 'truckprofile',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('is_default',), name='truckprofile_single_default')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TruckAssignment',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='trip.truckprofile')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='users.user')),
+            ],
+            options={
+                'db_table': 'truckassignment',
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-19 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0015_truckprofile_truckassignment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeadDriverEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('user_id', models.IntegerField()),
+                ('event', models.JSONField()),
+                ('error', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'deaddriverevent',
+            },
+        ),
+    ]
@@ -1,7 +1,12 @@
 from django.db import models
+import uuid
 from datetime import datetime, timedelta, time, timezone
 from django.db import transaction
-from django.db.models import Max
+from django.db.models import F, Max, Value
+from django.db.models.functions import Greatest, Least
+from django.db.models.lookups import GreaterThanOrEqual
+from trip.geometry import build_levels, pick_level
+from truck_api.db_router import use_replica
 
 def timedelta_to_time(td):
     total_seconds = int(td.total_seconds())
@@ -10,6 +15,12 @@ def timedelta_to_time(td):
     seconds = total_seconds % 60
     return time(hour=hours, minute=minutes, second=seconds, microsecond=0)
 
+# Intervals older than the 70-hour/8-day cycle don't count in any HOS limit. Bounding the HOS
+# queries on begin lets PostgreSQL only scan the recent monthly partitions.
+HOS_LOOKBACK = timedelta(days=8)
+# Off duty this long resets the 70-hour/8-day cycle (see trip/compliance.py).
+CYCLE_RESTART = timedelta(hours=34)
+
 class TripConfig(models.Model):
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey('users.user', on_delete=models.CASCADE)
@@ -19,20 +30,26 @@ class TripConfig(models.Model):
     datetimeUTC = models.DateTimeField()
 
     @classmethod
-    def get_current_cycle_by_user_id(cls, user_id, plannedStartDate):
+    @use_replica()
+    def get_current_cycle_by_user_id(cls, user_id, plannedStartDate, profile=None):
+        """
+        :param profile: driver's TruckProfile giving the HOS limits, the federal rules when None
+        """
+        profile = profile or TruckProfile()
         try:
-            trip_configs = cls.objects.filter(user_id = user_id).order_by('-id')
+            since = plannedStartDate - HOS_LOOKBACK
+            trip_configs = cls.objects.filter(user_id = user_id, tripbreak__begin__gte = since).distinct().order_by('-id')
 
             if(trip_configs is None):
-                return TripDriving.get_remaining_driving_time(user_id, None, plannedStartDate)    
+                return TripDriving.get_remaining_driving_time(user_id, None, plannedStartDate, profile)
             
             date_end_cycle = None
             for trip_config in trip_configs:
-                date_end_cycle = TripBreak.get_rest_periods_time_begin(trip_config.id)
+                date_end_cycle = TripBreak.get_rest_periods_time_begin(trip_config.id, since, profile.sleeper_duration)
                 if(date_end_cycle is not None):
                     break
 
-            return TripDriving.get_remaining_driving_time(user_id, date_end_cycle, plannedStartDate)
+            return TripDriving.get_remaining_driving_time(user_id, date_end_cycle, plannedStartDate, profile)
         except Exception as e:
             raise e
 
@@ -52,6 +69,15 @@ class TripConfig(models.Model):
         :param user_id: ID of the linked User
         :param front_data: list of objects sent by the front
         """
+        obj = cls.build_trip_config(user_id, front_data, datetimeUTC)
+        obj.save()
+        return obj.id
+
+    @classmethod
+    def build_trip_config(cls, user_id, front_data, datetimeUTC):
+        """
+        Same as save_trip_config without saving, for bulk inserts.
+        """
         try:
             
             index = 0
@@ -76,20 +102,23 @@ class TripConfig(models.Model):
                 index+=1
             
             ttd = timedelta_to_time(timedelta(seconds=accumulated_timeDriving))
-            obj = cls.objects.create(
+            return cls(
                 user_id = user_id,
                 totaldistance = front_data.get("total_distance", 0),
                 ways = front_data.get("waypoints", []),
                 total_time_driving = ttd,
                 datetimeUTC = datetimeUTC
             )
-            return obj.id
 
         except Exception as e:
             raise e    
 
     class Meta:
         db_table = 'tripconfig'
+        indexes = [
+            models.Index(fields=['user', 'datetimeUTC'], name='tripconfig_user_datetime'),
+            models.Index(fields=['datetimeUTC'], name='tripconfig_datetime'),
+        ]
 
 class TripDriving(models.Model):
     id = models.AutoField(primary_key=True)
@@ -99,15 +128,24 @@ class TripDriving(models.Model):
 
     
     @classmethod
-    def get_remaining_driving_time(cls, user_id, after_date, plannedStartDate):
+    @use_replica()
+    def get_remaining_driving_time(cls, user_id, after_date, plannedStartDate, profile=None):
+        """
+        :param profile: driver's TruckProfile giving the HOS limits, the federal rules when None
+        :return: (remaining driving time, driving time before a break or None when no break is required)
+        """
+        profile = profile or TruckProfile()
+        max_driving_seconds = profile.max_driving
+        before_break = profile.max_driving_before_break
         if user_id is None:
-            return 11 * 3600, 8 * 3600
-        
+            return max_driving_seconds, before_break
+
         try: 
             filters = {
                 'tripconfig__user_id': user_id,
+                'begin__gte': plannedStartDate - HOS_LOOKBACK,
             }
-            if after_date is not None:
+            if after_date is not None and after_date > filters['begin__gte']:
                 filters['begin__gte'] = after_date
             trip_drivings = cls.objects.filter(**filters).order_by('-begin')
 
@@ -115,7 +153,7 @@ class TripDriving(models.Model):
                 after_date = TripConfig.objects.filter(user_id=user_id).aggregate(Max('datetimeUTC'))['datetimeUTC__max']
 
             if not trip_drivings.exists():
-                return 11 * 3600, 8 * 3600  
+                return max_driving_seconds, before_break
 
             total_driving_time = timedelta()
             need_rest = None
@@ -129,18 +167,16 @@ class TripDriving(models.Model):
                 
             total_seconds = total_driving_time.total_seconds()
 
-            if total_seconds <= 8 * 3600:
-                need_rest = (8 * 3600) - total_seconds
-            
-            max_driving_seconds = 11 * 3600
+            if before_break is not None and total_seconds <= before_break:
+                need_rest = before_break - total_seconds
 
             if(plannedStartDate < after_date + timedelta(seconds=total_seconds)):
                 raise Exception(f"Invalid planned Date {plannedStartDate} {after_date + timedelta(seconds=total_seconds)}")
 
-            if(plannedStartDate <= after_date + timedelta(seconds=total_seconds + 36000)):
+            if(plannedStartDate <= after_date + timedelta(seconds=total_seconds + profile.sleeper_duration)):
                 remaining_time = max_driving_seconds - total_seconds
             else:
-                need_rest = 8 * 3600
+                need_rest = before_break
                 remaining_time = max_driving_seconds
             
             return int(remaining_time), int(need_rest) if need_rest is not None else None,
@@ -157,37 +193,49 @@ class TripDriving(models.Model):
         """
         try:
             trip_config = TripConfig.objects.get(id=tripconfig_id)
-            index = 0
-            begin_drive = None
-            end_drive = None
-            accumulated_duration = 0
-            for step in front_data:
-                last_point_duration = front_data[index - 1].get("duration", [0])[0] if index > 0 else 0
-                accumulated_duration += (step.get("duration_from_last_point", 0)) + last_point_duration
-                duration_seconds = step.get("duration", [0])[0]
-                
-                if begin_drive is None: 
-                    begin_drive = accumulated_duration + duration_seconds
-                else:
-                    end_drive = accumulated_duration
-                    total_drive = (end_drive - begin_drive)
-                    cls.objects.create(
-                        tripconfig=trip_config,
-                        begin=(datetimeUTC + timedelta(seconds=(begin_drive))),
-                        time_total=timedelta_to_time(timedelta(seconds=total_drive)),
-                    )
-                    begin_drive = (end_drive + duration_seconds)
-                    end_drive = None
-                
-                index+=1
-
+            cls.objects.bulk_create(cls.build_driving_from_front(trip_config, front_data, datetimeUTC))
         except TripConfig.DoesNotExist:
             raise ValueError(f"TripConfig with id {tripconfig_id} does not exist")
         except Exception as e:
             raise e
+
+    @classmethod
+    def build_driving_from_front(cls, trip_config, front_data, datetimeUTC):
+        """
+        Returns the unsaved TripDrivings of a list of steps sent from the front.
+        """
+        drivings = []
+        index = 0
+        begin_drive = None
+        end_drive = None
+        accumulated_duration = 0
+        for step in front_data:
+            last_point_duration = front_data[index - 1].get("duration", [0])[0] if index > 0 else 0
+            accumulated_duration += (step.get("duration_from_last_point", 0)) + last_point_duration
+            duration_seconds = step.get("duration", [0])[0]
+            
+            if begin_drive is None: 
+                begin_drive = accumulated_duration + duration_seconds
+            else:
+                end_drive = accumulated_duration
+                total_drive = (end_drive - begin_drive)
+                drivings.append(cls(
+                    tripconfig=trip_config,
+                    begin=(datetimeUTC + timedelta(seconds=(begin_drive))),
+                    time_total=timedelta_to_time(timedelta(seconds=total_drive)),
+                ))
+                begin_drive = (end_drive + duration_seconds)
+                end_drive = None
+            
+            index+=1
+
+        return drivings
     
     class Meta:
         db_table = 'tripdriving'
+        indexes = [
+            models.Index(fields=['begin'], name='tripdriving_begin'),
+        ]
 
 
 class TripBreak(models.Model):
@@ -196,6 +244,7 @@ class TripBreak(models.Model):
         REFUEL = "refuel", "Refuel"
         PICKUP = "pickup", "Pickup"
         DROPOFF = "dropoff", "Dropoff"
+        ON_DUTY = "on_duty", "On duty"
 
     id = models.AutoField(primary_key=True)
     tripconfig = models.ForeignKey('TripConfig', on_delete=models.CASCADE)
@@ -204,16 +253,22 @@ class TripBreak(models.Model):
     reason = models.CharField(max_length=10, choices=ReasonChoices.choices)
 
     @classmethod
-    def get_rest_periods_time_begin(cls, tripconfig_id):
+    @use_replica()
+    def get_rest_periods_time_begin(cls, tripconfig_id, since=None, reset_duration=36000):
+        """
+        :param reset_duration: rest (s, counting the periods of 2 hours or more) ending a shift
+        """
         try:
             trip_breaks = cls.objects.filter(tripconfig_id = tripconfig_id).order_by('-id') 
+            if since is not None:
+                trip_breaks = trip_breaks.filter(begin__gte = since)
             total_rest_period = 0
             for trip_break in trip_breaks:
                 duration = (trip_break.end - trip_break.begin).total_seconds()
                 if(duration >= 7200):
                     total_rest_period += duration
                 
-                if(total_rest_period >= 36000):
+                if(total_rest_period >= reset_duration):
                     return trip_break.end
             
             return None
@@ -229,43 +284,55 @@ class TripBreak(models.Model):
         """
         try:
             trip_config = TripConfig.objects.get(id=tripconfig_id)
-            index = 0
-            accumulated_duration = 0
-            for step in front_data:
-                last_point_duration = front_data[index - 1].get("duration", [0])[0] if index > 0 else 0
-                accumulated_duration += (step.get("duration_from_last_point", 0)) + last_point_duration
-                duration_seconds = step.get("duration", [0])[0]
-                label = step.get("label", "").lower()
-
-                if any(reason in label for reason in ["rest", "refuel", "pickup", "dropoff"]):
-
-                    if "rest" in label:
-                        reason = cls.ReasonChoices.REST
-                    elif "refuel" in label:
-                        reason = cls.ReasonChoices.REFUEL
-                    elif "pickup" in label:
-                        reason = cls.ReasonChoices.PICKUP
-                    elif "dropoff" in label:
-                        reason = cls.ReasonChoices.DROPOFF
-                    else:
-                        continue
-
-                    cls.objects.create(
-                        tripconfig=trip_config,
-                        begin=(datetimeUTC + timedelta(seconds=accumulated_duration)),
-                        end=(datetimeUTC + timedelta(seconds=(accumulated_duration + duration_seconds))),
-                        reason=reason
-                    )
-                
-                index+=1
-
+            cls.objects.bulk_create(cls.build_breaks_from_front(trip_config, front_data, datetimeUTC))
         except TripConfig.DoesNotExist:
             raise ValueError(f"TripConfig with id {tripconfig_id} does not exist")
         except Exception as e:
             raise e
 
+    @classmethod
+    def build_breaks_from_front(cls, trip_config, front_data, datetimeUTC):
+        """
+        Returns the unsaved TripBreaks of a list of steps sent from the front.
+        """
+        breaks = []
+        index = 0
+        accumulated_duration = 0
+        for step in front_data:
+            last_point_duration = front_data[index - 1].get("duration", [0])[0] if index > 0 else 0
+            accumulated_duration += (step.get("duration_from_last_point", 0)) + last_point_duration
+            duration_seconds = step.get("duration", [0])[0]
+            label = step.get("label", "").lower()
+
+            if any(reason in label for reason in ["rest", "refuel", "pickup", "dropoff"]):
+
+                if "rest" in label:
+                    reason = cls.ReasonChoices.REST
+                elif "refuel" in label:
+                    reason = cls.ReasonChoices.REFUEL
+                elif "pickup" in label:
+                    reason = cls.ReasonChoices.PICKUP
+                elif "dropoff" in label:
+                    reason = cls.ReasonChoices.DROPOFF
+                else:
+                    continue
+
+                breaks.append(cls(
+                    tripconfig=trip_config,
+                    begin=(datetimeUTC + timedelta(seconds=accumulated_duration)),
+                    end=(datetimeUTC + timedelta(seconds=(accumulated_duration + duration_seconds))),
+                    reason=reason
+                ))
+            
+            index+=1
+
+        return breaks
+
     class Meta:
         db_table = 'tripbreak'
+        indexes = [
+            models.Index(fields=['begin'], name='tripbreak_begin'),
+        ]
 
 
 class TripRefueling(models.Model):
@@ -288,6 +355,7 @@ class TripRefueling(models.Model):
             raise e
 
     @classmethod
+    @use_replica()
     def get_total_distance_after_last_refueling(cls, user_id):
         
         try:
@@ -308,4 +376,361 @@ class TripRefueling(models.Model):
         except Exception as e:
             raise e
     class Meta:
-        db_table = 'triprefueling'
\ No newline at end of file
+        db_table = 'triprefueling'
+
+class RouteGeometry(models.Model):
+    id = models.AutoField(primary_key=True)
+    key = models.CharField(max_length=40, unique=True)
+    levels = models.JSONField(null=False)
+    distance = models.FloatField()
+    duration = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def save_from_route(cls, key, route):
+        """
+        Stores the geometry of an OSRM route (geojson) as encoded polylines for every zoom level.
+        :param key: plan key, see trip.geometry.get_plan_key
+        :param route: route returned by get_route_data_full
+        """
+        coordinates = [(lat, lng) for lng, lat in route["geometry"]["coordinates"]]
+        obj, _ = cls.objects.update_or_create(
+            key=key,
+            defaults={
+                "levels": build_levels(coordinates),
+                "distance": route["distance"] / 1609.34,
+                "duration": route["duration"],
+            }
+        )
+        return obj
+
+    @classmethod
+    def get_level(cls, key, zoom=None):
+        try:
+            return pick_level(cls.objects.get(key=key).levels, zoom)
+        except cls.DoesNotExist:
+            return None
+
+    class Meta:
+        db_table = 'routegeometry'
+
+
+class DriverState(models.Model):
+    """
+    Hours-of-service state and fuel range of a driver, precomputed by the precompute_driver_state command.
+    """
+    id = models.AutoField(primary_key=True)
+    user = models.OneToOneField('users.user', on_delete=models.CASCADE)
+    remaining_driving = models.IntegerField()
+    before_break = models.IntegerField()
+    remaining_cycle = models.IntegerField()
+    distance_since_refuel = models.FloatField()
+    last_duty_end = models.DateTimeField(null=True)
+    computed_at = models.DateTimeField()
+
+    @classmethod
+    def get_planning_state(cls, user_id, plannedStartDate, profile=None):
+        """
+        Returns (remaining driving time, driving time before rest, distance since last refueling) for the planner.
+        Falls back to a fresh driver when there is no state or when the driver has rested a full shift since.
+        The remaining driving time never exceeds what is left of the 70-hour cycle, unless the driver has
+        been off duty for a 34-hour restart since.
+        :param profile: TruckProfile giving the limits of a rested driver, the federal rules when None
+        """
+        return cls.get_planning_states([user_id], plannedStartDate, {user_id: profile} if profile else None)[user_id]
+
+    @classmethod
+    def get_planning_states(cls, user_ids, plannedStartDate, profiles=None):
+        """
+        Same as get_planning_state for several drivers, in one query.
+        :param profiles: dict user_id -> TruckProfile
+        :return: dict user_id -> (remaining driving time, driving time before rest, distance since last refueling)
+        """
+        default = TruckProfile()
+        profiles = profiles or {}
+        states = {}
+        stored = {state.user_id: state for state in cls.objects.filter(user_id__in=user_ids)}
+        for user_id in user_ids:
+            profile = profiles.get(user_id) or default
+            state = stored.get(user_id)
+            rested = None if state is None or state.last_duty_end is None else plannedStartDate - state.last_duty_end
+            if rested is None or rested >= timedelta(seconds=profile.sleeper_duration):
+                remaining_driving, before_break = profile.max_driving, profile.max_driving_before_break
+            else:
+                remaining_driving, before_break = state.remaining_driving, state.before_break
+            if state is not None and (rested is None or rested < CYCLE_RESTART):
+                remaining_driving = min(remaining_driving, max(state.remaining_cycle, 0))
+            if profile.max_driving_before_break is None:
+                before_break = None
+            states[user_id] = (remaining_driving, before_break, state.distance_since_refuel if state else 0)
+        return states
+
+    class Meta:
+        db_table = 'driverstate'
+
+
+class Hub(models.Model):
+    """
+    Known depot or customer site, routes between hubs are precomputed by the compute_lane_matrix command.
+    """
+    id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=100)
+    lat = models.FloatField()
+    lng = models.FloatField()
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        db_table = 'hub'
+
+
+class HubLane(models.Model):
+    id = models.AutoField(primary_key=True)
+    origin = models.ForeignKey('Hub', on_delete=models.CASCADE, related_name='lanes_from')
+    destination = models.ForeignKey('Hub', on_delete=models.CASCADE, related_name='lanes_to')
+    # Same units as OSRM: meters and seconds.
+    distance = models.FloatField()
+    duration = models.FloatField()
+    geometry = models.TextField(null=True)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'hublane'
+        constraints = [
+            models.UniqueConstraint(fields=['origin', 'destination'], name='hublane_origin_destination_unique'),
+        ]
+
+
+class PoiTile(models.Model):
+    """
+    Overpass results of one POI category inside one geohash tile (see trip/poi_cache.py).
+    """
+    class CategoryChoices(models.TextChoices):
+        REST_AREA = "rest_area", "Rest area"
+        GAS_STATION = "gas_station", "Gas station"
+
+    id = models.AutoField(primary_key=True)
+    geohash = models.CharField(max_length=12)
+    category = models.CharField(max_length=20, choices=CategoryChoices.choices)
+    elements = models.JSONField(null=False)
+    fetched_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'poitile'
+        constraints = [
+            models.UniqueConstraint(fields=['geohash', 'category'], name='poitile_geohash_category_unique'),
+        ]
+
+
+class DriverEvent(models.Model):
+    """
+    Position and duty status sent by the in-cab devices (see trip/ingest.py).
+    On PostgreSQL the table is partitioned by month on recorded_at (see trip/partitions.py).
+    """
+    class StatusChoices(models.TextChoices):
+        DRIVING = "driving", "Driving"
+        ON_DUTY = "on_duty", "On duty"
+        OFF_DUTY = "off_duty", "Off duty"
+        SLEEPER = "sleeper", "Sleeper berth"
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey('users.user', on_delete=models.DO_NOTHING, db_constraint=False)
+    recorded_at = models.DateTimeField()
+    lat = models.FloatField(null=True)
+    lng = models.FloatField(null=True)
+    speed = models.FloatField(null=True)
+    status = models.CharField(max_length=10, choices=StatusChoices.choices)
+
+    class Meta:
+        db_table = 'driverevent'
+        indexes = [
+            models.Index(fields=['user', 'recorded_at'], name='driverevent_user_recorded'),
+        ]
+
+
+class EventCursor(models.Model):
+    """
+    Events of a driver up to derived_until have been turned into TripDriving/TripBreak rows.
+    """
+    id = models.AutoField(primary_key=True)
+    user = models.OneToOneField('users.user', on_delete=models.CASCADE)
+    derived_until = models.DateTimeField()
+
+    class Meta:
+        db_table = 'eventcursor'
+
+
+class DeadDriverEvent(models.Model):
+    """
+    Driver event the database refused (see trip/ingest.py), kept with the error instead of being retried forever.
+    """
+    id = models.BigAutoField(primary_key=True)
+    user_id = models.IntegerField()
+    event = models.JSONField()
+    error = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'deaddriverevent'
+
+
+class RequestProfile(models.Model):
+    """
+    Profile of one request, recorded by truck_api.profiling.ProfilingMiddleware.
+    """
+    id = models.CharField(primary_key=True, max_length=32)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=200)
+    status_code = models.IntegerField()
+    duration = models.FloatField()
+    summary = models.JSONField()
+    stats = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    # Profiles are kept one week.
+    TTL = timedelta(days=7)
+
+    @classmethod
+    def save_profile(cls, method, path, status_code, duration, summary, stats):
+        cls.objects.filter(created_at__lt=datetime.now(timezone.utc) - cls.TTL).delete()
+        return cls.objects.create(
+            id=uuid.uuid4().hex,
+            method=method,
+            path=path[:200],
+            status_code=status_code,
+            duration=duration,
+            summary=summary,
+            stats=stats,
+        )
+
+    class Meta:
+        db_table = 'requestprofile'
+
+
+class TripSubmission(models.Model):
+    """
+    Outbox of the trips sent by the front: acknowledged as soon as they are stored here,
+    materialized into TripConfig/TripDriving/TripBreak/TripRefueling by trip.outbox.drain_outbox.
+    """
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey('users.user', on_delete=models.CASCADE)
+    idempotency_key = models.CharField(max_length=64)
+    payload = models.JSONField()
+    datetimeUTC = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True)
+    tripconfig = models.ForeignKey('TripConfig', null=True, on_delete=models.SET_NULL)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(null=True)
+
+    class Meta:
+        db_table = 'tripsubmission'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='tripsubmission_user_key'),
+        ]
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True), name='tripsubmission_pending'),
+        ]
+
+
+class SpeedProfile(models.Model):
+    """
+    Time-of-day correction factors of the OSRM durations, learned by trip.speed_profiles.learn_speed_profile.
+    Only the latest one is used.
+    """
+    id = models.AutoField(primary_key=True)
+    # Corridor key of each row of factors after the first one, which holds the factors of all corridors.
+    corridors = models.JSONField()
+    # float32 array of shape (len(corridors) + 1, 24): actual / OSRM duration per local hour.
+    factors = models.BinaryField()
+    samples = models.IntegerField()
+    computed_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'speedprofile'
+
+
+class TruckProfile(models.Model):
+    """
+    Truck and hours-of-service ruleset used by the planner, cached per worker by trip.profiles.
+    The defaults are a 1000-mile tank and the federal property-carrying rules. Durations are in seconds.
+    A change is used at once by the worker saving it and within trip.profiles.CACHE_TTL by the others.
+    """
+    id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=50, unique=True)
+    # Used for the drivers without a TruckAssignment.
+    is_default = models.BooleanField(default=False)
+    fuel_range = models.FloatField(default=1000)
+    refuel_duration = models.IntegerField(default=15 * 60)
+    pickup_duration = models.IntegerField(default=1 * 3600)
+    dropoff_duration = models.IntegerField(default=1 * 3600)
+    break_duration = models.IntegerField(default=30 * 60)
+    sleeper_duration = models.IntegerField(default=10 * 3600)
+    max_driving = models.IntegerField(default=11 * 3600)
+    # None when no break is required before max_driving (short-haul exemption).
+    max_driving_before_break = models.IntegerField(null=True, blank=True, default=8 * 3600)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        db_table = 'truckprofile'
+        constraints = [
+            models.UniqueConstraint(fields=['is_default'], condition=models.Q(is_default=True), name='truckprofile_single_default'),
+        ]
+
+
+class TruckAssignment(models.Model):
+    id = models.AutoField(primary_key=True)
+    user = models.OneToOneField('users.user', on_delete=models.CASCADE)
+    profile = models.ForeignKey('TruckProfile', on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'truckassignment'
+
+
+class RateBucket(models.Model):
+    """
+    Token bucket shared by all the workers, see trip.admission.
+    """
+    key = models.CharField(primary_key=True, max_length=100)
+    tokens = models.FloatField()
+    # Timestamp (s) of the last refill, kept as a number so the refill is computed by the UPDATE itself.
+    updated_at = models.FloatField()
+
+    @classmethod
+    def take(cls, key, rate, capacity, cost=1, reserve=0):
+        """
+        Takes cost tokens when at least reserve tokens are left afterwards. The refill and the take
+        are a single UPDATE, so concurrent workers never take the same tokens.
+        :param rate: tokens added per second, up to capacity
+        :return: 0 when the tokens were taken, otherwise the seconds before enough tokens are back
+        """
+        for _ in range(3):
+            now = datetime.now(timezone.utc).timestamp()
+            refilled = Least(
+                Value(float(capacity)),
+                F('tokens') + Greatest(Value(now) - F('updated_at'), Value(0.0)) * Value(float(rate)),
+            )
+            taken = cls.objects.filter(GreaterThanOrEqual(refilled, cost + reserve), key=key).update(
+                tokens=refilled - cost,
+                updated_at=Greatest(F('updated_at'), Value(now)),
+            )
+            if taken:
+                return 0
+
+            bucket = cls.objects.filter(key=key).values_list('tokens', 'updated_at').first()
+            if bucket is None:
+                # First use of the bucket, it starts full.
+                cls.objects.bulk_create([cls(key=key, tokens=capacity, updated_at=now)], ignore_conflicts=True)
+                continue
+            tokens = min(capacity, bucket[0] + max(now - bucket[1], 0) * rate)
+            wait = (cost + reserve - tokens) / rate
+            if wait > 0:
+                return wait
+        # Tokens came back between the UPDATE and the read every time: not worth refusing.
+        return 0
+
+    class Meta:
+        db_table = 'ratebucket'
@@ -0,0 +1,155 @@
+"""
+Write-behind persistence of the trips sent by the front.
+
+A submission is validated, stored in the TripSubmission outbox under the
+client's idempotency key (unique per user) and acknowledged. A retry with the
+same key gets the same submission back instead of a second trip. The trip rows
+are materialized by drain_outbox, batch by batch with bulk inserts, from a
+background thread woken by new submissions or from the drain_trip_outbox
+command.
+"""
+import threading
+from datetime import datetime, timezone
+from numbers import Number
+from django.db import connection, transaction
+from trip.models import TripBreak, TripConfig, TripDriving, TripRefueling, TripSubmission
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+# The background drainer also looks for leftovers (failed attempts, other workers) this often.
+DRAIN_INTERVAL = 30
+
+_state = {"drainer": None}
+_wake = threading.Event()
+_lock = threading.Lock()
+
+
+def validate_trip_payload(data):
+    """
+    Keeps the fields of a trip sent by the front that save_all uses.
+    :raises ValueError: when the trip is malformed
+    """
+    waypoints = data.get("waypoints")
+    if not isinstance(waypoints, list) or not all(isinstance(wp, dict) for wp in waypoints):
+        raise ValueError("waypoints must be a list of objects")
+    for wp in waypoints:
+        duration = wp.get("duration", [0])
+        if not isinstance(duration, list) or not duration or not isinstance(duration[0], Number):
+            raise ValueError("duration must be a list of seconds")
+        if not isinstance(wp.get("duration_from_last_point", 0), Number):
+            raise ValueError("duration_from_last_point must be a number")
+        # Read when the outbox is drained (breaks) and by the speed profiles (legs).
+        for field in ("label", "type"):
+            if not isinstance(wp.get(field, ""), str):
+                raise ValueError(f"{field} must be a string")
+        for field in ("lat", "lng", "free_flow_duration"):
+            if not isinstance(wp.get(field, 0), Number):
+                raise ValueError(f"{field} must be a number")
+
+    payload = {"waypoints": waypoints, "total_distance": data.get("total_distance", 0)}
+    if not isinstance(payload["total_distance"], Number):
+        raise ValueError("total_distance must be a number")
+    if data.get("distance_to_dropoff") is not None:
+        if not isinstance(data["distance_to_dropoff"], Number):
+            raise ValueError("distance_to_dropoff must be a number")
+        payload["distance_to_dropoff"] = data["distance_to_dropoff"]
+    return payload
+
+
+def enqueue(user_id, idempotency_key, payload, datetimeUTC):
+    """
+    Stores a submission in the outbox, or returns the one already stored under the key.
+    :return: (submission, created)
+    :raises ValueError: when the key was already used for another trip
+    """
+    submission, created = TripSubmission.objects.get_or_create(
+        user_id=user_id,
+        idempotency_key=idempotency_key,
+        defaults={"payload": payload, "datetimeUTC": datetimeUTC},
+    )
+    if not created and (submission.payload != payload or submission.datetimeUTC != datetimeUTC):
+        raise ValueError("Idempotency key already used for another trip")
+    if created:
+        transaction.on_commit(wake_drainer)
+    return submission, created
+
+
+def _materialize(submissions, now):
+    configs = [TripConfig.build_trip_config(s.user_id, s.payload, s.datetimeUTC) for s in submissions]
+    TripConfig.objects.bulk_create(configs)
+
+    drivings = []
+    breaks = []
+    refuelings = []
+    for submission, config in zip(submissions, configs):
+        waypoints = submission.payload.get("waypoints", [])
+        drivings += TripDriving.build_driving_from_front(config, waypoints, submission.datetimeUTC)
+        breaks += TripBreak.build_breaks_from_front(config, waypoints, submission.datetimeUTC)
+        if submission.payload.get("distance_to_dropoff"):
+            refuelings.append(TripRefueling(tripconfig=config, distancetodropoff=submission.payload["distance_to_dropoff"]))
+        submission.tripconfig = config
+        submission.processed_at = now
+        submission.attempts += 1
+        submission.error = None
+
+    TripDriving.objects.bulk_create(drivings, batch_size=1000)
+    TripBreak.objects.bulk_create(breaks, batch_size=1000)
+    TripRefueling.objects.bulk_create(refuelings, batch_size=1000)
+    TripSubmission.objects.bulk_update(submissions, ['tripconfig', 'processed_at', 'attempts', 'error'])
+
+
+def drain_outbox(batch_size=BATCH_SIZE):
+    """
+    Materializes the pending submissions until none is left.
+    Workers draining at the same time skip each other's rows (PostgreSQL).
+    :return: number of trips materialized
+    """
+    materialized = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                TripSubmission.objects.select_for_update(skip_locked=True)
+                .filter(processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS)
+                .order_by('id')[:batch_size]
+            )
+            if not batch:
+                return materialized
+
+            now = datetime.now(timezone.utc)
+            attempts = {submission.id: submission.attempts for submission in batch}
+            try:
+                with transaction.atomic():
+                    _materialize(batch, now)
+                materialized += len(batch)
+            except Exception:
+                # One bad submission must not block the others: retry them one by one.
+                for submission in batch:
+                    submission.attempts = attempts[submission.id]
+                    try:
+                        with transaction.atomic():
+                            _materialize([submission], now)
+                        materialized += 1
+                    except Exception as e:
+                        print(f"Error materializing trip submission {submission.id}: {e}")
+                        TripSubmission.objects.filter(id=submission.id).update(attempts=attempts[submission.id] + 1, error=str(e))
+
+
+def _drain_loop():
+    while True:
+        _wake.wait(DRAIN_INTERVAL)
+        _wake.clear()
+        try:
+            drain_outbox()
+        except Exception as e:
+            print(f"Error draining the trip outbox: {e}")
+        finally:
+            connection.close()
+
+
+def wake_drainer():
+    if _state["drainer"] is None:
+        with _lock:
+            if _state["drainer"] is None:
+                _state["drainer"] = threading.Thread(target=_drain_loop, daemon=True)
+                _state["drainer"].start()
+    _wake.set()
@@ -0,0 +1,120 @@
+"""
+Incremental parsing of Overpass JSON responses.
+
+Elements are decoded one by one from the response stream, so a dense city
+answer is never loaded as a whole in memory. An answer without an "elements"
+array (an HTML error page) or with a top-level "remark"/"error" (a timeout or
+out of memory of the query, the elements are then incomplete) raises
+OverpassError once the stream is read, so a caller consuming all the elements
+before storing them never stores a failed answer.
+"""
+import codecs
+import heapq
+import json
+
+_decoder = json.JSONDecoder()
+
+class OverpassError(Exception):
+    pass
+
+def _check_tail(tail):
+    """
+    Raises OverpassError when the members after the "elements" array hold a remark or an error.
+    """
+    tail = tail.strip()
+    if not tail.startswith(','):
+        return
+    try:
+        members = json.loads('{' + tail[1:])
+    except ValueError:
+        members = {}
+        if '"remark"' in tail or '"error"' in tail:
+            raise OverpassError(f"Overpass answered with an error: {tail[:200]}")
+    for key in ("remark", "error"):
+        if members.get(key):
+            raise OverpassError(f"Overpass {key}: {members[key]}")
+
+def iter_elements(chunks):
+    """
+    Yields the objects of the "elements" array of an Overpass JSON response.
+    :param chunks: iterable of bytes or str chunks (e.g. response.iter_content(65536))
+    :raises OverpassError: when the response has no elements array or reports an error
+    """
+    chunks = iter(chunks)
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    in_elements = False
+    exhausted = False
+
+    def read_more():
+        nonlocal buffer, position, exhausted
+        for chunk in chunks:
+            if chunk:
+                if isinstance(chunk, bytes):
+                    chunk = utf8.decode(chunk)
+                buffer = buffer[position:] + chunk
+                position = 0
+                return True
+        exhausted = True
+        return False
+
+    while not in_elements:
+        index = buffer.find('"elements"', position)
+        if index != -1:
+            bracket = buffer.find('[', index)
+            if bracket != -1:
+                position = bracket + 1
+                in_elements = True
+                break
+        elif len(buffer) > 20:
+            # Keep the end of the buffer, the key may be split between two chunks.
+            position = len(buffer) - 20
+        if not read_more():
+            raise OverpassError(f"Overpass answer without elements: {buffer[-200:]!r}")
+
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position >= len(buffer):
+            if not read_more():
+                raise OverpassError("Overpass answer truncated")
+            continue
+        if buffer[position] == ']':
+            tail = buffer[position + 1:]
+            for chunk in chunks:
+                tail += utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+            _check_tail(tail)
+            return
+        try:
+            element, end = _decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if exhausted or not read_more():
+                raise
+            continue
+        position = end
+        yield element
+
+def element_position(element):
+    """
+    Returns (lat, lng) of a node, or of the center of a way/relation (out center), or None.
+    """
+    if "lat" in element and "lon" in element:
+        return element["lat"], element["lon"]
+    center = element.get("center")
+    if center and "lat" in center and "lon" in center:
+        return center["lat"], center["lon"]
+    return None
+
+def nearest(items, k, distance):
+    """
+    Keeps the k items with the smallest distance(item) with a bounded heap, returned nearest first.
+    """
+    heap = []
+    for index, item in enumerate(items):
+        d = distance(item)
+        if len(heap) < k:
+            heapq.heappush(heap, (-d, index, item))
+        elif -heap[0][0] > d:
+            heapq.heapreplace(heap, (-d, index, item))
+    return [item for _, _, item in sorted(heap, key=lambda entry: (-entry[0], entry[1]))]
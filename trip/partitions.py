@@ -0,0 +1,185 @@
+"""
+Monthly range partitions of the PostgreSQL partitioned tables.
+
+Partitions are named <table>_YYYYMM and cover [first day of month, first day of next month).
+Rows without a monthly partition land in <table>_default. The manage_partitions
+command must run at least monthly (e.g. cron "0 3 1 * *"), it creates the next
+months' partitions and moves the rows of the default partition into the
+partitions of their months: PostgreSQL refuses to create a partition for
+values the default partition already holds.
+Closed months can be archived: the partition is exported to a compressed file
+(Parquet when pyarrow is installed, gzipped CSV otherwise), then detached and dropped.
+On other databases the tables aren't partitioned and these helpers do nothing.
+"""
+import gzip
+import os
+import re
+from datetime import date
+from django.db import connection, transaction
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Partitioned table -> partition key
+PARTITIONED_TABLES = {
+    'driverevent': 'recorded_at',
+    'tripdriving': 'begin',
+    'tripbreak': 'begin',
+}
+ARCHIVE_DIR = os.environ.get('PARTITION_ARCHIVE_DIR', 'archive')
+EXPORT_BATCH_SIZE = 50000
+
+def month_start(day, offset=0):
+    month = day.month - 1 + offset
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+def partition_name(table, month):
+    return f"{table}_{month:%Y%m}"
+
+def is_partitioned(table):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s", [table])
+        return cursor.fetchone() is not None
+
+def default_partition_name(table):
+    return f"{table}_default"
+
+def _create_partition(cursor, table, start):
+    """
+    Creates the partition of the month starting at start. Rows of that month already in the default
+    partition are moved into it: the default partition is detached, the month partition created, the
+    rows moved and the default partition attached again, in one transaction.
+    """
+    key = PARTITIONED_TABLES[table]
+    end = month_start(start, 1)
+    name = partition_name(table, start)
+    default = default_partition_name(table)
+    bounds = [start.isoformat(), end.isoformat()]
+
+    cursor.execute("SELECT to_regclass(%s)", [default])
+    has_default = cursor.fetchone()[0] is not None
+    if has_default:
+        cursor.execute(f'SELECT 1 FROM "{default}" WHERE "{key}" >= %s AND "{key}" < %s LIMIT 1', bounds)
+        has_default = cursor.fetchone() is not None
+    if not has_default:
+        cursor.execute(f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)', bounds)
+        return
+
+    cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{default}"')
+    cursor.execute(f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)', bounds)
+    cursor.execute(f'INSERT INTO "{name}" SELECT * FROM "{default}" WHERE "{key}" >= %s AND "{key}" < %s', bounds)
+    cursor.execute(f'DELETE FROM "{default}" WHERE "{key}" >= %s AND "{key}" < %s', bounds)
+    cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT')
+
+def ensure_monthly_partitions(table, months_ahead=2, today=None):
+    """
+    Creates the partitions of the current month, of the months_ahead next months and of the months
+    having rows in the default partition, if they don't exist.
+    :return: names of the partitions created
+    """
+    if not is_partitioned(table):
+        return []
+
+    today = today or date.today()
+    key = PARTITIONED_TABLES[table]
+    months = {month_start(today, offset) for offset in range(months_ahead + 1)}
+    default = default_partition_name(table)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [default])
+        if cursor.fetchone()[0] is not None:
+            cursor.execute(f'SELECT DISTINCT date_trunc(%s, "{key}" AT TIME ZONE %s)::date FROM "{default}"', ['month', 'UTC'])
+            months.update(row[0] for row in cursor.fetchall())
+
+    created = []
+    for start in sorted(months):
+        name = partition_name(table, start)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [name])
+            if cursor.fetchone()[0] is not None:
+                continue
+            _create_partition(cursor, table, start)
+        created.append(name)
+    return created
+
+def list_partitions(table):
+    """
+    Returns the months of the monthly partitions of table, oldest first (the default partition is left out).
+    """
+    if not is_partitioned(table):
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %s",
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    pattern = re.compile(rf"^{re.escape(table)}_(\d{{4}})(\d{{2}})$")
+    months = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+def export_partition(name, directory=ARCHIVE_DIR):
+    """
+    Writes the rows of a partition to <directory>/<name>.parquet (or .csv.gz without pyarrow),
+    reading them in batches.
+    :return: path of the file written
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    if pyarrow is None:
+        path = os.path.join(directory, f"{name}.csv.gz")
+        with gzip.open(path, 'wb') as output, connection.cursor() as cursor:
+            with cursor.copy(f'COPY "{name}" TO STDOUT WITH (FORMAT csv, HEADER)') as copy:
+                for data in copy:
+                    output.write(data)
+        return path
+
+    path = os.path.join(directory, f"{name}.parquet")
+    writer = None
+    with transaction.atomic(), connection.chunked_cursor() as cursor:
+        cursor.execute(f'SELECT * FROM "{name}"')
+        columns = [column.name for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            batch = pyarrow.Table.from_pylist(
+                [dict(zip(columns, row)) for row in rows],
+                schema=writer.schema if writer is not None else None,
+            )
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(path, batch.schema, compression='zstd')
+            writer.write_table(batch)
+    if writer is None:
+        pyarrow.parquet.write_table(pyarrow.table({column: [] for column in columns}), path)
+    else:
+        writer.close()
+    return path
+
+def archive_partitions(table, keep_months=3, directory=ARCHIVE_DIR, today=None):
+    """
+    Exports, detaches and drops the partitions older than the keep_months last months.
+    :return: paths of the files written
+    """
+    cutoff = month_start(today or date.today(), -keep_months)
+    paths = []
+    for month in list_partitions(table):
+        if month >= cutoff:
+            break
+        name = partition_name(table, month)
+        paths.append(export_partition(name, directory))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+            cursor.execute(f'DROP TABLE "{name}"')
+    return paths
@@ -0,0 +1,132 @@
+"""
+Overpass results cached per geohash tile and POI category in the PoiTile table.
+
+A lookup reads every tile covering the search radius, fetches the missing
+tiles from Overpass in one bounding-box request, and refreshes stale tiles in
+a background thread while answering from the stale data. Overpass cuts an
+answer at the query's limit in id order, not by distance, so a bounding box
+reaching the limit is split in two and queried again; a single tile still
+reaching it is used for the request but not stored. A stored tile holds all
+its POIs, so the nearest one to any point of the tile is never dropped.
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+from django.db import connection
+from trip.geometry import geohash_bbox, geohash_encode, geohash_tiles_around, haversine
+from trip.overpass import nearest
+from trip.admission import BACKGROUND, priority
+from trip.models import PoiTile
+from trip.singleflight import SingleFlight
+
+TILE_PRECISION = 5
+TILE_TTL = timedelta(days=7)
+# A tile with more POIs isn't stored, like one reaching the Overpass limit, rather than keeping
+# only part of it: a 5-character tile (~5 km) holds a few dozen rest areas or stations at most.
+MAX_PER_TILE = 1000
+MAX_RESULTS = 25
+
+_refresh_flight = SingleFlight()
+
+def _bbox_of(tiles):
+    boxes = [geohash_bbox(tile) for tile in tiles]
+    return (
+        min(box[0] for box in boxes),
+        min(box[1] for box in boxes),
+        max(box[2] for box in boxes),
+        max(box[3] for box in boxes),
+    )
+
+def _split_by_tile(tiles, elements):
+    """
+    :return: dict tile -> elements inside the tile
+    """
+    by_tile = {tile: [] for tile in tiles}
+    for element in elements:
+        tile_elements = by_tile.get(geohash_encode(element["lat"], element["lng"], TILE_PRECISION))
+        if tile_elements is not None:
+            tile_elements.append(element)
+    return by_tile
+
+def _store_tiles(category, by_tile):
+    now = datetime.now(timezone.utc)
+    too_large = [tile for tile, tile_elements in by_tile.items() if len(tile_elements) > MAX_PER_TILE]
+    if too_large:
+        print(f"POI tiles {too_large} ({category}) hold more than {MAX_PER_TILE} elements, not cached")
+    PoiTile.objects.bulk_create(
+        [
+            PoiTile(geohash=tile, category=category, elements=tile_elements, fetched_at=now)
+            for tile, tile_elements in by_tile.items() if len(tile_elements) <= MAX_PER_TILE
+        ],
+        update_conflicts=True,
+        unique_fields=['geohash', 'category'],
+        update_fields=['elements', 'fetched_at'],
+    )
+
+def _fetch_tiles(category, tiles, fetch, limit):
+    """
+    Fetches and stores the tiles, splitting the bounding box while the answers reach limit.
+    :return: dict tile -> elements
+    """
+    fetched = 0
+
+    def counted(elements):
+        nonlocal fetched
+        for element in elements:
+            fetched += 1
+            yield element
+
+    by_tile = _split_by_tile(tiles, counted(fetch(category, _bbox_of(tiles))))
+    if limit is None or fetched < limit:
+        _store_tiles(category, by_tile)
+        return by_tile
+    if len(tiles) == 1:
+        print(f"POI tile {tiles[0]} ({category}) reaches the Overpass limit, not cached")
+        return by_tile
+    # Sorted geohashes sharing a prefix are neighbours, each half is a smaller box.
+    tiles = sorted(tiles)
+    middle = len(tiles) // 2
+    return {**_fetch_tiles(category, tiles[:middle], fetch, limit), **_fetch_tiles(category, tiles[middle:], fetch, limit)}
+
+def _refresh(category, tiles, fetch, limit):
+    try:
+        # Stale tiles are still served, the refresh only uses the Overpass budget the drivers leave.
+        with priority(BACKGROUND):
+            _fetch_tiles(category, tiles, fetch, limit)
+    except Exception as e:
+        print(f"Error refreshing POI tiles: {e}")
+    finally:
+        connection.close()
+
+def _refresh_in_background(category, tiles, fetch, limit):
+    key = (category, tuple(sorted(tiles)))
+    threading.Thread(target=lambda: _refresh_flight.do(key, lambda: _refresh(category, tiles, fetch, limit)), daemon=True).start()
+
+def get_cached_pois(category, lat, lng, radius, fetch, limit=None):
+    """
+    Returns the MAX_RESULTS POIs of category nearest to (lat, lng) within radius meters, nearest first.
+    :param fetch: fetch(category, (south, west, north, east)) returning a list of {"lat", "lng", ...} from Overpass
+    :param limit: maximum number of elements of one fetch, an answer of that size may be truncated
+    """
+    tiles = geohash_tiles_around(lat, lng, radius, TILE_PRECISION)
+    stale_before = datetime.now(timezone.utc) - TILE_TTL
+
+    elements_by_tile = {}
+    stale = []
+    for tile, elements, fetched_at in PoiTile.objects.filter(geohash__in=tiles, category=category).values_list('geohash', 'elements', 'fetched_at'):
+        elements_by_tile[tile] = elements
+        if fetched_at < stale_before:
+            stale.append(tile)
+
+    missing = [tile for tile in tiles if tile not in elements_by_tile]
+    if missing:
+        elements_by_tile.update(_fetch_tiles(category, missing, fetch, limit))
+    if stale:
+        _refresh_in_background(category, stale, fetch, limit)
+
+    candidates = (
+        (haversine((lat, lng), (element["lat"], element["lng"])), element)
+        for elements in elements_by_tile.values()
+        for element in elements
+    )
+    within_radius = (candidate for candidate in candidates if candidate[0] <= radius)
+    return [element for _, element in nearest(within_radius, MAX_RESULTS, lambda candidate: candidate[0])]
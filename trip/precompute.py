@@ -0,0 +1,85 @@
+"""
+Batch computation of the drivers' state read by the planner (see DriverState).
+"""
+from datetime import datetime, timedelta, timezone
+from django.db.models import F, Max, OuterRef, Q, Subquery, Sum
+from django.utils.dateparse import parse_datetime
+from trip.compliance import CYCLE_DAYS, audit, load_log
+from trip.models import DriverState, TripConfig, TripRefueling
+from truck_api.db_router import use_replica
+
+@use_replica()
+def get_active_user_ids(days):
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    return list(TripConfig.objects.filter(datetimeUTC__gte=since).values_list('user_id', flat=True).distinct())
+
+@use_replica()
+def get_distances_since_refuel(user_ids):
+    """
+    Same result as TripRefueling.get_total_distance_after_last_refueling for every user, in two queries.
+    """
+    last_refuelings = (
+        TripRefueling.objects.filter(tripconfig__user_id__in=user_ids)
+        .values('tripconfig__user_id')
+        .annotate(last_tripconfig_id=Max('tripconfig_id'))
+    )
+    last_by_user = {row['tripconfig__user_id']: row['last_tripconfig_id'] for row in last_refuelings}
+    refuel_distance = dict(
+        TripRefueling.objects.filter(tripconfig_id__in=last_by_user.values())
+        .order_by('id')
+        .values_list('tripconfig_id', 'distancetodropoff')
+    )
+
+    last_refuel = Subquery(
+        TripRefueling.objects.filter(tripconfig__user_id=OuterRef('user_id'))
+        .order_by('-tripconfig_id')
+        .values('tripconfig_id')[:1]
+    )
+    distances_after = dict(
+        TripConfig.objects.filter(user_id__in=user_ids)
+        .annotate(last_refuel=last_refuel)
+        .filter(Q(last_refuel__isnull=True) | Q(id__gt=F('last_refuel')))
+        .values('user_id')
+        .annotate(total=Sum('totaldistance'))
+        .values_list('user_id', 'total')
+    )
+
+    return {
+        user_id: refuel_distance.get(last_by_user.get(user_id), 0) + (distances_after.get(user_id) or 0)
+        for user_id in user_ids
+    }
+
+def compute_driver_states(user_ids, now=None):
+    """
+    Computes and stores the DriverState of the given users.
+    :return: number of states written
+    """
+    now = now or datetime.now(timezone.utc)
+    if not user_ids:
+        return 0
+
+    # The 8-day cycle (and the restart before it) is enough to know the current state.
+    report = audit(load_log(user_ids, start=now - timedelta(days=CYCLE_DAYS + 2)), as_of=now)
+    distances = get_distances_since_refuel(user_ids)
+
+    states = []
+    for user_id in user_ids:
+        result = report.get(user_id)
+        remaining = result['remaining'] if result else None
+        states.append(DriverState(
+            user_id=user_id,
+            remaining_driving=remaining['driving'] if remaining else 11 * 3600,
+            before_break=remaining['before_break'] if remaining else 8 * 3600,
+            remaining_cycle=remaining['cycle'] if remaining else 70 * 3600,
+            distance_since_refuel=distances.get(user_id, 0),
+            last_duty_end=parse_datetime(result['last_duty_end']) if result else None,
+            computed_at=now,
+        ))
+
+    DriverState.objects.bulk_create(
+        states,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['remaining_driving', 'before_break', 'remaining_cycle', 'distance_since_refuel', 'last_duty_end', 'computed_at'],
+    )
+    return len(states)
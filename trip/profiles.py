@@ -0,0 +1,55 @@
+"""
+Truck profiles (fuel range, stop durations, HOS limits) cached per worker.
+
+All the profiles and assignments are loaded in one pass and kept for
+CACHE_TTL seconds, so the planner gets a driver's profile without any query.
+Saving or deleting a profile or an assignment empties the cache of the worker
+doing it; the other workers reload within CACHE_TTL.
+"""
+import time
+from trip.models import TruckAssignment, TruckProfile
+
+CACHE_TTL = 300
+
+# Drivers without an assignment, when no profile is marked as default.
+FEDERAL = TruckProfile(name="federal")
+
+_cache = {"loaded_at": None, "profiles": {}, "assignments": {}, "default": FEDERAL}
+
+def invalidate_profiles(**kwargs):
+    _cache["loaded_at"] = None
+
+def _load():
+    loaded_at = _cache["loaded_at"]
+    if loaded_at is not None and time.monotonic() - loaded_at < CACHE_TTL:
+        return
+    profiles = {profile.id: profile for profile in TruckProfile.objects.all()}
+    _cache["profiles"] = profiles
+    _cache["assignments"] = dict(TruckAssignment.objects.values_list('user_id', 'profile_id'))
+    _cache["default"] = next((profile for profile in profiles.values() if profile.is_default), FEDERAL)
+    _cache["loaded_at"] = time.monotonic()
+
+def get_profiles(user_ids):
+    """
+    :return: dict user_id -> TruckProfile, the default profile for the drivers without an assignment
+    """
+    try:
+        _load()
+    except Exception as e:
+        print(f"Error loading truck profiles: {e}")
+        return {user_id: FEDERAL for user_id in user_ids}
+    profiles = _cache["profiles"]
+    assignments = _cache["assignments"]
+    return {user_id: profiles.get(assignments.get(user_id), _cache["default"]) for user_id in user_ids}
+
+def get_profile(user_id):
+    return get_profiles([user_id])[user_id]
+
+def get_profile_by_name(name):
+    _load()
+    for profile in _cache["profiles"].values():
+        if profile.name == name:
+            return profile
+    if name == FEDERAL.name:
+        return FEDERAL
+    raise ValueError(f"Unknown truck profile {name!r}")
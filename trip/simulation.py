@@ -0,0 +1,86 @@
+"""
+Monte Carlo simulation of a computed plan under traffic delays.
+
+Every driving leg of the plan gets a random duration in each scenario: the
+OSRM duration times a log-normal factor, plus incidents arriving at
+INCIDENT_RATE per driving hour with an exponential delay. Arrival times and
+the driving and break counters of the truck profile are then recomputed for all the
+scenarios at once on (scenarios, legs) arrays. The stops stay where the
+planner placed them, so a delay shows up as driving past a limit before the
+planned stop.
+"""
+import numpy as np
+from trip.profiles import FEDERAL
+
+DEFAULT_SCENARIOS = 2000
+MAX_SCENARIOS = 20000
+# Standard deviation of the log of (actual / OSRM) leg duration.
+DELAY_SIGMA = 0.12
+# Incidents (accident, work zone, congestion) per hour of driving, and their mean delay.
+INCIDENT_RATE = 0.05
+INCIDENT_MEAN_DELAY = 30 * 60
+PERCENTILES = (50, 90, 95)
+
+def _since_reset(cumsum, reset):
+    """
+    Value of cumsum accumulated since the last leg starting a segment.
+    :param cumsum: (scenarios, legs) cumulative sums along the legs
+    :param reset: (legs,) bool, True for the legs starting after a reset
+    """
+    legs = cumsum.shape[1]
+    first_leg = np.maximum.accumulate(np.where(reset, np.arange(legs), 0))
+    before = np.concatenate([np.zeros((cumsum.shape[0], 1)), cumsum[:, :-1]], axis=1)
+    return cumsum - before[:, first_leg]
+
+def simulate_plan(waypoints, remaining_time_driving, rest_duration, scenarios=DEFAULT_SCENARIOS, seed=None, profile=FEDERAL):
+    """
+    :param waypoints: waypoints of a plan (with duration and duration_from_last_point)
+    :param remaining_time_driving: driving time left at departure, as given to the planner
+    :param rest_duration: driving time left before a 30-minute break at departure, None for none needed
+    :param scenarios: number of delay scenarios drawn
+    :param profile: TruckProfile the plan was made with
+    :return: {"scenarios": n, "stops": [{"eta": {"p50", "p90", "p95"}, "violation_probability"}]},
+        one entry per waypoint after the current position, ETAs in seconds from departure
+    """
+    scenarios = max(1, min(int(scenarios), MAX_SCENARIOS))
+    if len(waypoints) < 2:
+        return {"scenarios": scenarios, "stops": []}
+
+    legs = np.array([wp.get("duration_from_last_point") or 0 for wp in waypoints[1:]], dtype=np.float64)
+    stops = np.array([wp.get("duration", [0])[0] for wp in waypoints], dtype=np.float64)
+
+    rng = np.random.default_rng(seed)
+    factor = rng.lognormal(0, DELAY_SIGMA, size=(scenarios, len(legs)))
+    incidents = rng.poisson(INCIDENT_RATE * legs / 3600, size=(scenarios, len(legs)))
+    # Sum of n exponential delays, drawn as a gamma with shape n.
+    delay = np.where(incidents > 0, rng.gamma(np.maximum(incidents, 1), INCIDENT_MEAN_DELAY), 0)
+    driving = legs * factor + delay
+
+    driving_total = np.cumsum(driving, axis=1)
+    arrival = driving_total + np.cumsum(stops[:-1])
+
+    # Counters reset by the stop made before each leg.
+    shift_reset = stops[:-1] >= profile.sleeper_duration
+    break_reset = stops[:-1] >= profile.break_duration
+    shift_limit = np.where(np.maximum.accumulate(shift_reset), profile.max_driving, remaining_time_driving)
+    first_break_limit = np.inf if rest_duration is None else rest_duration
+    next_break_limit = np.inf if profile.max_driving_before_break is None else profile.max_driving_before_break
+    break_limit = np.where(np.maximum.accumulate(break_reset), next_break_limit, first_break_limit)
+
+    violation = (
+        (_since_reset(driving_total, shift_reset) > shift_limit)
+        | (_since_reset(driving_total, break_reset) > break_limit)
+    )
+
+    eta = np.percentile(arrival, PERCENTILES, axis=0)
+    probability = violation.mean(axis=0)
+    return {
+        "scenarios": scenarios,
+        "stops": [
+            {
+                "eta": {f"p{p}": int(round(eta[k, i])) for k, p in enumerate(PERCENTILES)},
+                "violation_probability": round(float(probability[i]), 4),
+            }
+            for i in range(len(legs))
+        ],
+    }
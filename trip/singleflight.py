@@ -0,0 +1,80 @@
+"""
+Single-flight calls: concurrent callers asking for the same key wait for one
+computation and share its result (or its exception).
+
+A result can also be kept for ``ttl`` seconds, so callers arriving right after
+the computation (the same route asked again a few lines later in a request, or
+drivers receiving the same broadcast load) reuse it as well.
+"""
+import threading
+import time
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    def __init__(self, ttl=0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._results = {}
+
+    def do(self, key, fn):
+        """
+        Returns fn(), computed once for all the concurrent callers of key.
+        """
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.ttl > 0:
+                    if len(self._results) >= self.max_entries:
+                        self._evict()
+                    self._results[key] = (time.monotonic() + self.ttl, call.result)
+            call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._results.items() if expires_at <= now]
+        for key in expired:
+            del self._results[key]
+        if len(self._results) >= self.max_entries:
+            self._results.clear()
+
+    def forget(self, key):
+        with self._lock:
+            self._results.pop(key, None)
+
+def normalize_points(points, precision=5):
+    """
+    Rounds (lat, lng) points so requests for the same place share a key (5 decimals ~ 1 m).
+    """
+    return tuple((round(float(lat), precision), round(float(lng), precision)) for lat, lng in points)
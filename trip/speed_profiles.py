@@ -0,0 +1,210 @@
+"""
+Time-of-day speed profiles correcting the OSRM free-flow durations.
+
+learn_speed_profile matches the legs of the saved plans with the driving the
+drivers' devices actually recorded (TripDriving rows derived from the events)
+and stores, per corridor (pair of geohash cells of the leg ends) and per local
+hour, the ratio of the actual to the OSRM duration. The factors are kept in one
+SpeedProfile as a float32 array, loaded once per worker (reloaded every
+CACHE_TTL seconds) and applied by leg_factor without any database or upstream
+call. Corridors with few legs are pulled toward the factor of all corridors.
+"""
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from django.db import transaction
+from trip.geometry import geohash_encode
+from trip.models import SpeedProfile, TripConfig, TripDriving
+
+CORRIDOR_PRECISION = 3
+HOURS = 24
+CACHE_TTL = 300
+# Weight of the prior, in legs: the all-corridors factor for a corridor, 1 for the all-corridors factor.
+PRIOR_LEGS = 5
+# Corridors with fewer matched legs only use the all-corridors factors.
+MIN_CORRIDOR_LEGS = 3
+# Stops shorter than this don't split a leg (traffic, short on-duty stops).
+MERGE_GAP = 10 * 60
+# Legs whose ratio is outside these bounds are matching errors (missed stop, device off...).
+MIN_RATIO = 0.5
+MAX_RATIO = 3.0
+MIN_FACTOR = 0.8
+MAX_FACTOR = 2.0
+# Driving recorded this long after the last plan of the period is still matched with it.
+MAX_TRIP_DURATION = timedelta(days=5)
+
+_cache = {"loaded_at": None, "rows": {}, "factors": None}
+
+def invalidate_speed_profiles():
+    _cache["loaded_at"] = None
+
+def corridor_key(origin, destination):
+    return (
+        geohash_encode(origin[0], origin[1], CORRIDOR_PRECISION)
+        + ":" + geohash_encode(destination[0], destination[1], CORRIDOR_PRECISION)
+    )
+
+def hour_weights(departure, duration, lng):
+    """
+    Share of a leg driven in each local hour, the local time being approximated from the longitude (15° per hour).
+    :param departure: aware datetime
+    :return: list of HOURS weights summing to 1
+    """
+    weights = [0.0] * HOURS
+    t = departure.timestamp() + lng / 15 * 3600
+    if duration <= 0:
+        weights[int(t // 3600) % HOURS] = 1.0
+        return weights
+    remaining = duration
+    while remaining > 0:
+        taken = min(remaining, 3600 - t % 3600)
+        weights[int(t // 3600) % HOURS] += taken / duration
+        t += taken
+        remaining -= taken
+    return weights
+
+def _load():
+    loaded_at = _cache["loaded_at"]
+    if loaded_at is not None and time.monotonic() - loaded_at < CACHE_TTL:
+        return
+    profile = SpeedProfile.objects.order_by('-computed_at').values_list('corridors', 'factors').first()
+    if profile is None:
+        _cache["rows"] = {}
+        _cache["factors"] = None
+    else:
+        factors = array('f')
+        factors.frombytes(bytes(profile[1]))
+        _cache["rows"] = {corridor: row for row, corridor in enumerate(profile[0], start=1)}
+        _cache["factors"] = factors
+    _cache["loaded_at"] = time.monotonic()
+
+def leg_factor(origin, destination, departure, duration):
+    """
+    Factor to apply to the OSRM duration of a leg.
+    :param departure: aware datetime at which the leg starts
+    :param duration: OSRM duration of the leg (s)
+    :return: 1.0 when no profile has been learned
+    """
+    try:
+        _load()
+    except Exception as e:
+        print(f"Error loading speed profiles: {e}")
+        return 1.0
+    factors = _cache["factors"]
+    if factors is None:
+        return 1.0
+    offset = _cache["rows"].get(corridor_key(origin, destination), 0) * HOURS
+    weights = hour_weights(departure, duration, (origin[1] + destination[1]) / 2)
+    return sum(weight * factors[offset + hour] for hour, weight in enumerate(weights) if weight)
+
+def _planned_legs(ways):
+    """
+    Returns the driving legs of a saved plan as (origin, destination, OSRM duration),
+    legs separated by a stop shorter than MERGE_GAP being merged, or [] when a duration is missing.
+    """
+    legs = []
+    for previous, wp in zip(ways, ways[1:]):
+        free_duration = wp.get("free_flow_duration", wp.get("duration_from_last_point"))
+        if free_duration is None:
+            return []
+        destination = (wp["lat"], wp["lng"])
+        if legs and previous.get("duration", [0])[0] < MERGE_GAP:
+            origin, _, merged = legs[-1]
+            legs[-1] = (origin, destination, merged + free_duration)
+        else:
+            legs.append(((previous["lat"], previous["lng"]), destination, free_duration))
+    return [leg for leg in legs if leg[2] > 0]
+
+def _driving_blocks(drivings):
+    """
+    Merges driving intervals separated by less than MERGE_GAP.
+    :param drivings: (begin, seconds) ordered by begin
+    :return: list of [begin, driving seconds]
+    """
+    blocks = []
+    end = None
+    for begin, seconds in drivings:
+        if blocks and (begin - end).total_seconds() < MERGE_GAP:
+            blocks[-1][1] += seconds
+        else:
+            blocks.append([begin, seconds])
+        end = begin + timedelta(seconds=seconds)
+    return blocks
+
+def _clamp(factor):
+    return min(max(factor, MIN_FACTOR), MAX_FACTOR)
+
+def learn_speed_profile(since, until):
+    """
+    Learns the factors from the plans saved between since and until and stores them as the new SpeedProfile.
+    The n legs of a plan are matched with the first n driving blocks recorded after it was saved,
+    plans followed by fewer blocks (or by another plan before their last leg) are left out.
+    :return: the SpeedProfile, None when no leg could be matched
+    """
+    plans_by_user = {}
+    plans = TripConfig.objects.filter(datetimeUTC__gte=since, datetimeUTC__lt=until).order_by('datetimeUTC')
+    for plan in plans.only('id', 'user_id', 'ways', 'datetimeUTC').iterator(chunk_size=1000):
+        if plan.ways:
+            plans_by_user.setdefault(plan.user_id, []).append(plan)
+
+    # corridor -> (sum of weighted ratios, sum of weights) per hour, None for all the corridors.
+    totals = {}
+    samples = 0
+    for user_id, plans in plans_by_user.items():
+        drivings = (
+            TripDriving.objects.filter(tripconfig__user_id=user_id, begin__gte=plans[0].datetimeUTC, begin__lt=until + MAX_TRIP_DURATION)
+            .exclude(tripconfig_id__in=[plan.id for plan in plans])
+            .order_by('begin')
+            .values_list('begin', 'time_total')
+        )
+        blocks = _driving_blocks([(begin, t.hour * 3600 + t.minute * 60 + t.second) for begin, t in drivings])
+        starts = [block[0] for block in blocks]
+
+        for plan, next_plan in zip(plans, plans[1:] + [None]):
+            legs = _planned_legs(plan.ways)
+            first = bisect_left(starts, plan.datetimeUTC)
+            matched = blocks[first:first + len(legs)]
+            if not legs or len(matched) < len(legs):
+                continue
+            if next_plan is not None and matched[-1][0] >= next_plan.datetimeUTC:
+                continue
+            for (origin, destination, free_duration), (begin, actual) in zip(legs, matched):
+                ratio = actual / free_duration
+                if not MIN_RATIO <= ratio <= MAX_RATIO:
+                    continue
+                weights = hour_weights(begin, actual, (origin[1] + destination[1]) / 2)
+                for key in (corridor_key(origin, destination), None):
+                    sums, weight_sums = totals.setdefault(key, ([0.0] * HOURS, [0.0] * HOURS))
+                    for hour, weight in enumerate(weights):
+                        sums[hour] += weight * ratio
+                        weight_sums[hour] += weight
+                samples += 1
+
+    if not samples:
+        return None
+
+    sums, weight_sums = totals.pop(None)
+    overall = [_clamp((sums[hour] + PRIOR_LEGS) / (weight_sums[hour] + PRIOR_LEGS)) for hour in range(HOURS)]
+    factors = array('f', overall)
+    corridors = []
+    for key in sorted(totals):
+        sums, weight_sums = totals[key]
+        if sum(weight_sums) < MIN_CORRIDOR_LEGS:
+            continue
+        corridors.append(key)
+        factors.extend(
+            _clamp((sums[hour] + PRIOR_LEGS * overall[hour]) / (weight_sums[hour] + PRIOR_LEGS))
+            for hour in range(HOURS)
+        )
+
+    with transaction.atomic():
+        profile = SpeedProfile.objects.create(
+            corridors=corridors,
+            factors=factors.tobytes(),
+            samples=samples,
+            computed_at=datetime.now(timezone.utc),
+        )
+        SpeedProfile.objects.exclude(id=profile.id).delete()
+    invalidate_speed_profiles()
+    return profile
@@ -1,3 +1,136 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from django.test import TestCase, TransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from trip.geometry import geohash_bbox, geohash_encode
+from trip.ingest import derive_intervals
+from trip.models import DriverEvent, DriverState, EventCursor, PoiTile, TripConfig, TripDriving
+from trip.poi_cache import TILE_PRECISION, get_cached_pois
+from users.models import User
+
+
+class PlanningStateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(name="Driver", email="driver@example.com", password="x")
+        self.now = datetime(2026, 10, 19, 12, tzinfo=timezone.utc)
+
+    def store_state(self, last_duty_end, remaining_cycle, remaining_driving=5 * 3600):
+        DriverState.objects.create(
+            user=self.user, remaining_driving=remaining_driving, before_break=4 * 3600, remaining_cycle=remaining_cycle,
+            distance_since_refuel=0, last_duty_end=last_duty_end, computed_at=last_duty_end,
+        )
+
+    def test_driving_capped_by_remaining_cycle_after_shift_rest(self):
+        self.store_state(self.now - timedelta(hours=11), remaining_cycle=2 * 3600)
+        remaining_driving, _, _ = DriverState.get_planning_state(self.user.id, self.now)
+        self.assertEqual(remaining_driving, 2 * 3600)
+
+    def test_driving_capped_by_remaining_cycle_during_shift(self):
+        self.store_state(self.now - timedelta(hours=1), remaining_cycle=3600)
+        remaining_driving, _, _ = DriverState.get_planning_state(self.user.id, self.now)
+        self.assertEqual(remaining_driving, 3600)
+
+    def test_restart_resets_cycle(self):
+        self.store_state(self.now - timedelta(hours=35), remaining_cycle=0)
+        remaining_driving, _, _ = DriverState.get_planning_state(self.user.id, self.now)
+        self.assertEqual(remaining_driving, 11 * 3600)
+
+
+class LivePlanStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(name="Driver", email="driver@example.com", password="x")
+        token = AccessToken()
+        token['user_id'] = self.user.id
+        self.token = str(token)
+
+    async def test_first_event_passes_through_compression(self):
+        def plan(user_id, current, pickup, dropoff, planning_state=None, on_stop=None):
+            return {"waypoints": [], "total_distance": 0}, 200
+
+        with mock.patch('trip.views.plan_for_user', plan):
+            response = await self.async_client.get(
+                '/api/trip/live',
+                {'current_lat': 40, 'current_lng': -100, 'pickup_lat': 41, 'pickup_lng': -101, 'dropoff_lat': 42, 'dropoff_lng': -102},
+                headers={'Authorization': f"Bearer {self.token}", 'Accept-Encoding': 'gzip, deflate, br'},
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            stream = aiter(response.streaming_content)
+            first = await anext(stream)
+            await stream.aclose()
+
+        self.assertTrue(first.startswith(b"event: plan\n"))
+
+
+class TripSaveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(name="Driver", email="driver@example.com", password="x")
+        token = AccessToken()
+        token['user_id'] = self.user.id
+        self.headers = {'Authorization': f"Bearer {token}", 'Idempotency-Key': 'trip-1'}
+
+    def save(self, datetimeUTC):
+        return self.client.post(
+            '/api/trip/save', {'datetimeUTC': datetimeUTC, 'waypoints': [], 'total_distance': 0},
+            content_type='application/json', headers=self.headers,
+        )
+
+    def test_invalid_datetime_is_rejected(self):
+        for value in ("2026-13-45T00:00:00", 123, None):
+            self.assertEqual(self.save(value).status_code, 400)
+
+    def test_valid_datetime_is_accepted(self):
+        self.assertEqual(self.save("2026-10-19T12:00:00Z").status_code, 202)
+
+
+class DeriveIntervalsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(name="Driver", email="driver@example.com", password="x")
+        self.idle = User.objects.create(name="Idle", email="idle@example.com", password="x")
+        self.start = datetime(2026, 10, 19, 8, tzinfo=timezone.utc)
+
+    def record(self, minutes, status):
+        DriverEvent.objects.create(
+            user=self.user, recorded_at=self.start + timedelta(minutes=minutes), lat=40, lng=-100, speed=0, status=status,
+        )
+
+    def test_passes_of_one_day_share_the_trip_config(self):
+        self.record(0, DriverEvent.StatusChoices.DRIVING)
+        self.record(60, DriverEvent.StatusChoices.ON_DUTY)
+        derive_intervals(until=self.start + timedelta(hours=2))
+        self.record(120, DriverEvent.StatusChoices.DRIVING)
+        self.record(180, DriverEvent.StatusChoices.ON_DUTY)
+        derive_intervals(until=self.start + timedelta(hours=4))
+
+        self.assertEqual(TripConfig.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(TripDriving.objects.filter(tripconfig__user=self.user).count(), 2)
+        self.assertEqual(TripConfig.objects.get(user=self.user).total_time_driving.hour, 2)
+
+    def test_only_drivers_with_new_events_are_read(self):
+        self.record(0, DriverEvent.StatusChoices.DRIVING)
+        self.record(60, DriverEvent.StatusChoices.ON_DUTY)
+        with mock.patch('trip.ingest._derive_driver', return_value=(0, None)) as derive:
+            derive_intervals(until=self.start + timedelta(hours=2))
+        self.assertEqual([call.args[0] for call in derive.call_args_list], [self.user.id])
+
+        EventCursor.objects.create(user=self.user, derived_until=self.start + timedelta(minutes=60))
+        with mock.patch('trip.ingest._derive_driver', return_value=(0, None)) as derive:
+            derive_intervals(until=self.start + timedelta(hours=2))
+        derive.assert_not_called()
+
+
+class PoiCacheTests(TestCase):
+    def test_dense_tile_keeps_the_poi_near_its_edge(self):
+        south, west, north, east = geohash_bbox(geohash_encode(40, -100, TILE_PRECISION))
+        center = ((south + north) / 2, (west + east) / 2)
+        crowd = [{"lat": center[0] + i * 1e-5, "lng": center[1], "name": f"Center {i}"} for i in range(100)]
+        edge = {"lat": south + 1e-4, "lng": west + 1e-4, "name": "Edge"}
+
+        def fetch(category, bbox):
+            return [element for element in crowd + [edge] if bbox[0] <= element["lat"] <= bbox[2] and bbox[1] <= element["lng"] <= bbox[3]]
+
+        for _ in range(2):
+            pois = get_cached_pois(PoiTile.CategoryChoices.GAS_STATION, south + 2e-4, west + 2e-4, 1000, fetch)
+            self.assertEqual(pois[0]["name"], "Edge")
+        self.assertTrue(PoiTile.objects.exists())
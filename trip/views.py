@@ -3,11 +3,35 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.tokens import AccessToken
-import requests
 import math
-from datetime import datetime, timezone
-from django.utils.timezone import make_aware
-import pytz
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+from trip.geometry import get_plan_key
+from trip.models import RouteGeometry, DriverState, PoiTile, RequestProfile
+from trip.poi_cache import get_cached_pois
+from trip.overpass import element_position, iter_elements
+from trip.singleflight import SingleFlight, normalize_points
+from trip.lanes import get_lane_route
+from trip.speed_profiles import leg_factor
+from trip.profiles import FEDERAL, get_profile
+from trip.ingest import buffer as event_buffer, parse_events
+from trip.outbox import enqueue, validate_trip_payload
+from trip.admission import PlanRateThrottle, UpstreamThrottled, admit_upstream, take_user_token
+from users.revocation import is_revoked
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
+from asgiref.sync import sync_to_async
+
+# Identical routing, POI and plan requests running at the same time (or a few seconds apart) share one computation.
+route_flight = SingleFlight(ttl=60)
+poi_flight = SingleFlight(ttl=60)
+plan_flight = SingleFlight(ttl=5)
+
+# Maximum number of elements returned by one Overpass query.
+OVERPASS_LIMIT = 2000
 
 def get_route_data(waypoints):
     """
@@ -15,10 +39,20 @@ def get_route_data(waypoints):
     """
     if len(waypoints) < 2:
         return None
-    
+
+    lane_route = get_lane_route(waypoints)
+    if lane_route is not None:
+        return lane_route
+
+    return route_flight.do(("route", normalize_points(waypoints)), lambda: _fetch_route_data(waypoints))
+
+def _fetch_route_data(waypoints):
     waypoints_str = ";".join([f"{lon},{lat}" for lat, lon in waypoints])
-    osrm_url = f"http://router.project-osrm.org/route/v1/driving/{waypoints_str}?overview=false"
+    osrm_url = f"{settings.OSRM_URL}/route/v1/driving/{waypoints_str}?overview=false"
     
+    import requests
+
+    admit_upstream("osrm")
     response = requests.get(osrm_url)
     data = response.json()
     
@@ -33,9 +67,19 @@ def get_route_data_full(waypoints):
     if len(waypoints) < 2:
         return None
 
+    lane_route = get_lane_route(waypoints, full=True)
+    if lane_route is not None:
+        return lane_route
+
+    return route_flight.do(("route_full", normalize_points(waypoints)), lambda: _fetch_route_data_full(waypoints))
+
+def _fetch_route_data_full(waypoints):
     waypoints_str = ";".join([f"{lon},{lat}" for lat, lon in waypoints])
-    osrm_url = f"https://router.project-osrm.org/route/v1/driving/{waypoints_str}?overview=full&geometries=geojson"
+    osrm_url = f"{settings.OSRM_URL}/route/v1/driving/{waypoints_str}?overview=full&geometries=geojson"
     
+    import requests
+
+    admit_upstream("osrm")
     response = requests.get(osrm_url)
     data = response.json()
 
@@ -44,6 +88,65 @@ def get_route_data_full(waypoints):
     
     return None
 
+def get_route_table(points):
+    """
+    Renvoie les matrices de durées (s) et de distances (m) entre tous les points, en un seul appel OSRM.
+    """
+    if len(points) < 2:
+        return None
+
+    return route_flight.do(("table", normalize_points(points)), lambda: _fetch_route_table(points))
+
+def _fetch_route_table(points):
+    points_str = ";".join([f"{lon},{lat}" for lat, lon in points])
+    osrm_url = f"{settings.OSRM_URL}/table/v1/driving/{points_str}?annotations=duration,distance"
+
+    import requests
+
+    admit_upstream("osrm")
+    response = requests.get(osrm_url)
+    data = response.json()
+
+    if data.get("code") == "Ok" and "durations" in data and "distances" in data:
+        return data["durations"], data["distances"]
+    return None
+
+def rank_stops(candidates, previous_point, next_point, metric="duration", limit=25):
+    """
+    Orders candidate stops by detour between previous_point and next_point, using one OSRM table call.
+    Each returned candidate gets "to_next_duration" (s) and "to_next_distance" (miles).
+    :param metric: "duration" or "distance", cost minimized by the ranking
+    """
+    candidates = candidates[:limit]
+    points = [tuple(previous_point)] + [(c["lat"], c["lng"]) for c in candidates] + [tuple(next_point)]
+    try:
+        table = get_route_table(points)
+    except Exception as e:
+        print(f"Error fetching route table: {e}")
+        table = None
+    if table is None:
+        return candidates
+
+    durations, distances = table
+    matrix = durations if metric == "duration" else distances
+    last = len(points) - 1
+    ranked = []
+    for i, candidate in enumerate(candidates, start=1):
+        to_candidate = matrix[0][i]
+        to_next = matrix[i][last]
+        if to_candidate is None or to_next is None:
+            continue
+        ranked.append((to_candidate + to_next, i, {
+            **candidate,
+            "to_next_duration": durations[i][last],
+            "to_next_distance": distances[i][last] / 1609.34 if distances[i][last] is not None else None,
+        }))
+
+    if not ranked:
+        return candidates
+    ranked.sort(key=lambda item: (item[0], item[1]))
+    return [candidate for _, _, candidate in ranked]
+
 def get_route_distance(waypoints):
     routes = get_route_data(waypoints)
     if routes:
@@ -130,72 +233,85 @@ def compare_duration_with_tolerance(duration1, duration2, tolerance = 10):
     return abs(duration1 - duration2) <= threshold
 
 def get_nearest_rest_area(lat, lng, radius=10000):
-    query = f"""
-        [out:json];
-        (
-        node["amenity"="fuel"](around:{radius},{lat},{lng});
-        way["amenity"="fuel"](around:{radius},{lat},{lng});
-        
-        node["amenity"="parking"](around:{radius},{lat},{lng});
-        way["amenity"="parking"](around:{radius},{lat},{lng});
-        
-        node["leisure"="picnic_site"](around:{radius},{lat},{lng});
-        
-        node["amenity"="fast_food"](around:{radius},{lat},{lng});
-        node["amenity"="cafe"](around:{radius},{lat},{lng});
-        );
-        out body;
-    """
-    url = f"https://overpass-api.de/api/interpreter?data={requests.utils.quote(query)}"
     try:
-        response = requests.get(url)
-        data = response.json()
-
-        rest_areas = [
-            {
-                "lat": el.get("lat"), 
-                "lng": el.get("lon"), 
-                "name": el.get("tags", {}).get("name", "Unnamed Rest Area"),
-                "type": el.get("tags", {}).get("highway", "unknown")
-            }
-            for el in data.get("elements", [])
-            if "lat" in el and "lon" in el
-        ]
-
-        return rest_areas
-
+        return poi_flight.do(
+            ("rest_area", normalize_points([(lat, lng)]), radius),
+            lambda: get_cached_pois(PoiTile.CategoryChoices.REST_AREA, lat, lng, radius, fetch_pois, OVERPASS_LIMIT),
+        )
+    except UpstreamThrottled:
+        raise
     except Exception as e:
         print(f"Error fetching rest areas: {e}")
         return []
 
 def get_nearest_gas_station(lat, lng, radius=10000):
-    query = f"""
-        [out:json];
-        (
-        node["amenity"="fuel"](around:{radius},{lat},{lng});
-        way["amenity"="fuel"](around:{radius},{lat},{lng});
-        relation["amenity"="fuel"](around:{radius},{lat},{lng});
-        );
-        out body;
-    """
-    url = f"https://overpass-api.de/api/interpreter?data={requests.utils.quote(query)}"
     try:
-        response = requests.get(url)
-        data = response.json()
-        stations = [
-            {"lat": el.get("lat"), "lng": el.get("lon"), "name": el.get("tags", {}).get("name", "Unnamed Station")}
-            for el in data.get("elements", [])
-            if "lat" in el and "lon" in el
-        ]
-        return stations
+        return poi_flight.do(
+            ("gas_station", normalize_points([(lat, lng)]), radius),
+            lambda: get_cached_pois(PoiTile.CategoryChoices.GAS_STATION, lat, lng, radius, fetch_pois, OVERPASS_LIMIT),
+        )
+    except UpstreamThrottled:
+        raise
     except Exception as e:
         print(f"Error fetching gas stations: {e}")
         return []
-    
-def get_points_refuelings(user_id, waypoints):
+
+def fetch_pois(category, bbox, limit=OVERPASS_LIMIT):
+    """
+    Renvoie les POI d'une catégorie dans une bbox (south, west, north, east) depuis Overpass.
+    The response is parsed as a stream, elements are yielded one by one.
+    """
+    area = ",".join(str(value) for value in bbox)
+    if category == PoiTile.CategoryChoices.REST_AREA:
+        query = f"""
+            [out:json];
+            (
+            node["amenity"="fuel"]({area});
+            way["amenity"="fuel"]({area});
+
+            node["amenity"="parking"]({area});
+            way["amenity"="parking"]({area});
+
+            node["leisure"="picnic_site"]({area});
+
+            node["amenity"="fast_food"]({area});
+            node["amenity"="cafe"]({area});
+            );
+            out center {limit};
+        """
+        default_name = "Unnamed Rest Area"
+    else:
+        query = f"""
+            [out:json];
+            (
+            node["amenity"="fuel"]({area});
+            way["amenity"="fuel"]({area});
+            relation["amenity"="fuel"]({area});
+            );
+            out center {limit};
+        """
+        default_name = "Unnamed Station"
+
+    import requests
+
+    url = f"{settings.OVERPASS_URL}?data={quote(query)}"
+    admit_upstream("overpass")
+    with requests.get(url, stream=True) as response:
+        # Error pages (429, 504) aren't JSON, raising keeps them from being cached as empty tiles.
+        response.raise_for_status()
+        for el in iter_elements(response.iter_content(65536)):
+            position = element_position(el)
+            if position is None:
+                continue
+            tags = el.get("tags", {})
+            poi = {"lat": position[0], "lng": position[1], "name": tags.get("name", default_name)}
+            if category == PoiTile.CategoryChoices.REST_AREA:
+                poi["type"] = tags.get("highway", "unknown")
+            yield poi
+
+def get_points_refuelings(user_id, waypoints, distance_after_refueling=0, profile=FEDERAL):
     try:
-        distance_after_refueling = 0
-        remaining_fuel_distance = (1000 - distance_after_refueling)
+        remaining_fuel_distance = (profile.fuel_range - distance_after_refueling)
         coordinates = [[wp["lat"], wp["lng"]] for wp in waypoints]
         total_distance = get_route_distance(coordinates)
 
@@ -209,7 +325,9 @@ def get_points_refuelings(user_id, waypoints):
         
         for next_point in waypoints[1:]:
             coordinates = [[wp["lat"], wp["lng"]] for wp in [previous_point, next_point]]
-            segment_distance = get_route_distance(coordinates)
+            # Fetched with its geometry: reused to place a refueling and by plan_trip for the legs and the stored polyline.
+            segment = get_route_data_full(coordinates)
+            segment_distance = segment["distance"] / 1609.34 if segment else None
             
             if segment_distance is None :
                 continue
@@ -223,19 +341,22 @@ def get_points_refuelings(user_id, waypoints):
                 if not gas_stations:
                     return Response({"error": "Aucune station trouvée pour le refueling"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)  
 
-                closest_station = gas_stations[0]
+                closest_station = rank_stops(gas_stations, coordinates[0], coordinates[1], "distance")[0]
                 final_waypoints.append({
                     "lat": closest_station["lat"],
                     "lng": closest_station["lng"],
                     "label": f"refueling - {closest_station['name']}",
-                    "duration": {15 * 60},
+                    "duration": [profile.refuel_duration],
                     "type": "on-duty"
                 })
 
                 last_refuel_point = (closest_station["lat"], closest_station["lng"])
-                accumulated_distance = get_route_distance([last_refuel_point, [next_point['lat'], next_point['lng']]])
-                remaining_fuel_distance = 1000
-                previous_point = [closest_station["lat"], closest_station["lng"]]
+                accumulated_distance = closest_station.get("to_next_distance")
+                if accumulated_distance is None:
+                    accumulated_distance = get_route_distance([last_refuel_point, [next_point['lat'], next_point['lng']]])
+                segment_distance = accumulated_distance
+                remaining_fuel_distance = profile.fuel_range
+                previous_point = {"lat": closest_station["lat"], "lng": closest_station["lng"]}
 
             final_waypoints.append(next_point)
             previous_point = next_point
@@ -249,8 +370,251 @@ def get_points_refuelings(user_id, waypoints):
     except Exception as e:
         raise e
    
+def join_routes(routes):
+    """
+    Joins the full routes of consecutive legs into one route, like get_route_data_full through all their points.
+    :return: the route, or None when a leg is missing
+    """
+    if not routes or None in routes:
+        return None
+    coordinates = list(routes[0]["geometry"]["coordinates"])
+    for route in routes[1:]:
+        # Each leg starts where the previous one ends.
+        coordinates.extend(route["geometry"]["coordinates"][1:])
+    return {
+        "distance": sum(route["distance"] for route in routes),
+        "duration": sum(route["duration"] for route in routes),
+        "geometry": {"type": "LineString", "coordinates": coordinates},
+    }
+
+def save_plan_geometry(waypoints, route):
+    """
+    Stores the full geometry of a plan encoded, so the front doesn't need to call OSRM again.
+    :param route: route through the waypoints, joined by plan_trip from the legs it already fetched
+    """
+    key = get_plan_key(waypoints)
+    if RouteGeometry.objects.filter(key=key).exists():
+        return RouteGeometry.objects.get(key=key)
+    if route is None:
+        return None
+    try:
+        return RouteGeometry.save_from_route(key, route)
+    except Exception as e:
+        print(f"Error saving route geometry: {e}")
+        return None
+
+def plan_trip(user_id, current, pickup, dropoff, remaining_time_driving, rest_duration, distance_after_refueling, on_stop=None, departure=None, profile=FEDERAL):
+    """
+    Places the rest, sleeper and refueling stops between the current position, the pickup and the dropoff.
+    The OSRM durations are corrected by the speed profile of the hour each leg is driven (see trip.speed_profiles).
+    :param on_stop: optional callable receiving each rest, sleeper, pickup and dropoff stop as soon as it is placed
+    :param departure: aware datetime of the departure, defaults to now
+    :param profile: TruckProfile giving the fuel range, the stop durations and the HOS limits
+    :return: (response data, status code)
+    """
+    departure = departure or datetime.now(timezone.utc)
+    waypoints = [current, pickup, dropoff] 
+    total_duration = get_route_duration(waypoints)
+    if total_duration is None:
+        return {"error": "Unable to calculate route"}, status.HTTP_400_BAD_REQUEST
+
+    final_waypoints = [{
+        "lat": current[0],
+        "lng": current[1], 
+        "label": "current",
+        "duration": [0],
+        "type": "on-duty/driving"
+    }]
+
+    def add_stop(stop):
+        final_waypoints.append(stop)
+        if on_stop is not None:
+            on_stop(stop)
+
+    accumulated_duration = 0
+    previous_point = current
+    last_rest_area_point = None
+    # Time at previous_point, and time spent in stops since.
+    clock = departure
+    segment_stops = 0
+    for next_point in [pickup, dropoff]:
+        # Fetched with its geometry, which places the stops of the segment and is reused for the legs of the plan.
+        segment = get_route_data_full([previous_point, next_point])
+        segment_duration = segment["duration"] if segment else None
+        if segment_duration is None :
+            continue
+        # Offsets along the segment are converted back to OSRM durations for get_apporx_coordinate_in_way_by_duration.
+        factor = leg_factor(previous_point, next_point, clock, segment_duration)
+        segment_duration *= factor
+
+        accumulated_duration += segment_duration
+
+        if(rest_duration is not None and accumulated_duration > rest_duration):
+            approx_point = get_apporx_coordinate_in_way_by_duration([previous_point, next_point], (rest_duration - (accumulated_duration - segment_duration)) / factor)
+            rest_area = get_nearest_rest_area(approx_point[0], approx_point[1])
+            if not rest_area:
+                return {"error": "Aucune aire trouvée"}, status.HTTP_500_INTERNAL_SERVER_ERROR
+            closest_rest_area = rank_stops(rest_area, previous_point, next_point)[0]
+            add_stop({
+                "lat": closest_rest_area["lat"],
+                "lng": closest_rest_area["lng"],
+                "label": f"Rest Area - {closest_rest_area['name']}",
+                "duration": [profile.break_duration],
+                "type": "off-duty/on-duty"
+            })
+            last_rest_area_point = [closest_rest_area['lat'], closest_rest_area['lng']]
+            rest_duration = None
+            segment_stops += profile.break_duration
+
+        while(accumulated_duration > remaining_time_driving):
+            if(rest_duration is not None and accumulated_duration > rest_duration):
+                approx_point = get_apporx_coordinate_in_way_by_duration([previous_point, next_point], (rest_duration - (accumulated_duration - segment_duration)) / factor)
+                rest_area = get_nearest_rest_area(approx_point[0], approx_point[1])
+
+                if not rest_area:
+                    return {"error": "Aucune aire trouvée pour le refueling"}, status.HTTP_500_INTERNAL_SERVER_ERROR
+
+                closest_rest_area = rank_stops(rest_area, previous_point, next_point)[0]
+                add_stop({
+                    "lat": closest_rest_area["lat"],
+                    "lng": closest_rest_area["lng"],
+                    "label": f"Rest Area - {closest_rest_area['name']}",
+                    "duration": [profile.break_duration],
+                    "type": "off-duty/on-duty"
+                })
+                last_rest_area_point = [closest_rest_area['lat'], closest_rest_area['lng']]
+                rest_duration = None
+                segment_stops += profile.break_duration
+
+            driven = remaining_time_driving - (accumulated_duration - segment_duration)
+            approx_point = get_apporx_coordinate_in_way_by_duration([previous_point, next_point], driven / factor)
+            rest_area = get_nearest_rest_area(approx_point[0], approx_point[1])
+
+            if not rest_area:
+                return {"error": "Aucune aire trouvée pour le refueling"}, status.HTTP_400_BAD_REQUEST
+
+            closest_rest_area = rank_stops(rest_area, previous_point, next_point)[0]
+            last_rest_area_point = [closest_rest_area['lat'], closest_rest_area['lng']]
+            add_stop({
+                "lat": closest_rest_area["lat"],
+                "lng": closest_rest_area["lng"],
+                "label": f"Area - {closest_rest_area['name']}",
+                "duration": [profile.sleeper_duration],
+                "type": "sleeper"
+            })
+            previous_point = last_rest_area_point
+            remaining_time_driving = profile.max_driving
+            rest_duration = profile.max_driving_before_break
+            clock += timedelta(seconds=driven + segment_stops + profile.sleeper_duration)
+            segment_stops = 0
+            accumulated_duration = closest_rest_area.get("to_next_duration")
+            if accumulated_duration is None:
+                accumulated_duration = get_route_duration([previous_point, next_point])
+            factor = leg_factor(previous_point, next_point, clock, accumulated_duration)
+            accumulated_duration *= factor
+            segment_duration = accumulated_duration
+
+        stop_duration = profile.pickup_duration if next_point == pickup else profile.dropoff_duration
+        add_stop({
+            "lat": next_point[0], 
+            "lng": next_point[1], 
+            "label": "pickup" if next_point == pickup else "dropoff",
+            "duration": [stop_duration],
+            "type": "on-duty"
+        })
+        clock += timedelta(seconds=segment_duration + segment_stops + stop_duration)
+        segment_stops = 0
+        previous_point = next_point
+
+    result = get_points_refuelings(user_id, final_waypoints, distance_after_refueling, profile)
+    waypoints_results = result["waypoints"]
+
+    prev_point = waypoints_results[0]
+    prev_point["duration_from_last_point"] = 0
+    waypoints_results_final = [prev_point]
+
+    clock = departure
+    legs = []
+    for wp in waypoints_results[1:]:
+        origin = [prev_point['lat'], prev_point['lng']]
+        destination = [wp['lat'], wp['lng']]
+        # Most legs were fetched in full by get_points_refuelings, their geometry makes the stored polyline.
+        leg = get_route_data_full([origin, destination])
+        legs.append(leg)
+        duration = leg["duration"] if leg else None
+        if duration is not None:
+            # Kept so the speed profiles keep learning against OSRM, not against their own corrections.
+            wp["free_flow_duration"] = round(duration)
+            duration *= leg_factor(origin, destination, clock, duration)
+            clock += timedelta(seconds=duration)
+        wp["duration_from_last_point"] = round(duration) if duration is not None else None
+        clock += timedelta(seconds=wp["duration"][0])
+        waypoints_results_final.append(wp)
+        prev_point = wp
+
+    distance = result["total_distance"]
+    distance_to_dropoff = result["last_refuel_to_dropoff_distance"]
+
+    response_data = {
+        "waypoints": waypoints_results_final,
+        "total_distance": distance,
+    }
+
+    if distance_to_dropoff is not None:
+        response_data["distance_to_dropoff"] = distance_to_dropoff
+
+    geometry = save_plan_geometry([[wp['lat'], wp['lng']] for wp in waypoints_results_final], join_routes(legs))
+    if geometry is not None:
+        response_data["geometry_key"] = geometry.key
+
+    return response_data, status.HTTP_200_OK
+
+def get_trip_points(params):
+    """
+    Returns the (lat, lng) of the current position, the pickup and the dropoff from the query parameters.
+    """
+    current = (float(params.get("current_lat")), float(params.get("current_lng")))
+    pickup = (float(params.get("pickup_lat")), float(params.get("pickup_lng")))
+    dropoff = (float(params.get("dropoff_lat")), float(params.get("dropoff_lng")))
+    return current, pickup, dropoff
+
+def parse_aware_datetime(value):
+    """
+    Parses an ISO 8601 datetime, UTC when it has no offset.
+    :raises ValueError: when value isn't a valid datetime
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"{value!r} is not an ISO 8601 datetime")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def plan_for_user(user_id, current, pickup, dropoff, planning_state=None, on_stop=None, profile=None):
+    """
+    Plans the trip from the driver's precomputed HOS state.
+    :param planning_state: result of DriverState.get_planning_state, loaded when None
+    :param on_stop: see plan_trip, the computation is then not shared with other callers
+    :param profile: driver's TruckProfile, taken from the per-worker cache when None
+    :return: (response data, status code)
+    """
+    profile = profile or get_profile(user_id)
+    if planning_state is None:
+        planning_state = DriverState.get_planning_state(user_id, datetime.now(timezone.utc), profile)
+    remaining_time_driving, rest_duration, distance_after_refueling = planning_state
+
+    if on_stop is not None:
+        return plan_trip(user_id, current, pickup, dropoff, remaining_time_driving, rest_duration, distance_after_refueling, on_stop, profile=profile)
+
+    # Drivers sent the same load with the same HOS state and truck profile share one computation.
+    plan_key = ("plan", normalize_points([current, pickup, dropoff]), remaining_time_driving, rest_duration, round(distance_after_refueling, 1), profile.pk)
+    return plan_flight.do(plan_key, lambda: plan_trip(
+        user_id, current, pickup, dropoff, remaining_time_driving, rest_duration, distance_after_refueling, profile=profile
+    ))
+
 class TripConfigAddPoint(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [PlanRateThrottle]
     def get(self, request):
         
         access_token = request.headers.get('Authorization')
@@ -260,125 +624,210 @@ class TripConfigAddPoint(APIView):
         else:
             return Response({'detail': 'Invalid token format'}, status=status.HTTP_401_UNAUTHORIZED)
 
+        simulate = request.GET.get("simulate") in ("1", "true")
+        if simulate:
+            # NumPy is only imported when the simulation is asked for.
+            from trip.simulation import DEFAULT_SCENARIOS, MAX_SCENARIOS, simulate_plan
+
+            try:
+                scenarios = max(1, min(int(request.GET.get("scenarios") or DEFAULT_SCENARIOS), MAX_SCENARIOS))
+            except ValueError:
+                return Response({'detail': 'Invalid scenarios'}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
             access = AccessToken(access_token)
             user_id = access['user_id']
-            current = (float(request.GET.get("current_lat")), float(request.GET.get("current_lng")))
-            pickup = (float(request.GET.get("pickup_lat")), float(request.GET.get("pickup_lng")))
-            dropoff = (float(request.GET.get("dropoff_lat")), float(request.GET.get("dropoff_lng")))
-            remaining_time_driving, rest_duration = 11 * 3600, 8 * 3600   
-
-            waypoints = [current, pickup, dropoff] 
-            total_duration = get_route_duration(waypoints)
-            if total_duration is None:
-                return Response({"error": "Unable to calculate route"}, status=status.HTTP_400_BAD_REQUEST)
-
-            final_waypoints = [{
-                "lat": current[0],
-                "lng": current[1], 
-                "label": "current",
-                "duration": {0},
-                "type": "on-duty/driving"
-            }]
-
-            accumulated_duration = 0
-            previous_point = current
-            last_rest_area_point = None
-            for next_point in [pickup, dropoff]:
-                segment_duration = get_route_duration([previous_point, next_point])
-                if segment_duration is None :
-                    continue
-
-                accumulated_duration += segment_duration
-
-                if(rest_duration is not None and accumulated_duration > rest_duration):
-                    approx_point = get_apporx_coordinate_in_way_by_duration([previous_point, next_point], (rest_duration - (accumulated_duration - segment_duration)))
-                    rest_area = get_nearest_rest_area(approx_point[0], approx_point[1])
-                    if not rest_area:
-                        return Response({"error": "Aucune aire trouvée"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)  
-                    closest_rest_area = rest_area[0]
-                    final_waypoints.append({
-                        "lat": closest_rest_area["lat"],
-                        "lng": closest_rest_area["lng"],
-                        "label": f"Rest Area - {closest_rest_area['name']}",
-                        "duration": {30 * 60},
-                        "type": "off-duty/on-duty"
-                    })
-                    last_rest_area_point = [closest_rest_area['lat'], closest_rest_area['lng']]
-                    rest_duration = None
-
-                while(accumulated_duration > remaining_time_driving):
-                    if(rest_duration is not None and accumulated_duration > rest_duration):
-                        approx_point = get_apporx_coordinate_in_way_by_duration([previous_point, next_point], (rest_duration - (accumulated_duration - segment_duration)))
-                        rest_area = get_nearest_rest_area(approx_point[0], approx_point[1])
-
-                        if not rest_area:
-                            return Response({"error": "Aucune aire trouvée pour le refueling"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)  
-
-                        closest_rest_area = rest_area[0]
-                        final_waypoints.append({
-                            "lat": closest_rest_area["lat"],
-                            "lng": closest_rest_area["lng"],
-                            "label": f"Rest Area - {closest_rest_area['name']}",
-                            "duration": {30 * 60},
-                            "type": "off-duty/on-duty"
-                        })
-                        last_rest_area_point = [closest_rest_area['lat'], closest_rest_area['lng']]
-                        rest_duration = None
-
-                    approx_point = get_apporx_coordinate_in_way_by_duration([previous_point, next_point], (remaining_time_driving - (accumulated_duration - segment_duration)))
-                    rest_area = get_nearest_rest_area(approx_point[0], approx_point[1])
-
-                    if not rest_area:
-                        return Response({"error": "Aucune aire trouvée pour le refueling"}, status=status.HTTP_400_BAD_REQUEST)  
-
-                    closest_rest_area = rest_area[0]
-                    last_rest_area_point = [closest_rest_area['lat'], closest_rest_area['lng']]
-                    final_waypoints.append({
-                        "lat": closest_rest_area["lat"],
-                        "lng": closest_rest_area["lng"],
-                        "label": f"Area - {closest_rest_area['name']}",
-                        "duration": {10 * 3600},
-                        "type": "sleeper"
-                    })
-                    previous_point = last_rest_area_point
-                    remaining_time_driving = 11 * 3600
-                    rest_duration = 8 * 3600
-                    accumulated_duration = get_route_duration([previous_point, next_point])
+            current, pickup, dropoff = get_trip_points(request.GET)
+            profile = get_profile(user_id)
+            planning_state = DriverState.get_planning_state(user_id, datetime.now(timezone.utc), profile)
+            response_data, status_code = plan_for_user(user_id, current, pickup, dropoff, planning_state, profile=profile)
+
+            if status_code == status.HTTP_200_OK and simulate:
+                # The plan may be shared with other callers, it is copied instead of modified.
+                response_data = {
+                    **response_data,
+                    "simulation": simulate_plan(response_data["waypoints"], planning_state[0], planning_state[1], scenarios, profile=profile),
+                }
+            return Response(response_data, status=status_code)
+
+        except UpstreamThrottled:
+            # Answered with a 429 and Retry-After by DRF.
+            raise
+        except Exception as e:
+            return Response({'detail': f'Error: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR) 
 
-                final_waypoints.append({
-                    "lat": next_point[0], 
-                    "lng": next_point[1], 
-                    "label": "pickup" if next_point == pickup else "dropoff",
-                    "duration": {1 * 3600},
-                    "type": "on-duty"
-                })
-                previous_point = next_point
+class LivePlanView(View):
+    """
+    Server-Sent Events stream of the driver's plan, see trip.live. DRF views are sync only,
+    so this one is a plain async Django view authenticating the access token itself.
+    """
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({'detail': 'Live updates are only served by the ASGI application'}, status=status.HTTP_501_NOT_IMPLEMENTED)
 
-            result = get_points_refuelings(user_id, final_waypoints)
-            waypoints_results = result["waypoints"]
-            
-            prev_point = waypoints_results[0]
-            prev_point["duration_from_last_point"] = 0
-            waypoints_results_final = [prev_point]
-            
-            for wp in waypoints_results[1:]:
-                wp["duration_from_last_point"] = get_route_duration([[prev_point['lat'], prev_point['lng']], [wp['lat'], wp['lng']]])
-                waypoints_results_final.append(wp)
-                prev_point = wp
+        access_token = request.headers.get('Authorization')
+        if access_token and access_token.startswith('Bearer '):
+            access_token = access_token.split(' ')[1]
+        else:
+            # EventSource can't send headers.
+            access_token = request.GET.get('access_token')
+        if not access_token:
+            return JsonResponse({'detail': 'Invalid token format'}, status=status.HTTP_401_UNAUTHORIZED)
 
-            distance = result["total_distance"]
-            distance_to_dropoff = result["last_refuel_to_dropoff_distance"]
-            
-            response_data = {
-                "waypoints": waypoints_results_final,
-                "total_distance": distance,
-            }
+        try:
+            access = AccessToken(access_token)
+            user_id = access['user_id']
+        except Exception:
+            return JsonResponse({'detail': 'Invalid token'}, status=status.HTTP_401_UNAUTHORIZED)
+        if await sync_to_async(is_revoked)(access['jti']):
+            return JsonResponse({'detail': 'Invalid token'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        try:
+            current, pickup, dropoff = get_trip_points(request.GET)
+        except (TypeError, ValueError):
+            return JsonResponse({'detail': 'Invalid points'}, status=status.HTTP_400_BAD_REQUEST)
+
+        wait = await sync_to_async(take_user_token)(PlanRateThrottle.scope, user_id)
+        if wait:
+            response = JsonResponse({'detail': 'Too many plan requests, retry later'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = str(math.ceil(wait))
+            return response
+
+        # The module holds the per-worker watcher task, it is only loaded by the ASGI application.
+        from trip.live import stream_plan
+
+        response = StreamingHttpResponse(
+            stream_plan(user_id, current, pickup, dropoff, plan_for_user),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class TripSaveView(APIView):
+    """
+    Records a trip chosen by the driver. The trip is acknowledged once in the outbox and saved
+    in the background (see trip.outbox), retries with the same Idempotency-Key header don't save it twice.
+    """
+    permission_classes = [IsAuthenticated]
+    def post(self, request):
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not idempotency_key or len(idempotency_key) > 64:
+            return Response({'detail': 'Missing or invalid Idempotency-Key header'}, status=status.HTTP_400_BAD_REQUEST)
 
-            if distance_to_dropoff is not None:
-                response_data["distance_to_dropoff"] = distance_to_dropoff
+        data = request.data if isinstance(request.data, dict) else {}
+        try:
+            datetimeUTC = parse_aware_datetime(data.get("datetimeUTC") or "")
+        except (ValueError, TypeError) as e:
+            return Response({'detail': f'Invalid datetimeUTC: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            payload = validate_trip_payload(data)
+        except ValueError as e:
+            return Response({'detail': f'Invalid trip: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response(response_data, status=status.HTTP_200_OK)
-        
+        try:
+            submission, created = enqueue(request.user.id, idempotency_key, payload, datetimeUTC)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            "id": submission.id,
+            "status": "saved" if submission.processed_at else "pending",
+            "tripconfig_id": submission.tripconfig_id,
+        }, status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
+class RouteGeometryView(APIView):
+    permission_classes = [IsAuthenticated]
+    def get(self, request):
+        key = request.GET.get("key")
+        if not key:
+            return Response({'detail': 'Missing key'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            zoom = int(request.GET["zoom"]) if request.GET.get("zoom") else None
+        except ValueError:
+            return Response({'detail': 'Invalid zoom'}, status=status.HTTP_400_BAD_REQUEST)
+
+        polyline = RouteGeometry.get_level(key, zoom)
+        if polyline is None:
+            return Response({'detail': 'Geometry not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({"polyline": polyline, "precision": 6}, status=status.HTTP_200_OK)
+
+
+class TripComplianceView(APIView):
+    permission_classes = [IsAuthenticated]
+    def get(self, request):
+        # NumPy is only imported when the compliance engine is used.
+        from trip.compliance import CYCLE_DAYS, audit_users
+
+        try:
+            end = parse_aware_datetime(request.GET["end"]) if request.GET.get("end") else None
+            if request.GET.get("start"):
+                start = parse_aware_datetime(request.GET["start"])
+            else:
+                # Only the last cycle is audited by default, so only the recent partitions are read.
+                start = (end or datetime.now(timezone.utc)) - timedelta(days=CYCLE_DAYS + 2)
+        except ValueError as e:
+            return Response({'detail': f'Invalid start or end: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+        if end is not None and start >= end:
+            return Response({'detail': 'start must be before end'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            report = audit_users([request.user.id], start=start, end=end)
         except Exception as e:
-            return Response({'detail': f'Error: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR) 
\ No newline at end of file
+            return Response({'detail': f'Error: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response(report.get(request.user.id, {'violations': [], 'remaining': None, 'last_duty_end': None}), status=status.HTTP_200_OK)
+
+
+class DriverEventsView(APIView):
+    permission_classes = [IsAuthenticated]
+    def post(self, request):
+        events = request.data.get("events") if isinstance(request.data, dict) else None
+        if not isinstance(events, list):
+            return Response({'detail': 'Missing events'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            rows = parse_events(request.user.id, events)
+        except (ValueError, TypeError, AttributeError) as e:
+            return Response({'detail': f'Invalid event: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not event_buffer.add(rows):
+            return Response({'detail': 'Too many events, retry later'}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
+
+        return Response({"accepted": len(rows)}, status=status.HTTP_202_ACCEPTED)
+
+
+class RequestProfileView(APIView):
+    """
+    Returns a profile recorded by truck_api.profiling, to the holders of the profiling token.
+    """
+    authentication_classes = []
+    permission_classes = []
+    def get(self, request):
+        from truck_api.profiling import format_stats, is_authorized
+
+        if not is_authorized(request.headers.get('X-Profile')):
+            return Response({'detail': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        profile = RequestProfile.objects.filter(id=request.GET.get("id")).first()
+        if profile is None:
+            return Response({'detail': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        output = request.GET.get("output")
+        if output == "pstats":
+            response = HttpResponse(bytes(profile.stats), content_type='application/octet-stream')
+            response['Content-Disposition'] = f'attachment; filename="{profile.id}.prof"'
+            return response
+        if output == "text":
+            return HttpResponse(format_stats(bytes(profile.stats)), content_type='text/plain')
+
+        return Response({
+            "id": profile.id,
+            "method": profile.method,
+            "path": profile.path,
+            "status_code": profile.status_code,
+            "duration": profile.duration,
+            "created_at": profile.created_at,
+            "summary": profile.summary,
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,55 @@
+"""
+Database router sending read-only history and HOS queries to a replica.
+
+Reads only go to the replica inside ``use_replica()`` (usable as a context
+manager or a decorator), when the ``replica`` alias is configured, and as long
+as nothing was written during the current request, so read-after-write paths
+stay on the primary. The written flag is only cleared when a request starts:
+entering ``use_replica()`` keeps a write made earlier in the request. Outside
+of requests (commands, background threads) a write keeps the reads of that
+context on the primary for good. Migrations never run on the replica.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_has_written = ContextVar('has_written', default=False)
+
+def _start_request(**kwargs):
+    _has_written.set(False)
+
+request_started.connect(_start_request)
+
+@contextmanager
+def use_replica():
+    reads_token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(reads_token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or _has_written.get():
+            return DEFAULT_DB_ALIAS
+        if REPLICA_DB_ALIAS not in settings.DATABASES:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _has_written.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_DB_ALIAS
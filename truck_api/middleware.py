@@ -0,0 +1,56 @@
+"""
+Brotli response compression, used when the client accepts it. GZipMiddleware
+(placed before this one in MIDDLEWARE) handles the other clients.
+
+Server-Sent Events streams are never compressed: a compressor holds the
+small events back in its buffer, so the client wouldn't see any of them
+until the stream ends.
+"""
+import re
+from django.middleware.gzip import GZipMiddleware as DjangoGZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_accepts_br = re.compile(r'\bbr\b')
+
+MIN_LENGTH = 200
+
+
+def is_event_stream(response):
+    return response.get('Content-Type', '').startswith('text/event-stream')
+
+
+class GZipMiddleware(DjangoGZipMiddleware):
+    def process_response(self, request, response):
+        if is_event_stream(response):
+            return response
+        return super().process_response(request, response)
+
+
+class BrotliMiddleware(MiddlewareMixin):
+    # MiddlewareMixin makes it usable by async views without a thread switch, like GZipMiddleware.
+    def process_response(self, request, response):
+        if brotli is None or response.streaming or len(response.content) < MIN_LENGTH:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not _accepts_br.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            return response
+
+        compressed = brotli.compress(response.content, quality=5)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        response.headers['Content-Encoding'] = 'br'
+        if response.has_header('ETag'):
+            response.headers['ETag'] = re.sub(r'"$', r';br"', response.headers['ETag'])
+        return response
@@ -0,0 +1,186 @@
+"""
+Opt-in profiling of single requests.
+
+Only installed when PROFILING_TOKEN is set. A request on one of PROFILING_PATHS
+carrying that token (X-Profile header or profile query parameter) runs under
+cProfile while its upstream HTTP calls (requests) and SQL statements are timed.
+The profile is stored as a RequestProfile, its id is returned in the
+X-Profile-Id response header and it can be fetched from api/trip/profile.
+Other requests go through untouched.
+"""
+import cProfile
+import hmac
+import io
+import marshal
+import pstats
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+
+TOP_FUNCTIONS = 40
+TOP_STATEMENTS = 40
+MAX_URL_LENGTH = 200
+
+_upstream_calls = ContextVar('upstream_calls', default=None)
+
+
+def is_authorized(token):
+    # compare_digest only takes ASCII str, a client may send any header or query value.
+    return (
+        bool(settings.PROFILING_TOKEN) and token is not None
+        and hmac.compare_digest(token.encode(), settings.PROFILING_TOKEN.encode())
+    )
+
+
+def _install_requests_hook():
+    """
+    Times requests.Session.send (used by requests.get/post) for the requests being profiled.
+    """
+    import requests
+
+    send = requests.Session.send
+    if getattr(send, 'profiled', False):
+        return
+
+    def profiled_send(self, request, **kwargs):
+        calls = _upstream_calls.get()
+        if calls is None:
+            return send(self, request, **kwargs)
+        start = time.perf_counter()
+        status_code = None
+        try:
+            response = send(self, request, **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            calls.append({
+                "method": request.method,
+                "url": request.url[:MAX_URL_LENGTH],
+                "status": status_code,
+                "duration": time.perf_counter() - start,
+            })
+
+    profiled_send.profiled = True
+    requests.Session.send = profiled_send
+
+
+class _SqlRecorder:
+    def __init__(self):
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            entry = self.statements.setdefault(sql, [0, 0.0])
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+
+
+def summarize(profiler, upstream_calls, sql_recorder):
+    stats = pstats.Stats(profiler)
+    functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+
+    hosts = {}
+    for call in upstream_calls:
+        host = call["url"].split("/")[2] if "://" in call["url"] else call["url"]
+        total = hosts.setdefault(host, {"host": host, "count": 0, "duration": 0.0})
+        total["count"] += 1
+        total["duration"] += call["duration"]
+
+    statements = sorted(sql_recorder.statements.items(), key=lambda item: item[1][1], reverse=True)
+    return {
+        "functions": [
+            {"function": f"{file}:{line}({name})", "calls": calls, "tottime": tottime, "cumtime": cumtime}
+            for (file, line, name), (_, calls, tottime, cumtime, _) in functions
+        ],
+        "upstream": {
+            "count": len(upstream_calls),
+            "duration": sum(call["duration"] for call in upstream_calls),
+            "by_host": sorted(hosts.values(), key=lambda total: total["duration"], reverse=True),
+            "calls": upstream_calls,
+        },
+        "sql": {
+            "count": sum(count for count, _ in sql_recorder.statements.values()),
+            "duration": sum(duration for _, duration in sql_recorder.statements.values()),
+            "statements": [
+                {"sql": sql, "count": count, "duration": duration}
+                for sql, (count, duration) in statements[:TOP_STATEMENTS]
+            ],
+        },
+    }
+
+
+def dump_stats(profiler):
+    """
+    Returns the profile in the pstats file format (readable by pstats, snakeviz...).
+    """
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.headers.get('X-Profile') or request.GET.get('profile')
+        if token is None or not request.path.startswith(tuple(settings.PROFILING_PATHS)) or not is_authorized(token):
+            return self.get_response(request)
+
+        _install_requests_hook()
+        upstream_calls = []
+        calls_token = _upstream_calls.set(upstream_calls)
+        sql_recorder = _SqlRecorder()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(sql_recorder))
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+        finally:
+            _upstream_calls.reset(calls_token)
+        duration = time.perf_counter() - start
+
+        from trip.models import RequestProfile
+
+        try:
+            profile = RequestProfile.save_profile(
+                request.method,
+                request.path,
+                response.status_code,
+                duration,
+                summarize(profiler, upstream_calls, sql_recorder),
+                dump_stats(profiler),
+            )
+            response['X-Profile-Id'] = profile.id
+        except Exception as e:
+            print(f"Error saving the profile of {request.path}: {e}")
+        return response
+
+
+def format_stats(stats, limit=TOP_FUNCTIONS):
+    """
+    Text report of a stored profile, sorted by cumulative time.
+    """
+    output = io.StringIO()
+    profile = pstats.Stats(_StatsSource(marshal.loads(stats)), stream=output)
+    profile.sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
+
+
+class _StatsSource:
+    # pstats.Stats accepts any object with create_stats() and a stats dict.
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -31,6 +32,10 @@ ALLOWED_HOSTS = ['.vercel.app']
 
 # Application definition
 
+# API-only deployments (serverless) skip the admin and the session based apps
+# and middleware, which the JWT authenticated API doesn't use, to start faster.
+API_ONLY = os.environ.get('DJANGO_API_ONLY') == '1'
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -47,6 +52,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'truck_api.middleware.GZipMiddleware',
+    'truck_api.middleware.BrotliMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,6 +63,42 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if API_ONLY:
+    API_ONLY_EXCLUDED = [
+        'django.contrib.admin',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.staticfiles',
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+    ]
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in API_ONLY_EXCLUDED]
+    MIDDLEWARE = [middleware for middleware in MIDDLEWARE if middleware not in API_ONLY_EXCLUDED]
+
+# Opt-in per-request profiling (see truck_api/profiling.py). Without a token the middleware
+# isn't installed at all, so unprofiled requests pay nothing.
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')
+PROFILING_PATHS = ['/api/trip/addpoint', '/auth/']
+
+if PROFILING_TOKEN:
+    MIDDLEWARE.insert(MIDDLEWARE.index('truck_api.middleware.BrotliMiddleware') + 1, 'truck_api.profiling.ProfilingMiddleware')
+
+# Routing and POI services, pointed at local stand-ins by the load tests (see benchmarks/loadtest.py).
+OSRM_URL = os.environ.get('OSRM_URL', 'https://router.project-osrm.org')
+OVERPASS_URL = os.environ.get('OVERPASS_URL', 'https://overpass-api.de/api/interpreter')
+
+# Admission control (see trip/admission.py), as (tokens per second, burst): per-driver buckets of
+# the planning endpoints, and buckets shared by all the workers in front of each public upstream.
+USER_RATES = {
+    'plan': (float(os.environ.get('PLAN_RATE', '0.2')), int(os.environ.get('PLAN_BURST', '10'))),
+}
+UPSTREAM_RATES = {
+    'osrm': (float(os.environ.get('OSRM_RATE', '5')), int(os.environ.get('OSRM_BURST', '50'))),
+    'overpass': (float(os.environ.get('OVERPASS_RATE', '1')), int(os.environ.get('OVERPASS_BURST', '10'))),
+}
+
 ROOT_URLCONF = 'truck_api.urls'
 
 TEMPLATES = [
@@ -74,26 +117,68 @@ TEMPLATES = [
     },
 ]
 
+if API_ONLY:
+    TEMPLATES[0]['OPTIONS']['context_processors'] = [
+        processor for processor in TEMPLATES[0]['OPTIONS']['context_processors'] if 'messages' not in processor
+    ]
+
 WSGI_APPLICATION = 'truck_api.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# Connections are kept open between requests (DB_CONN_MAX_AGE seconds, checked before reuse)
+# to avoid a TCP+TLS+auth handshake to the remote database on every request.
+# DB_POOL=1 uses a psycopg 3 connection pool instead (requires psycopg[pool]).
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'railway',
-        'USER': 'postgres',
-        'PASSWORD': 'aILRWCbxxXEzspJyUZasWbDLhsvVExai',
-        'HOST': 'shuttle.proxy.rlwy.net',
-        'PORT': '30722',
+        'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.postgresql'),
+        'NAME': os.environ.get('DB_NAME', 'railway'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'aILRWCbxxXEzspJyUZasWbDLhsvVExai'),
+        'HOST': os.environ.get('DB_HOST', 'shuttle.proxy.rlwy.net'),
+        'PORT': os.environ.get('DB_PORT', '30722'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
 }
 
+if os.environ.get('DB_POOL') == '1' and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    from psycopg_pool import ConnectionPool
+
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+        'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        'check': ConnectionPool.check_connection,
+    }
+
+# Read-only history and HOS queries go to this replica (see truck_api/db_router.py).
+if os.environ.get('DB_REPLICA_HOST') or os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'OPTIONS': {**DATABASES['default']['OPTIONS']},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['truck_api.db_router.ReplicaRouter']
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication',
+        'users.authentication.RevocableJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'truck_api.renderers.ORJSONRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'truck_api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
 }
 
@@ -14,15 +14,58 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from importlib import import_module
+from django.conf import settings
 from django.urls import path
-from users.views import LoginView, RegisterView, RefreshTokenHttpOnlyView
-from trip.views import TripConfigAddPoint
+
+def lazy_view(dotted_path):
+    """
+    Imports the APIView class (and its module) on the first request instead of at URLconf loading,
+    so a cold start only pays for the views it actually serves.
+    """
+    module_name, class_name = dotted_path.rsplit('.', 1)
+    view = None
+
+    def dispatch(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = getattr(import_module(module_name), class_name).as_view()
+        return view(request, *args, **kwargs)
+
+    # DRF's APIView.as_view() is csrf exempt, the wrapper must be too.
+    dispatch.csrf_exempt = True
+    return dispatch
+
+def lazy_async_view(dotted_path):
+    """
+    Same as lazy_view for an async Django class-based view.
+    """
+    module_name, class_name = dotted_path.rsplit('.', 1)
+    view = None
+
+    async def dispatch(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = getattr(import_module(module_name), class_name).as_view()
+        return await view(request, *args, **kwargs)
+
+    return dispatch
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('auth/login', LoginView.as_view(), name='login'),
-    path('auth/refresh-token', RefreshTokenHttpOnlyView.as_view(), name='refresh token'),
-    path('auth/register', RegisterView.as_view(), name='register'),
-    path('api/trip/addpoint', TripConfigAddPoint.as_view(), name='trip configuration')
+    path('auth/login', lazy_view('users.views.LoginView'), name='login'),
+    path('auth/refresh-token', lazy_view('users.views.RefreshTokenHttpOnlyView'), name='refresh token'),
+    path('auth/register', lazy_view('users.views.RegisterView'), name='register'),
+    path('auth/logout', lazy_view('users.views.LogoutView'), name='logout'),
+    path('api/trip/addpoint', lazy_view('trip.views.TripConfigAddPoint'), name='trip configuration'),
+    path('api/trip/save', lazy_view('trip.views.TripSaveView'), name='trip save'),
+    path('api/trip/geometry', lazy_view('trip.views.RouteGeometryView'), name='route geometry'),
+    path('api/trip/compliance', lazy_view('trip.views.TripComplianceView'), name='trip compliance'),
+    path('api/trip/events', lazy_view('trip.views.DriverEventsView'), name='driver events'),
+    path('api/trip/live', lazy_async_view('trip.views.LivePlanView'), name='live plan'),
+    path('api/trip/profile', lazy_view('trip.views.RequestProfileView'), name='request profile'),
 ]
+
+if not settings.API_ONLY:
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
@@ -1,3 +1,14 @@
 from django.contrib import admin
+from users.models import User
 
-# Register your models here.
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'email')
+    search_fields = ('email', 'name')
+    ordering = ('id',)
+    # The password hash isn't edited from the admin, users register through the API.
+    exclude = ('password',)
+
+    def has_add_permission(self, request):
+        return False
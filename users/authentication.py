@@ -0,0 +1,14 @@
+"""
+JWT authentication refusing the access tokens revoked by a logout (see users/revocation.py).
+"""
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from users.revocation import is_revoked
+
+
+class RevocableJWTAuthentication(JWTStatelessUserAuthentication):
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_revoked(token['jti']):
+            raise InvalidToken({'detail': 'Token has been revoked', 'code': 'token_revoked'})
+        return token
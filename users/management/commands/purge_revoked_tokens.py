@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from users.revocation import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Deletes the revoked tokens that have expired."
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"{purge_expired()} expired revoked tokens deleted"))
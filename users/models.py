@@ -38,4 +38,16 @@ class User(models.Model):
             user = cls.objects.create(name=name, email=email, password=hashed_password)
             return user
         except Exception as e:
-            raise e
\ No newline at end of file
+            raise e
+
+class RevokedToken(models.Model):
+    """
+    Refresh and access tokens revoked by a logout, kept until they expire (see users/revocation.py).
+    """
+    id = models.AutoField(primary_key=True)
+    jti = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = 'revokedtoken'
@@ -0,0 +1,91 @@
+"""
+Revoked refresh and access tokens.
+
+Revoked JTIs are stored in the RevokedToken table and mirrored in a per-worker
+dict, so checking a token that isn't revoked costs no query. The dict is
+refreshed incrementally with the rows created since the newest one seen minus
+OVERLAP, since a transaction may commit a row created before rows already
+read, and reloaded as a whole every FULL_REFRESH_INTERVAL in case a commit
+took even longer. Expired rows are purged by a background thread.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from django.db import connection
+from users.models import RevokedToken
+
+REFRESH_INTERVAL = 5
+FULL_REFRESH_INTERVAL = 300
+OVERLAP = timedelta(seconds=60)
+PURGE_INTERVAL = 3600
+
+_lock = threading.Lock()
+_revoked = {}
+_state = {"last_created_at": None, "refreshed_at": None, "full_refreshed_at": None, "purger": None}
+
+def _refresh():
+    now = time.monotonic()
+    refreshed_at = _state["refreshed_at"]
+    if refreshed_at is not None and now - refreshed_at < REFRESH_INTERVAL:
+        return
+
+    with _lock:
+        if _state["refreshed_at"] is not None and now - _state["refreshed_at"] < REFRESH_INTERVAL:
+            return
+        full = _state["full_refreshed_at"] is None or now - _state["full_refreshed_at"] >= FULL_REFRESH_INTERVAL
+        rows = RevokedToken.objects.all()
+        if not full and _state["last_created_at"] is not None:
+            rows = rows.filter(created_at__gt=_state["last_created_at"] - OVERLAP)
+        loaded = {}
+        for jti, expires_at, created_at in rows.values_list('jti', 'expires_at', 'created_at'):
+            loaded[jti] = expires_at.timestamp()
+            if _state["last_created_at"] is None or created_at > _state["last_created_at"]:
+                _state["last_created_at"] = created_at
+        if full:
+            # Forgets the purged rows without ever dropping a revoked token the readers could miss.
+            for jti in [jti for jti in _revoked if jti not in loaded]:
+                del _revoked[jti]
+            _state["full_refreshed_at"] = now
+        _revoked.update(loaded)
+
+        expired = [jti for jti, expires_at in _revoked.items() if expires_at < time.time()]
+        for jti in expired:
+            del _revoked[jti]
+        _state["refreshed_at"] = now
+
+    _start_purger()
+
+def is_revoked(jti):
+    _refresh()
+    return jti in _revoked
+
+def revoke(jti, expires_at):
+    """
+    :param expires_at: expiry of the token, as a timestamp or a datetime
+    """
+    if not isinstance(expires_at, datetime):
+        expires_at = datetime.fromtimestamp(expires_at, tz=timezone.utc)
+    RevokedToken.objects.bulk_create([RevokedToken(jti=jti, expires_at=expires_at)], ignore_conflicts=True)
+    with _lock:
+        _revoked[jti] = expires_at.timestamp()
+
+def purge_expired():
+    return RevokedToken.objects.filter(expires_at__lt=datetime.now(timezone.utc)).delete()[0]
+
+def _purge_loop():
+    while True:
+        time.sleep(PURGE_INTERVAL)
+        try:
+            purge_expired()
+        except Exception as e:
+            print(f"Error purging revoked tokens: {e}")
+        finally:
+            connection.close()
+
+def _start_purger():
+    if _state["purger"] is not None:
+        return
+    with _lock:
+        if _state["purger"] is None:
+            _state["purger"] = threading.Thread(target=_purge_loop, daemon=True)
+            _state["purger"].start()
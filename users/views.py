@@ -8,6 +8,7 @@ from rest_framework_simplejwt.exceptions import TokenError
 from datetime import timedelta
 
 from users.models import User
+from users.revocation import is_revoked, revoke
 
 class LoginView(APIView):
     permission_classes = [AllowAny]
@@ -51,6 +52,8 @@ class RefreshTokenHttpOnlyView(APIView):
 
         try:
             refresh = RefreshToken(refresh_token)
+            if is_revoked(refresh['jti']):
+                return Response({'detail': 'Invalid or expired refresh token'}, status=status.HTTP_401_UNAUTHORIZED)
             access_token = str(refresh.access_token)
             
             response = Response({'accessToken': access_token})
@@ -76,7 +79,9 @@ class LogoutView(APIView):
 
         try:
             refresh = RefreshToken(refresh_token)
-            refresh.blacklist()
+            revoke(refresh['jti'], refresh['exp'])
+            # The access token would otherwise stay valid for its whole lifetime.
+            revoke(request.auth['jti'], request.auth['exp'])
         
             response = Response({'detail': 'Successfully logged out'})
             response.delete_cookie('refreshToken')